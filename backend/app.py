@@ -1,12 +1,57 @@
 # backend/app.py
-from flask import Flask, jsonify, request
+import functools
+import time
+from flask import Flask, Response, g, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import config
 import watchlist_wizard_db as database # Use relative import
+import response_cache
+import recommender
+import leaderboards
+import suggest
+import facets
+import export
+import posters
+from metrics import metrics, profiler, start_request, serialize_seconds, timed, authorized as metrics_authorized
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    dumps = timed(DefaultJSONProvider.dumps) # jsonify()'s encoding time goes into /metrics
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
+app.config['USE_X_SENDFILE'] = config.POSTER_X_SENDFILE
 CORS(app)
 
+# Each request borrows at most one pooled DB connection (on its first query) and hands it back on teardown
+@app.before_request
+def begin_db_request():
+    database.begin_request()
+    g.request_start = time.perf_counter()
+    start_request()
+    g.profile = profiler.start()
+
+@app.teardown_request
+def end_db_request(exc):
+    database.end_request()
+    if g.get('profile'): # In teardown so a sampled profile is always stopped, even if the request failed
+        profiler.finish(g.profile, request.method, request.full_path.rstrip("?"), time.perf_counter() - g.request_start)
+
+# Registered before the compression hook so it runs after it and records the bytes actually sent
+@app.after_request
+def record_metrics(response):
+    seconds = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    nbytes = 0 if response.is_streamed else response.calculate_content_length() or 0
+    metrics.record(request.method, endpoint, response.status_code, seconds, serialize_seconds(), nbytes)
+    return response
+
+# gzip/brotli for large JSON responses (cached ones are compressed once, in response_cache)
+app.after_request(response_cache.compress_response)
+
 @app.route('/api/movies', methods=['GET'])
+@response_cache.cached
 def get_movies_api():
     # Get filter parameters from query string
     search = request.args.get('search', None) # General search term
@@ -14,10 +59,32 @@ def get_movies_api():
     keyword = request.args.get('keyword', None) # Plot keyword
     actor = request.args.get('actor', None)   # Actor name
 
+    sort = request.args.get('sort', 'rating') # 'rating' or 'relevance' (best search matches first)
+    if sort not in ('rating', 'relevance'):
+        return jsonify({"error": "sort must be 'rating' or 'relevance'"}), 400
+
     # Pagination parameters
     limit = request.args.get('limit', 250, type=int)
     offset = request.args.get('offset', 0, type=int)
 
+    # Keyset pagination: ?cursor= (empty for the first page) returns {"movies", "next_cursor"}, pass
+    # next_cursor back to get the following page. Without cursor the offset mode below returns a plain list.
+    cursor = request.args.get('cursor', None)
+    if cursor is not None:
+        try:
+            page = database.get_movies_page(
+                limit=limit,
+                cursor=cursor,
+                search_term=search,
+                genre_filter=genre,
+                keyword_filter=keyword,
+                actor_filter=actor,
+                sort=sort
+            )
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+        return jsonify(page)
+
     # Pass filters to the database function
     movies = database.get_all_movies(
         limit=limit,
@@ -25,11 +92,27 @@ def get_movies_api():
         search_term=search,
         genre_filter=genre,
         keyword_filter=keyword,
-        actor_filter=actor
+        actor_filter=actor,
+        sort=sort
     )
     return jsonify(movies)
 
+@app.route('/api/movies/batch', methods=['GET'])
+@response_cache.cached
+def get_movies_batch_api():
+    # ?ids=tt0111161,tt0068646 -> details of each movie (same shape as /api/movies/<imdb_id>) in one query.
+    # Unknown IDs are left out of the list.
+    ids = [imdb_id.strip() for value in request.args.getlist('ids') for imdb_id in value.split(',') if imdb_id.strip()]
+    if not ids:
+        return jsonify({"error": "ids is required, e.g. ?ids=tt0111161,tt0068646"}), 400
+    try:
+        movies = database.get_movies_by_imdb_ids(ids)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+    return jsonify(movies)
+
 @app.route('/api/movies/<string:imdb_id>', methods=['GET'])
+@response_cache.cached
 def get_movie_details_api(imdb_id):
     movie = database.get_movie_by_imdb_id(imdb_id)
     if movie:
@@ -38,41 +121,146 @@ def get_movie_details_api(imdb_id):
         return jsonify({"error": "Movie not found"}), 404
 
 @app.route('/api/genres', methods=['GET'])
+@response_cache.cached
 def get_genres_api():
     genres = database.get_all_genres()
     return jsonify(genres)
 
-# --- Add more API endpoints here (e.g., /api/recommendations) ---
-# Example recommendation endpoint (very basic)
+@app.route('/api/health', methods=['GET'])
+def get_health_api():
+    # Checks the database round trip and reports connection pool usage and wait times
+    try:
+        with database.session() as db:
+            db.fetch_one("SELECT 1 AS ok")
+        status, code = "ok", 200
+    except database.DatabaseError as err:
+        print(f"Health check failed: {err}")
+        status, code = "database unavailable", 503
+    return jsonify({"status": status, "pool": database.pool_stats()}), code
+
+def metrics_endpoint(view):
+    """The /metrics routes show SQL, plans and code paths: a 404 without the METRICS_TOKEN bearer token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not metrics_authorized(request.headers.get('Authorization')):
+            return jsonify({"error": "Not found"}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/metrics', methods=['GET'])
+@metrics_endpoint
+def get_metrics():
+    # Prometheus text format, per worker process
+    gauges = {'db_pool': database.pool_stats(), 'response_cache': response_cache.cache.stats}
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/slow-queries', methods=['GET'])
+@metrics_endpoint
+def get_slow_queries():
+    # Reads slower than SLOW_QUERY_MS with their EXPLAIN plan (sampled, see querylog.py), newest first
+    return jsonify(database.slow_queries())
+
+@app.route('/metrics/profiles', methods=['GET'])
+@metrics_endpoint
+def get_profiles():
+    # Hottest functions of the requests sampled by PROFILE_SAMPLE_RATE, newest first
+    return jsonify(profiler.recent())
+
 @app.route('/api/recommendations', methods=['GET'])
+@response_cache.cached
 def get_recommendations_api():
-    # In a real app, get user preferences (e.g., from request args or session)
-    preferred_genre = request.args.get('genre', 'Drama') # Example: get genre from query param
-    # Basic: just fetch movies of that genre
-    # TODO: Implement more sophisticated recommendation logic in database.py
-    conn = database.get_db_connection()
-    recommendations = []
-    if conn:
-         try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT m.MovieID, m.Title, m.Year, m.Rating, m.PosterURL, m.IMDbID
-                FROM Movies m
-                JOIN MovieGenres mg ON m.MovieID = mg.MovieID
-                JOIN Genres g ON mg.GenreID = g.GenreID
-                WHERE g.GenreName = %s
-                ORDER BY m.Rating DESC
-                LIMIT 20
-            """, (preferred_genre,))
-            recommendations = cursor.fetchall()
-         except database.mysql.connector.Error as err:
-            print(f"Error getting recommendations: {err}")
-         finally:
-            if conn.is_connected():
-                cursor.close()
-                conn.close()
+    # ?imdb_id=tt0111161 -> movies most similar to that one (genres, keywords, director, cast, era), with a Score
+    # ?genre=Drama -> highest rated movies of the genre, ?decade=1990 of the decade, both -> of the genre in the decade
+    limit = max(1, min(request.args.get('limit', 20, type=int), config.RECOMMENDER_NEIGHBORS))
+    imdb_id = request.args.get('imdb_id', None)
+    if imdb_id:
+        version = response_cache.cache.catalog_version()
+        engine = recommender.get_recommender(version)
+        if engine is None:
+            return jsonify({"error": "Recommendations are still being computed, try again shortly"}), 503
+        if engine.version != version:
+            database.mark_request_stale() # Served while the update runs, but not cached at this version
+        movies = engine.similar(imdb_id, limit)
+        if movies is None:
+            return jsonify({"error": "Movie not found"}), 404
+        return jsonify(movies)
+
+    decade = leaderboards.decade_of(request.args.get('decade', None, type=int))
+    preferred_genre = request.args.get('genre', None if decade else 'Drama')
+    version = response_cache.cache.catalog_version()
+    boards = leaderboards.get_index(version)
+    if boards is not None:
+        if boards.version != version:
+            database.mark_request_stale() # Like the recommender's: behind the version the response would be cached under
+        return jsonify(boards.top(preferred_genre, decade, limit))
+    if decade:
+        return jsonify({"error": "Leaderboards are still loading, try again shortly"}), 503
+    recommendations = database.get_top_movies_by_genre(preferred_genre, limit=limit) # Until the leaderboards are built
     return jsonify(recommendations)
 
+@app.route('/api/suggest', methods=['GET'])
+def get_suggest_api():
+    # ?q=dark kn&type=title -> typeahead suggestions from memory (type: title, actor, genre or keyword, all if omitted).
+    # Not response-cached: every prefix is a different URL and the index answers faster than the cache would.
+    kind = request.args.get('type') or None
+    if kind and kind not in suggest.TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(suggest.TYPES)}"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), config.SUGGEST_MAX_LIMIT))
+    index = suggest.get_index(response_cache.cache.catalog_version())
+    if index is None:
+        return jsonify({"error": "Suggestions are still loading, try again shortly"}), 503
+    return jsonify(index.suggest(request.args.get('q', ''), kind, limit))
+
+@app.route('/api/facets', methods=['GET'])
+def get_facets_api():
+    # Same filters as /api/movies -> {"total": N, "genre": [{"value": "Drama", "count": 120}, ...], "decade": [...],
+    # "rating": [...], "mpaa": [...]}. Genre counts ignore the genre filter. Counted in memory, so not response-cached.
+    index = facets.get_index(response_cache.cache.catalog_version())
+    if index is None:
+        return jsonify({"error": "Facet counts are still loading, try again shortly"}), 503
+    text_filters = (request.args.get('search') or '', request.args.get('keyword') or '', request.args.get('actor') or '')
+    matches = index.cached_matches(text_filters)
+    if matches is None and any(text_filters):
+        movie_ids = database.get_filtered_movie_ids(*(value or None for value in text_filters))
+        if movie_ids is None:
+            return jsonify({"error": "Database unavailable"}), 503
+        matches = index.remember_matches(text_filters, movie_ids)
+    return jsonify(index.counts(request.args.get('genre'), matches))
+
+@app.route('/api/export', methods=['GET'])
+def export_catalog_api():
+    # Whole catalog, streamed: ?format=ndjson (default, one movie per line) or json (one array).
+    # Movies come in MovieID order, ?after_id= continues an interrupted export; genre, keyword and actor filter it.
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(export.FORMATS)}"}), 400
+    batches = database.export_movies(request.args.get('after_id', 0, type=int), request.args.get('genre'),
+                                     request.args.get('keyword'), request.args.get('actor'), config.EXPORT_BATCH_SIZE)
+    # Runs after the request scope ended, so the export borrows (and returns) its own connection
+    return Response(export.stream(batches, fmt), mimetype=export.FORMATS[fmt])
+
+@app.route('/api/posters/<string:imdb_id>', methods=['GET'])
+def get_poster_api(imdb_id):
+    # Resized poster: ?w= rounds up to one of POSTER_WIDTHS, WebP if the browser accepts it (or ?format=webp|jpeg)
+    width = posters.choose_width(request.args.get('w', 342, type=int))
+    fmt = request.args.get('format') or posters.choose_format(request.headers.get('Accept'))
+    if fmt not in posters.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(posters.FORMATS)}"}), 400
+    try:
+        path = posters.cache.thumbnail(imdb_id, width, fmt)
+    except posters.PosterNotFound:
+        return jsonify({"error": "Poster not found"}), 404
+    except posters.PosterUnavailable as err:
+        return jsonify({"error": str(err)}), 502
+    # The WSGI server's file wrapper sends it with sendfile (or the front server with POSTER_X_SENDFILE)
+    response = send_file(path, mimetype=posters.FORMATS[fmt], max_age=config.POSTER_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.vary.add('Accept')
+    return response
+
+database.get_backend().detect_search_index() # Once here, not inside the first search requests
+recommender.start() # The leaderboards, suggestion and facet indexes are built on their first request
+response_cache.warm_up(app)
 
 if __name__ == '__main__':
     app.run(debug=True) # debug=True for development, remove for production
\ No newline at end of file
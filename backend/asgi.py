@@ -0,0 +1,400 @@
+# backend/asgi.py
+"""
+ASGI version of app.py (same routes, same JSON bytes, same response cache) for serving many concurrent
+clients: a request waiting on the database is a suspended coroutine instead of a blocked thread.
+Run from the backend directory:
+
+    uvicorn asgi:app --workers 4 --port 5000
+
+or `python asgi.py`. At most ASGI_MAX_CONCURRENCY requests are handled at once per worker, the rest
+wait up to ASGI_QUEUE_TIMEOUT seconds and then get a 503. On shutdown new requests get a 503 and the
+database pool is closed once the requests in flight finish (or after ASGI_SHUTDOWN_TIMEOUT seconds).
+"""
+import asyncio
+import contextlib
+import datetime
+import decimal
+import json
+import os
+import time
+import uuid
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags
+import config
+import watchlist_wizard_db as database
+from watchlist_wizard_db import aio
+import response_cache
+import recommender
+import leaderboards
+import suggest
+import facets
+import export
+import posters
+from metrics import metrics, start_request, serialize_seconds, timed, authorized as metrics_authorized
+
+
+def _default(o):
+    # Same conversions as Flask's JSON provider, so both servers send identical bodies (and cache entries)
+    if isinstance(o, datetime.date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+@timed
+def dumps(obj):
+    """JSON body exactly as Flask's jsonify() writes it."""
+    return (json.dumps(obj, default=_default, ensure_ascii=True, sort_keys=True, separators=(",", ":")) + "\n").encode()
+
+
+def json_response(obj, status_code=200):
+    """Like jsonify()."""
+    return Response(dumps(obj), status_code, media_type='application/json')
+
+def compress(request, response):
+    """response_cache.compress_response() for this app."""
+    if response.status_code != 200 or response.media_type != 'application/json' or 'content-encoding' in response.headers:
+        return response
+    encoding = response_cache.choose_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+    body, encoding = response_cache.CachedBody(response.body).encode(encoding)
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, headers=headers, media_type='application/json')
+
+
+async def catalog_version():
+    cache = response_cache.cache
+    if cache.version_due():
+        return cache.record_version(await aio.get_catalog_version())
+    return cache.version
+
+def cached(view):
+    """Async response_cache.cached(): version-tagged cache, ETag/Last-Modified revalidation, compressed variants."""
+    async def wrapper(request):
+        if not config.RESPONSE_CACHE_ENABLED:
+            return compress(request, await view(request))
+        version = await catalog_version()
+        if version is None:
+            return compress(request, await view(request))
+        cache = response_cache.cache
+        key = response_cache.cache_key(request.url.path, request.query_params.multi_items())
+        encoding = response_cache.choose_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+        etag = response_cache.make_etag(key, version, encoding)
+        plain_etag = response_cache.make_etag(key, version, None)
+        if response_cache.not_modified([etag, plain_etag], parse_etags(request.headers.get('if-none-match')),
+                                       parse_date(request.headers.get('if-modified-since'))):
+            return Response(status_code=304, headers=_validators(etag, None))
+
+        entry = cache.get(key, version)
+        cache.maybe_save_popularity()
+        status = 'HIT'
+        if entry is None:
+            caught_up = cache.replicas_caught_up()
+            response = await view(request)
+            if (response.status_code != 200 or response.media_type != 'application/json'
+                    or 'content-encoding' in response.headers or database.request_failed() or not caught_up):
+                response = compress(request, response)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            entry = cache.put(key, version, response.body)
+            status = 'MISS'
+
+        body, encoding = entry.encode(encoding)
+        if encoding is None:
+            etag = plain_etag
+        headers = _validators(etag, encoding)
+        headers['X-Cache'] = status
+        return Response(body, headers=headers, media_type='application/json')
+    return wrapper
+
+def _validators(etag, encoding):
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'}
+    if response_cache.cache.updated_at:
+        headers['Last-Modified'] = http_date(response_cache.cache.updated_at)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+def _int_arg(request, name, default):
+    # request.args.get(name, default, type=int): a missing or malformed value gives the default
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+async def get_movies_api(request):
+    args = request.query_params
+    sort = args.get('sort', 'rating')
+    if sort not in ('rating', 'relevance'):
+        return json_response({"error": "sort must be 'rating' or 'relevance'"}, 400)
+    filters = dict(search_term=args.get('search'), genre_filter=args.get('genre'), keyword_filter=args.get('keyword'),
+                   actor_filter=args.get('actor'), sort=sort)
+    limit = _int_arg(request, 'limit', 250)
+
+    cursor = args.get('cursor')
+    if cursor is not None:
+        try:
+            page = await aio.get_movies_page(limit=limit, cursor=cursor, **filters)
+        except ValueError as err:
+            return json_response({"error": str(err)}, 400)
+        return json_response(page)
+
+    movies = await aio.get_all_movies(limit=limit, offset=_int_arg(request, 'offset', 0), **filters)
+    return json_response(movies)
+
+async def get_movies_batch_api(request):
+    ids = [imdb_id.strip() for value in request.query_params.getlist('ids') for imdb_id in value.split(',') if imdb_id.strip()]
+    if not ids:
+        return json_response({"error": "ids is required, e.g. ?ids=tt0111161,tt0068646"}, 400)
+    try:
+        movies = await aio.get_movies_by_imdb_ids(ids)
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    return json_response(movies)
+
+async def get_movie_details_api(request):
+    movie = await aio.get_movie_by_imdb_id(request.path_params['imdb_id'])
+    if movie:
+        return json_response(movie)
+    return json_response({"error": "Movie not found"}, 404)
+
+async def get_genres_api(request):
+    return json_response(await aio.get_all_genres())
+
+async def get_health_api(request):
+    try:
+        await aio.ping()
+        status, code = "ok", 200
+    except aio.AsyncDatabaseError as err:
+        print(f"Health check failed: {err}")
+        status, code = "database unavailable", 503
+    return compress(request, json_response({"status": status, "pool": aio.pool.stats(), "in_flight": limiter.in_flight}, code))
+
+def metrics_endpoint(view):
+    """The /metrics routes show SQL, plans and code paths: a 404 without the METRICS_TOKEN bearer token."""
+    async def wrapper(request):
+        if not metrics_authorized(request.headers.get('authorization')):
+            return json_response({"error": "Not found"}, 404)
+        return await view(request)
+    return wrapper
+
+async def get_metrics(request):
+    gauges = {'db_pool': aio.pool.stats(), 'response_cache': response_cache.cache.stats,
+              'asgi': {'in_flight': limiter.in_flight}}
+    return Response(metrics.render(gauges), media_type='text/plain; version=0.0.4')
+
+async def get_slow_queries(request):
+    return json_response(database.slow_queries())
+
+async def get_recommendations_api(request):
+    limit = max(1, min(_int_arg(request, 'limit', 20), config.RECOMMENDER_NEIGHBORS))
+    imdb_id = request.query_params.get('imdb_id')
+    if imdb_id:
+        version = await catalog_version()
+        engine = recommender.get_recommender(version) # Catches up in a background thread, never blocks
+        if engine is None:
+            return json_response({"error": "Recommendations are still being computed, try again shortly"}, 503)
+        if engine.version != version:
+            database.mark_request_stale() # Served while the update runs, but not cached at this version
+        movies = engine.similar(imdb_id, limit)
+        if movies is None:
+            return json_response({"error": "Movie not found"}, 404)
+        return json_response(movies)
+
+    decade = leaderboards.decade_of(_int_arg(request, 'decade', None))
+    genre = request.query_params.get('genre', None if decade else 'Drama')
+    version = await catalog_version()
+    boards = leaderboards.get_index(version)
+    if boards is not None:
+        if boards.version != version:
+            database.mark_request_stale()
+        return json_response(boards.top(genre, decade, limit))
+    if decade:
+        return json_response({"error": "Leaderboards are still loading, try again shortly"}, 503)
+    recommendations = await aio.get_top_movies_by_genre(genre, limit=limit)
+    return json_response(recommendations)
+
+async def get_suggest_api(request):
+    kind = request.query_params.get('type') or None
+    if kind and kind not in suggest.TYPES:
+        return json_response({"error": f"type must be one of {', '.join(suggest.TYPES)}"}, 400)
+    limit = max(1, min(_int_arg(request, 'limit', 10), config.SUGGEST_MAX_LIMIT))
+    index = suggest.get_index(await catalog_version())
+    if index is None:
+        return json_response({"error": "Suggestions are still loading, try again shortly"}, 503)
+    return compress(request, json_response(index.suggest(request.query_params.get('q', ''), kind, limit)))
+
+async def get_facets_api(request):
+    args = request.query_params
+    index = facets.get_index(await catalog_version())
+    if index is None:
+        return json_response({"error": "Facet counts are still loading, try again shortly"}, 503)
+    text_filters = (args.get('search') or '', args.get('keyword') or '', args.get('actor') or '')
+    matches = index.cached_matches(text_filters)
+    if matches is None and any(text_filters):
+        movie_ids = await aio.get_filtered_movie_ids(*(value or None for value in text_filters))
+        if movie_ids is None:
+            return json_response({"error": "Database unavailable"}, 503)
+        matches = index.remember_matches(text_filters, movie_ids)
+    return compress(request, json_response(index.counts(args.get('genre'), matches)))
+
+async def export_catalog_api(request):
+    args = request.query_params
+    fmt = args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return json_response({"error": f"format must be one of {', '.join(export.FORMATS)}"}, 400)
+    batches = aio.export_movies(_int_arg(request, 'after_id', 0), args.get('genre'), args.get('keyword'),
+                                args.get('actor'), config.EXPORT_BATCH_SIZE)
+    return StreamingResponse(export.astream(batches, fmt, aio.AsyncDatabaseError), media_type=export.FORMATS[fmt])
+
+async def get_poster_api(request):
+    width = posters.choose_width(_int_arg(request, 'w', 342))
+    fmt = request.query_params.get('format') or posters.choose_format(request.headers.get('accept'))
+    if fmt not in posters.FORMATS:
+        return json_response({"error": f"format must be one of {', '.join(posters.FORMATS)}"}, 400)
+    imdb_id = request.path_params['imdb_id']
+    path = posters.cache.cached(imdb_id, width, fmt)
+    if path is None:
+        # Fetching and resizing block, keep them off the event loop
+        try:
+            path = await asyncio.to_thread(posters.cache.thumbnail, imdb_id, width, fmt)
+        except posters.PosterNotFound:
+            return json_response({"error": "Poster not found"}, 404)
+        except posters.PosterUnavailable as err:
+            return json_response({"error": str(err)}, 502)
+    headers = {'Cache-Control': f"public, max-age={config.POSTER_MAX_AGE}", 'Vary': 'Accept'}
+    # Sent with sendfile by servers that support it (the ASGI pathsend extension)
+    response = FileResponse(path, headers=headers, media_type=posters.FORMATS[fmt], stat_result=os.stat(path))
+    if parse_etags(request.headers.get('if-none-match')).contains(response.headers['etag'].strip('"')):
+        return Response(status_code=304, headers={**headers, 'ETag': response.headers['etag']})
+    return response
+
+
+class Limiter:
+    """
+    Pure ASGI middleware around every HTTP request: caps concurrent requests, opens the DB request scope
+    (begin_request/end_request, as the Flask hooks do), records /metrics and counts requests in flight for shutdown.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.slots = asyncio.Semaphore(config.ASGI_MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.draining = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter() # Latency includes the wait for a free slot
+        if self.draining:
+            return await self._reject(scope, receive, send, "Server is shutting down")
+        try:
+            await asyncio.wait_for(self.slots.acquire(), config.ASGI_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return await self._reject(scope, receive, send, "Server is busy, try again shortly")
+        self.in_flight += 1
+        self.idle.clear()
+        database.begin_request()
+        start_request()
+        sent = {'status': 500, 'bytes': 0}
+
+        async def counting_send(message):
+            if message['type'] == 'http.response.start':
+                sent['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                sent['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            route = scope.get('route')
+            metrics.record(scope['method'], route.path if route else 'unmatched', sent['status'],
+                           time.perf_counter() - start, serialize_seconds(), sent['bytes'])
+            database.end_request()
+            self.slots.release()
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.idle.set()
+
+    async def _reject(self, scope, receive, send, message):
+        response = Response(dumps({"error": message}), 503, headers={'Retry-After': '1'}, media_type='application/json')
+        await response(scope, receive, send)
+
+    async def drain(self, timeout):
+        """Rejects new requests and waits until the ones in flight are done, True if they all finished in time."""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+async def warm_up(app):
+    """response_cache.warm_up() for this app: requests the popular queries in-process, through the middleware."""
+    start = time.perf_counter()
+    keys = response_cache.cache.popular_keys(config.CACHE_WARMUP_QUERIES)
+    for key in keys:
+        path, _, query = key.partition('?')
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': query.encode(),
+                 'headers': [], 'client': None, 'server': None}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+
+        await app(scope, receive, send)
+    print(f"Response cache warmed with {len(keys)} queries in {time.perf_counter() - start:.2f}s.")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await aio.pool.open()
+    await asyncio.to_thread(database.get_backend().detect_search_index) # Once here, not inside the first search requests
+    recommender.start() # The leaderboards, suggestion and facet indexes are built on their first request
+    warmup = None
+    if config.RESPONSE_CACHE_ENABLED and config.CACHE_WARMUP_QUERIES > 0:
+        warmup = asyncio.create_task(warm_up(limiter))
+    yield
+    if warmup:
+        warmup.cancel()
+    if not await limiter.drain(config.ASGI_SHUTDOWN_TIMEOUT):
+        print(f"Shutting down with {limiter.in_flight} requests still running.")
+    response_cache.cache.save_popularity()
+    await aio.pool.close()
+
+
+routes = [
+    Route('/api/movies', cached(get_movies_api)),
+    Route('/api/movies/batch', cached(get_movies_batch_api)),
+    Route('/api/movies/{imdb_id}', cached(get_movie_details_api)),
+    Route('/api/genres', cached(get_genres_api)),
+    Route('/api/health', get_health_api),
+    Route('/api/recommendations', cached(get_recommendations_api)),
+    Route('/api/suggest', get_suggest_api),
+    Route('/api/facets', get_facets_api),
+    Route('/api/export', export_catalog_api),
+    Route('/api/posters/{imdb_id}', get_poster_api),
+    # Sampled profiling is Flask-only: under asyncio a cProfile run would mix in every request it overlaps
+    Route('/metrics', metrics_endpoint(get_metrics)),
+    Route('/metrics/slow-queries', metrics_endpoint(get_slow_queries)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan, middleware=[Middleware(CORSMiddleware, allow_origins=['*'])])
+limiter = Limiter(app)
+app = limiter # Outermost, so rejected requests never reach the routes
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5000, timeout_graceful_shutdown=config.ASGI_SHUTDOWN_TIMEOUT)
@@ -10,6 +10,73 @@ MAX_PAGES = 30
 # Database Config
 load_dotenv()
 DB_HOST = os.getenv('DB_HOST')
+DB_PORT = int(os.getenv('DB_PORT', 3306))
 DB_USER = os.getenv('DB_USER') 
 DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_NAME = os.getenv('DB_NAME')
\ No newline at end of file
+DB_NAME = os.getenv('DB_NAME')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5)) # Max connections per process, shared by all its threads/requests
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5)) # Seconds to wait for a free connection before failing
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30)) # Ping connections idle longer than this
+DB_REPLICA_HOSTS = os.getenv('DB_REPLICA_HOSTS', '') # Read replicas for API reads, comma-separated host[:port]; empty = all on DB_HOST
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5)) # Seconds a replica may be behind before reads skip it (0 = don't check)
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5)) # Seconds between replica health and lag checks
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', '1') == '1' # Server-side prepared statements for hot reads (MySQL)
+
+# Storage backend: 'mysql' (server, settings above) or 'sqlite' (embedded file, no server needed)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'watchlist_wizard.db'))
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 10)) # Seconds to wait for a write lock
+SQLITE_CACHE_MB = int(os.getenv('SQLITE_CACHE_MB', 64))
+SQLITE_MMAP_MB = int(os.getenv('SQLITE_MMAP_MB', 256))
+
+# Response cache for the read endpoints, invalidated whenever the crawler bumps the catalog version
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024)) # Responses kept in memory per process
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', '') # Shared on-disk tier for all worker processes, empty = memory only
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 2)) # Max seconds a stale response can be served
+CACHE_WARMUP_QUERIES = int(os.getenv('CACHE_WARMUP_QUERIES', 20)) # Popular queries requested at startup, 0 = no warm-up
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024)) # Bytes, smaller JSON responses are sent uncompressed
+
+# "More like this" recommendations (see recommender.py)
+RECOMMENDER_PATH = os.getenv('RECOMMENDER_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'recommendations.npz'))
+RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', 50)) # Precomputed neighbours per movie
+RECOMMENDER_REBUILD_FRACTION = float(os.getenv('RECOMMENDER_REBUILD_FRACTION', 0.1)) # Rebuild once this share of movies was added or changed incrementally
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 100)) # Top movies kept in memory per genre, decade and genre+decade (see leaderboards.py)
+
+# ASGI serving mode (backend/asgi.py)
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 20)) # Max async MySQL connections per worker process
+ASGI_MAX_CONCURRENCY = int(os.getenv('ASGI_MAX_CONCURRENCY', 100)) # Requests handled at once per worker, the rest queue
+ASGI_QUEUE_TIMEOUT = float(os.getenv('ASGI_QUEUE_TIMEOUT', 5)) # Seconds a queued request waits before getting a 503
+ASGI_SHUTDOWN_TIMEOUT = float(os.getenv('ASGI_SHUTDOWN_TIMEOUT', 30)) # Seconds shutdown waits for requests in flight
+
+# Metrics and profiling (/metrics)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '') # /metrics* answer only requests with "Authorization: Bearer <token>", empty = endpoints off
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200)) # Reads at least this slow are logged with their EXPLAIN plan, 0 = off
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 300)) # Seconds between EXPLAINs of the same statement, 0 = no plans
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 100)) # Slow queries kept in memory for /metrics/slow-queries
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', '') # Also append them to this file as JSON lines
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0)) # Share of requests run under cProfile, 0 = off
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', 25)) # Functions listed per profile
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 20)) # Profiles kept for /metrics/profiles
+
+# Typeahead suggestions (see suggest.py)
+SUGGEST_MAX_LIMIT = int(os.getenv('SUGGEST_MAX_LIMIT', 20)) # Most suggestions per type and request
+SUGGEST_REBUILD_FRACTION = float(os.getenv('SUGGEST_REBUILD_FRACTION', 0.1)) # Rebuild once this share of movies was added or changed incrementally
+
+# Facet counts (see facets.py)
+FACET_FILTER_CACHE_SIZE = int(os.getenv('FACET_FILTER_CACHE_SIZE', 256)) # Search/keyword/actor filters whose matching movies are kept in memory
+
+# Catalog export (see export.py)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000)) # Rows fetched from the unbuffered cursor and sent at a time
+
+# Poster thumbnails (see posters.py)
+POSTER_CACHE_DIR = os.getenv('POSTER_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'poster_cache'))
+POSTER_CACHE_MB = int(os.getenv('POSTER_CACHE_MB', 1024)) # Disk used by originals and thumbnails, least recently used deleted past it
+POSTER_LOCAL_DIR = os.getenv('POSTER_LOCAL_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'posters')) # <imdb_id>.jpg/.png/.webp used instead of fetching
+POSTER_WIDTHS = sorted(int(w) for w in os.getenv('POSTER_WIDTHS', '92,185,342,500').split(',')) # Thumbnail widths, requests round up to one
+POSTER_QUALITY = int(os.getenv('POSTER_QUALITY', 80)) # WebP/JPEG quality of the thumbnails
+POSTER_MAX_AGE = int(os.getenv('POSTER_MAX_AGE', 30 * 86400)) # Cache-Control max-age of thumbnails, in seconds
+POSTER_ALLOWED_HOSTS = set(h.strip() for h in os.getenv('POSTER_ALLOWED_HOSTS', 'm.media-amazon.com').split(',')) # Hosts posters are fetched from
+POSTER_FETCH_TIMEOUT = float(os.getenv('POSTER_FETCH_TIMEOUT', 10)) # Seconds to download an original poster
+POSTER_MAX_SOURCE_MB = float(os.getenv('POSTER_MAX_SOURCE_MB', 10)) # Larger originals are refused
+POSTER_X_SENDFILE = os.getenv('POSTER_X_SENDFILE', '0') == '1' # Flask: let the front web server (nginx, Apache) send the file
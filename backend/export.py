@@ -0,0 +1,68 @@
+# backend/export.py
+"""
+Streaming catalog export for /api/export. Movies come from an unbuffered cursor batch by batch
+(watchlist_wizard_db.export_movies) and each batch is sent as soon as it is read, so memory stays at one
+batch whatever the catalog size and the first movies arrive before the query finishes.
+
+format=ndjson (default) writes one JSON object per line, format=json a single JSON array. A database error
+mid-stream can't change the status code any more, so it is written as a last {"error": ...} record.
+"""
+import datetime
+import decimal
+import json
+import watchlist_wizard_db as database
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+
+
+def _default(o):
+    # Plain JSON types for downstream tools: ratings as numbers, dates in ISO format
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (datetime.date, datetime.datetime)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def _dumps(row):
+    return json.dumps(row, default=_default, sort_keys=True, separators=(",", ":"))
+
+
+def encode(rows, fmt, first):
+    """Bytes of one batch. first: nothing was sent yet (opens the JSON array)."""
+    if fmt == 'ndjson':
+        return "".join(_dumps(row) + "\n" for row in rows).encode()
+    return (("[" if first else ",") + ",".join(_dumps(row) for row in rows)).encode()
+
+def encode_end(fmt, first):
+    if fmt == 'ndjson':
+        return b""
+    return b"[]\n" if first else b"]\n"
+
+
+def stream(batches, fmt):
+    """Encodes a sync export_movies() generator."""
+    first = True
+    try:
+        for rows in batches:
+            if rows:
+                yield encode(rows, fmt, first)
+                first = False
+    except database.DatabaseError as err:
+        print(f"Error exporting the catalog: {err}")
+        yield encode([{"error": "Export interrupted by a database error"}], fmt, first)
+        first = False
+    yield encode_end(fmt, first)
+
+async def astream(batches, fmt, errors):
+    """Encodes an async export_movies() generator. errors: exception types that end the export with an error record."""
+    first = True
+    try:
+        async for rows in batches:
+            if rows:
+                yield encode(rows, fmt, first)
+                first = False
+    except errors as err:
+        print(f"Error exporting the catalog: {err}")
+        yield encode([{"error": "Export interrupted by a database error"}], fmt, first)
+        first = False
+    yield encode_end(fmt, first)
@@ -0,0 +1,163 @@
+# backend/facets.py
+"""
+Facet counts for the movie browser: for the listing's current filters, how many movies there are per
+genre, decade, rating band and MPAA rating, so the UI can show counts and grey out empty choices.
+
+Every facet value is a bitmap over the catalog (a Python int, bit i = i-th movie by MovieID) built from
+the MovieSearch projection, so a count is an AND and a popcount: a few milliseconds for all values of all
+facets, even on a large catalog. The search, keyword and actor filters are substring and full-text matches,
+their movies are read with one query and turned into a bitmap, kept for the FACET_FILTER_CACHE_SIZE most
+recent filters. The genre counts ignore the genre filter, so they tell what picking another genre would give.
+
+The index is rebuilt in a background thread when the catalog version changes (the current one keeps
+answering meanwhile).
+"""
+import collections
+import threading
+import time
+import numpy as np
+import config
+import watchlist_wizard_db as database
+from watchlist_wizard_db.projection import MAX_GENRE_BIT
+
+FACETS = ('genre', 'decade', 'rating', 'mpaa')
+
+MOVIES_SQL = """
+    SELECT s.MovieID, s.Year, s.Rating, s.GenreMask, m.MPAARating
+    FROM MovieSearch s JOIN Movies m ON m.MovieID = s.MovieID
+    ORDER BY s.MovieID
+"""
+GENRE_NAMES_SQL = "SELECT GenreID, GenreName FROM Genres"
+# Read in the same session as the movies, which may come from a replica behind the primary's version
+VERSION_SQL = "SELECT Version FROM CatalogVersion WHERE ID = 1"
+# Genres past the bits of GenreMask (see projection.py)
+EXTRA_GENRES_SQL = "SELECT MovieID, GenreID FROM MovieGenres WHERE GenreID > %s"
+
+
+def rating_band(rating):
+    """Lower bound of the rating's one-point band, 10 counts as 9 (the 9-10 band)."""
+    return None if rating is None else min(int(rating), 9)
+
+def _bitmap(positions, size):
+    bits = np.zeros(size, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+class FacetIndex:
+    """Bitmaps of every facet value, for one catalog version."""
+
+    def __init__(self, movie_ids, values, version=None):
+        self.position = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        self.all = (1 << len(movie_ids)) - 1
+        self.values = values # {facet: {value: bitmap}}, in display order (genres are sorted by count per request)
+        self.genre_names = {name.lower(): name for name in values['genre']} # The listing matches genres case-insensitively
+        self.version = version
+        self.matches = collections.OrderedDict() # (search, keyword, actor) -> bitmap, least recently used first
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        start = time.perf_counter()
+        with database.session() as db:
+            row = db.fetch_one(VERSION_SQL) # Read before the movies: a write in between only causes another rebuild
+            version = row['Version'] if row else None
+            movies = db.fetch_all(MOVIES_SQL)
+            genre_names = {row['GenreID']: row['GenreName'] for row in db.fetch_all(GENRE_NAMES_SQL)}
+            extra_genres = db.fetch_all(EXTRA_GENRES_SQL, (MAX_GENRE_BIT,))
+        positions = {facet: collections.defaultdict(list) for facet in FACETS}
+        for i, movie in enumerate(movies):
+            positions['decade'][movie['Year'] // 10 * 10 if movie['Year'] else None].append(i)
+            positions['rating'][rating_band(movie['Rating'])].append(i)
+            positions['mpaa'][movie['MPAARating'] or None].append(i)
+            mask = int(movie['GenreMask'])
+            while mask:
+                bit = mask & -mask
+                positions['genre'][genre_names.get(bit.bit_length())].append(i)
+                mask ^= bit
+        position = {movie['MovieID']: i for i, movie in enumerate(movies)}
+        for row in extra_genres:
+            if row['MovieID'] in position:
+                positions['genre'][genre_names.get(row['GenreID'])].append(position[row['MovieID']])
+        positions['genre'].pop(None, None) # Bits of deleted genres
+        for name in genre_names.values():
+            positions['genre'].setdefault(name, []) # Genres without movies still get a (zero) count
+
+        # Decades oldest first, rating bands best first, MPAA ratings most common first; unknown values last
+        order = {
+            'genre': lambda item: item[0],
+            'decade': lambda item: (item[0] is None, item[0] or 0),
+            'rating': lambda item: (item[0] is None, -(item[0] or 0)),
+            'mpaa': lambda item: (item[0] is None, -len(item[1]), item[0]),
+        }
+        values = {facet: {value: _bitmap(movie_positions, len(movies))
+                          for value, movie_positions in sorted(positions[facet].items(), key=order[facet])}
+                  for facet in FACETS}
+        index = cls([movie['MovieID'] for movie in movies], values, version)
+        print(f"Facet index built for {len(movies)} movies in {time.perf_counter() - start:.1f}s.")
+        return index
+
+    def cached_matches(self, text_filters):
+        """Bitmap of the movies matching (search, keyword, actor) if it is cached, else None."""
+        with self.lock:
+            matches = self.matches.get(text_filters)
+            if matches is not None:
+                self.matches.move_to_end(text_filters)
+            return matches
+
+    def remember_matches(self, text_filters, movie_ids):
+        """Caches and returns the bitmap of movie_ids (the result of the text filters)."""
+        matches = _bitmap([self.position[movie_id] for movie_id in movie_ids if movie_id in self.position],
+                          len(self.position))
+        with self.lock:
+            self.matches[text_filters] = matches
+            while len(self.matches) > config.FACET_FILTER_CACHE_SIZE:
+                self.matches.popitem(last=False)
+        return matches
+
+    def counts(self, genre_filter=None, matches=None):
+        """{'total': movies matching every filter, facet: [{'value', 'count'}]}. matches: bitmap of the text filters."""
+        base = self.all if matches is None else matches
+        filtered = base
+        if genre_filter:
+            genre = self.genre_names.get(genre_filter.lower())
+            filtered &= self.values['genre'][genre] if genre else 0
+        result = {'total': filtered.bit_count()}
+        for facet, values in self.values.items():
+            scope = base if facet == 'genre' else filtered
+            result[facet] = [{'value': value, 'count': (scope & bits).bit_count()} for value, bits in values.items()]
+        result['genre'].sort(key=lambda row: -row['count']) # Stable, so ties stay in name order
+        return result
+
+
+_index = None
+_lock = threading.Lock() # Held by the one thread building the index
+
+
+def _rebuild():
+    global _index
+    try:
+        if _index is not None:
+            with database.session() as db:
+                row = db.fetch_one(VERSION_SQL)
+            if row and row['Version'] == _index.version:
+                return # A replica that hasn't applied the newer version yet
+        _index = FacetIndex.build()
+    except database.DatabaseError as err:
+        print(f"Error building facet counts: {err}")
+    finally:
+        _lock.release()
+
+
+def _start_rebuild():
+    if _lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild, name='facets-build', daemon=True).start()
+
+
+def get_index(version):
+    """The index (None until the first build is done, which the first call starts). If it is older than
+    catalog version `version` a rebuild is started in the background, never in the caller's request."""
+    index = _index
+    if index is None or (version is not None and index.version != version):
+        _start_rebuild()
+    return index
@@ -0,0 +1,202 @@
+# backend/leaderboards.py
+"""
+Highest rated movies per genre, per decade and per genre and decade, for /api/recommendations?genre=
+(&decade=), answered from memory. Each leaderboard is a sorted list of the best LEADERBOARD_SIZE movies
+(rating, then year, then newest MovieID first, like the listing), so a request is a slice of it.
+
+When the catalog version changes the MovieSearch rows are read again in a background thread and compared
+with a fingerprint of each movie: only the movies that were added, re-rated or otherwise edited (or
+deleted) are moved in, out of or within their leaderboards. A leaderboard that lost more than half of
+its movies this way is refilled from the rows just read.
+"""
+import bisect
+import collections
+import threading
+import time
+import numpy as np
+import config
+import watchlist_wizard_db as database
+from watchlist_wizard_db.projection import MAX_GENRE_BIT
+
+# Read in the same session as the movies, which may come from a replica behind the primary's version
+VERSION_SQL = "SELECT Version FROM CatalogVersion WHERE ID = 1"
+MOVIES_SQL = "SELECT MovieID, IMDbID, Title, Year, Rating, PosterURL, GenreMask FROM MovieSearch ORDER BY MovieID"
+GENRE_NAMES_SQL = "SELECT GenreID, GenreName FROM Genres"
+# Genres past the bits of GenreMask (see projection.py)
+EXTRA_GENRES_SQL = "SELECT MovieID, GenreID FROM MovieGenres WHERE GenreID > %s"
+FIELDS = ('MovieID', 'Title', 'Year', 'Rating', 'PosterURL', 'IMDbID') # What /api/recommendations?genre= returns
+
+
+def decade_of(year):
+    return year // 10 * 10 if year else None
+
+def sort_key(movie):
+    """Best first: highest rating (unrated last), then latest year, then newest MovieID."""
+    rating = movie['Rating']
+    return (rating is None, -(rating or 0), -(movie['Year'] or 0), -movie['MovieID'])
+
+
+class Leaderboard:
+    """The best `size` movies of one genre and/or decade, sorted."""
+
+    def __init__(self, size):
+        self.size = size
+        self.keys = [] # sort_key() of each movie, best first
+        self.movies = [] # Same order, the response rows
+        self.members = {} # MovieID -> its key
+        self.truncated = False # Movies that didn't fit were dropped, so they are only in the database
+
+    def add(self, key, movie):
+        if self.keys and key > self.keys[-1] and (self.truncated or len(self.keys) >= self.size):
+            # Past the end of a full board, or of one that dropped movies (which may rank before this one)
+            self.truncated = True
+            return
+        position = bisect.bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.movies.insert(position, movie)
+        self.members[movie['MovieID']] = key
+        if len(self.keys) > self.size:
+            self.keys.pop()
+            del self.members[self.movies.pop()['MovieID']]
+            self.truncated = True
+
+    def remove(self, movie_id):
+        key = self.members.pop(movie_id, None)
+        if key is not None:
+            position = bisect.bisect_left(self.keys, key)
+            del self.keys[position], self.movies[position]
+
+    def copy(self):
+        board = Leaderboard(self.size)
+        board.keys, board.movies, board.members = list(self.keys), list(self.movies), dict(self.members)
+        board.truncated = self.truncated
+        return board
+
+    def needs_refill(self):
+        """Removals left it with fewer movies than requests may ask for, while others are missing."""
+        return self.truncated and len(self.keys) < self.size // 2
+
+
+class LeaderboardIndex:
+    """Every leaderboard, keyed by (lowercase genre or None, decade or None), for one catalog version."""
+
+    def __init__(self, version=None):
+        self.size = max(config.LEADERBOARD_SIZE, 2 * config.RECOMMENDER_NEIGHBORS)
+        self.boards = {} # (genre, decade) -> Leaderboard, replaced as a whole by update()
+        self.movie_ids = np.zeros(0, dtype=np.int64) # Sorted, with the fingerprint of each movie's row
+        self.fingerprints = np.zeros(0, dtype=np.int64)
+        self.version = version
+
+    def top(self, genre=None, decade=None, limit=20):
+        board = self.boards.get(((genre or '').lower() or None, decade))
+        return board.movies[:max(limit, 0)] if board else []
+
+    @staticmethod
+    def board_ids(movie, genres):
+        """The leaderboards a movie belongs to."""
+        decade = decade_of(movie['Year'])
+        ids = [(genre.lower(), None) for genre in genres]
+        if decade is not None:
+            ids.append((None, decade))
+            ids.extend((genre.lower(), decade) for genre in genres)
+        return ids
+
+    def update(self):
+        """Reads the catalog and applies what changed since the last call (everything on the first)."""
+        start = time.perf_counter()
+        with database.session() as db:
+            row = db.fetch_one(VERSION_SQL) # Read before the movies: a write in between only causes another update
+            version = row['Version'] if row else None
+            if self.boards and version is not None and version == self.version:
+                return # A replica that hasn't applied the newer version yet
+            rows = db.fetch_all(MOVIES_SQL)
+            genre_names = {row['GenreID']: row['GenreName'] for row in db.fetch_all(GENRE_NAMES_SQL)}
+            extra_genres = db.fetch_all(EXTRA_GENRES_SQL, (MAX_GENRE_BIT,))
+        genres = collections.defaultdict(list)
+        for row in rows:
+            mask = int(row['GenreMask'])
+            while mask:
+                bit = mask & -mask
+                if bit.bit_length() in genre_names: # Else a deleted genre
+                    genres[row['MovieID']].append(genre_names[bit.bit_length()])
+                mask ^= bit
+        for row in extra_genres:
+            if row['GenreID'] in genre_names:
+                genres[row['MovieID']].append(genre_names[row['GenreID']])
+
+        movies = {row['MovieID']: {field: row[field] for field in FIELDS} for row in rows}
+        movie_ids = np.fromiter(movies, dtype=np.int64, count=len(movies))
+        fingerprints = np.fromiter((hash((tuple(movie.values()), tuple(genres[movie_id])))
+                                    for movie_id, movie in movies.items()), dtype=np.int64, count=len(movies))
+        # New movies and movies whose row or genres changed, then the ones that are gone
+        if len(self.movie_ids):
+            positions = np.searchsorted(self.movie_ids, movie_ids).clip(max=len(self.movie_ids) - 1)
+            same = (self.movie_ids[positions] == movie_ids) & (self.fingerprints[positions] == fingerprints)
+        else:
+            same = np.zeros(len(movie_ids), dtype=bool)
+        changed = movie_ids[~same].tolist()
+        deleted = np.setdiff1d(self.movie_ids, movie_ids, assume_unique=True).tolist()
+
+        if changed or deleted:
+            # Changed boards are copies swapped in at the end, so requests never see a half-applied update
+            boards = dict(self.boards)
+            copied = set()
+            def board(board_id):
+                if board_id not in copied:
+                    boards[board_id] = boards[board_id].copy() if board_id in boards else Leaderboard(self.size)
+                    copied.add(board_id)
+                return boards[board_id]
+
+            gone = set(changed) | set(deleted)
+            for board_id, current in self.boards.items():
+                for movie_id in [movie_id for movie_id in current.members if movie_id in gone]:
+                    board(board_id).remove(movie_id)
+            # Best first, so a full board turns away the rest without inserting
+            for movie_id in sorted(changed, key=lambda movie_id: sort_key(movies[movie_id])):
+                movie = movies[movie_id]
+                for board_id in self.board_ids(movie, genres[movie_id]):
+                    board(board_id).add(sort_key(movie), movie)
+            refill = {board_id for board_id in copied if boards[board_id].needs_refill()}
+            if refill:
+                for board_id in refill:
+                    boards[board_id] = Leaderboard(self.size)
+                for movie_id in sorted(movies, key=lambda movie_id: sort_key(movies[movie_id])):
+                    movie = movies[movie_id]
+                    for board_id in self.board_ids(movie, genres[movie_id]):
+                        if board_id in refill:
+                            boards[board_id].add(sort_key(movie), movie)
+            self.boards = {board_id: board for board_id, board in boards.items() if board.keys} # Drops emptied genres and decades
+            print(f"Leaderboards updated for {len(changed)} changed and {len(deleted)} deleted movies"
+                  f"{f' ({len(refill)} refilled)' if refill else ''} in {time.perf_counter() - start:.2f}s.")
+        self.movie_ids, self.fingerprints = movie_ids, fingerprints
+        self.version = version
+
+
+_index = None
+_lock = threading.Lock() # Held by the one thread building or updating the index
+
+
+def _update():
+    global _index
+    try:
+        index = _index or LeaderboardIndex()
+        index.update()
+        _index = index
+    except database.DatabaseError as err:
+        print(f"Error updating leaderboards: {err}")
+    finally:
+        _lock.release()
+
+
+def _start_update():
+    if _lock.acquire(blocking=False):
+        threading.Thread(target=_update, name='leaderboards-update', daemon=True).start()
+
+
+def get_index(version):
+    """The leaderboards (None until the first build is done, which the first call starts). If they are behind
+    catalog version `version` they are brought up to date in the background, never in the caller's request."""
+    index = _index
+    if index is None or (version is not None and index.version != version):
+        _start_update()
+    return index
@@ -0,0 +1,187 @@
+# backend/metrics.py
+"""
+Request metrics for the API: per-endpoint latency histograms, time spent in the database vs. serializing
+JSON, DB rows read and bytes sent, in the Prometheus text format on /metrics. Numbers are per worker
+process (scrape each worker, or run one). Slow queries with their EXPLAIN plans are on /metrics/slow-queries.
+The endpoints only answer requests with "Authorization: Bearer METRICS_TOKEN", and are off without a token.
+
+Sampled profiling (Flask app): with PROFILE_SAMPLE_RATE > 0 that share of requests runs under cProfile
+(one at a time) and the hottest functions of the last PROFILE_KEEP profiles are on /metrics/profiles.
+"""
+import collections
+import contextvars
+import cProfile
+import datetime
+import hmac
+import io
+import pstats
+import random
+import threading
+import time
+import config
+import watchlist_wizard_db as database
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+
+# Serialization time of the current request, added to by timed()
+_serialize_seconds = contextvars.ContextVar('serialize_seconds', default=None)
+
+
+class EndpointStats:
+    """Totals of one (method, endpoint)."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1) # The last one is +Inf
+        self.statuses = collections.Counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, status, seconds, db, serialize_seconds, nbytes):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.statuses[status] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.db_seconds += db['db_seconds']
+        self.serialize_seconds += serialize_seconds
+        self.queries += db['queries']
+        self.rows += db['rows']
+        self.bytes += nbytes
+
+
+class Metrics:
+    def __init__(self):
+        self.endpoints = collections.defaultdict(EndpointStats)
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, method, endpoint, status, seconds, serialize_seconds, nbytes):
+        """Adds a finished request, with the DB totals of its request scope (call before end_request())."""
+        db = database.request_stats()
+        with self.lock:
+            self.endpoints[(method, endpoint)].add(status, seconds, db, serialize_seconds, nbytes)
+
+    def render(self, gauges=None):
+        """Prometheus text format. gauges: {'db_pool': {'in_use': 1, ...}, ...} of extra numbers to expose."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP watchlist_{name} {help_text}")
+            lines.append(f"# TYPE watchlist_{name} {kind}")
+            lines.extend(f"watchlist_{name}{labels} {value}" for labels, value in samples)
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            histogram = []
+            for (method, endpoint), stats in endpoints:
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                total = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+                    total += count
+                    histogram.append((f'_bucket{{{labels},le="{bound}"}}', total))
+                histogram.append((f'_sum{{{labels}}}', round(stats.seconds, 6)))
+                histogram.append((f'_count{{{labels}}}', stats.count))
+            lines.append("# HELP watchlist_request_duration_seconds Request latency.")
+            lines.append("# TYPE watchlist_request_duration_seconds histogram")
+            lines.extend(f"watchlist_request_duration_seconds{suffix} {value}" for suffix, value in histogram)
+
+            def per_endpoint(attribute, digits=None):
+                return [(f'{{method="{method}",endpoint="{endpoint}"}}',
+                         round(getattr(stats, attribute), digits) if digits else getattr(stats, attribute))
+                        for (method, endpoint), stats in endpoints]
+
+            metric('requests_total', 'counter', "Requests by response status.",
+                   [(f'{{method="{method}",endpoint="{endpoint}",status="{status}"}}', count)
+                    for (method, endpoint), stats in endpoints for status, count in sorted(stats.statuses.items())])
+            metric('db_seconds_total', 'counter', "Time spent waiting on database reads.", per_endpoint('db_seconds', 6))
+            metric('serialize_seconds_total', 'counter', "Time spent encoding JSON bodies.", per_endpoint('serialize_seconds', 6))
+            metric('db_queries_total', 'counter', "Database reads.", per_endpoint('queries'))
+            metric('db_rows_total', 'counter', "Rows returned by database reads.", per_endpoint('rows'))
+            metric('response_bytes_total', 'counter', "Response body bytes sent (after compression).", per_endpoint('bytes'))
+
+        for group, values in sorted((gauges or {}).items()):
+            for name, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric(f"{group}_{name}", 'gauge', f"{group} {name}.", [('', value)])
+        metric('uptime_seconds', 'gauge', "Seconds since this worker started.", [('', round(time.time() - self.started, 1))])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def authorized(authorization):
+    """True if an Authorization header value carries METRICS_TOKEN (never when no token is configured)."""
+    if not config.METRICS_TOKEN:
+        return False
+    return hmac.compare_digest((authorization or '').encode(), f"Bearer {config.METRICS_TOKEN}".encode())
+
+
+def start_request():
+    """Starts counting serialization time for the current request (thread or asyncio task)."""
+    _serialize_seconds.set([0.0])
+
+def serialize_seconds():
+    counter = _serialize_seconds.get()
+    return counter[0] if counter else 0.0
+
+def timed(dumps):
+    """Wraps a JSON encoding function so its time counts as the request's serialization time."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return dumps(*args, **kwargs)
+        finally:
+            counter = _serialize_seconds.get()
+            if counter:
+                counter[0] += time.perf_counter() - start
+    return wrapper
+
+
+class Profiler:
+    """Runs a sample of requests under cProfile, one at a time (cProfile can't nest or overlap)."""
+
+    def __init__(self, keep):
+        self.profiles = collections.deque(maxlen=keep)
+        self.busy = threading.Lock()
+
+    def start(self):
+        """A running cProfile.Profile if this request was sampled, else None."""
+        if config.PROFILE_SAMPLE_RATE <= 0 or random.random() >= config.PROFILE_SAMPLE_RATE:
+            return None
+        if not self.busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError: # Another profiler (a debugger, coverage) is active
+            self.busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, method, path, seconds):
+        profile.disable()
+        self.busy.release()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(config.PROFILE_TOP_FUNCTIONS)
+        self.profiles.append({
+            'at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'request': f"{method} {path}",
+            'ms': round(seconds * 1000, 1),
+            'stats': out.getvalue().strip().splitlines(),
+        })
+
+    def recent(self):
+        return list(reversed(self.profiles))
+
+
+profiler = Profiler(config.PROFILE_KEEP)
@@ -0,0 +1,218 @@
+# backend/posters.py
+"""
+Poster thumbnails for /api/posters/<imdb_id>?w=: the movie grid loads small resized posters from the API
+instead of the full-size images on IMDb's CDN.
+
+Each poster is fetched once (from the movie's PosterURL, or taken from POSTER_LOCAL_DIR/<imdb_id>.jpg|png|webp
+when supplied locally) and kept in POSTER_CACHE_DIR/original. A requested width is rounded up to one of
+POSTER_WIDTHS, so only a few thumbnails exist per poster, each resized and encoded (WebP for browsers that
+accept it, JPEG otherwise) on its first request and then served straight from disk. Once the cache grows
+past POSTER_CACHE_MB the least recently used files are deleted.
+"""
+import http.client
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import config
+import watchlist_wizard_db as database
+
+try:
+    from PIL import Image
+except ImportError: # Only the poster endpoint needs Pillow
+    Image = None
+
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+LOCAL_EXTENSIONS = ('jpg', 'jpeg', 'png', 'webp')
+IMDB_ID = re.compile(r'tt\d{1,12}')
+TOUCH_INTERVAL = 3600 # Seconds between access-time updates of a cached file, for the LRU order
+RETRY_INTERVAL = 300 # Seconds before a poster that couldn't be fetched is tried again
+
+POSTER_SQL = "SELECT PosterURL FROM Movies WHERE IMDbID = %s"
+
+
+class PosterNotFound(Exception):
+    """Unknown movie, or a movie without a poster."""
+
+class PosterUnavailable(Exception):
+    """The poster exists but couldn't be fetched or decoded (or Pillow is missing)."""
+
+
+def choose_width(requested):
+    """The smallest of POSTER_WIDTHS at least `requested` wide, the largest if none is."""
+    for width in config.POSTER_WIDTHS:
+        if width >= requested:
+            return width
+    return config.POSTER_WIDTHS[-1]
+
+def choose_format(accept):
+    """WebP when the Accept header allows it (all current browsers), JPEG otherwise."""
+    return 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+
+
+class PosterCache:
+    """Original posters and their thumbnails on disk, bounded to max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None # Bytes on disk, counted on the first write
+        self.size_lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(64)] # One poster is fetched and resized by one thread at a time
+        self.failed = {} # IMDb ID -> time of the last failed fetch
+
+    def path(self, imdb_id, width, fmt):
+        return os.path.join(self.directory, str(width), f"{imdb_id}.{EXTENSIONS[fmt]}")
+
+    def cached(self, imdb_id, width, fmt):
+        """Path of the thumbnail if it is already on disk, else None."""
+        if not IMDB_ID.fullmatch(imdb_id):
+            return None
+        path = self.path(imdb_id, width, fmt)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path) # Eviction goes by modification time: mark it as used
+            except OSError:
+                pass
+        return path
+
+    def thumbnail(self, imdb_id, width, fmt):
+        """Path of the thumbnail, fetching the poster and resizing it if needed."""
+        if not IMDB_ID.fullmatch(imdb_id):
+            raise PosterNotFound(imdb_id)
+        path = self.cached(imdb_id, width, fmt)
+        if path:
+            return path
+        if Image is None:
+            raise PosterUnavailable("Pillow is not installed (pip install Pillow)")
+        with self.key_locks[hash(imdb_id) % len(self.key_locks)]:
+            path = self.cached(imdb_id, width, fmt) # Another thread may have made it meanwhile
+            if path:
+                return path
+            data = self.original(imdb_id)
+            try:
+                thumbnail = resize(data, width, fmt)
+            except (OSError, ValueError, Image.DecompressionBombError) as err:
+                raise PosterUnavailable(f"Unreadable poster image: {err}")
+            return self.write(self.path(imdb_id, width, fmt), thumbnail)
+
+    def original(self, imdb_id):
+        """Bytes of the full-size poster: the local one, the cached one, or fetched from PosterURL."""
+        for ext in LOCAL_EXTENSIONS:
+            local = os.path.join(config.POSTER_LOCAL_DIR, f"{imdb_id}.{ext}")
+            if os.path.isfile(local):
+                with open(local, 'rb') as f:
+                    return f.read()
+        path = os.path.join(self.directory, 'original', imdb_id)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+        if time.time() - self.failed.get(imdb_id, 0) < RETRY_INTERVAL:
+            raise PosterUnavailable("Poster fetch failed recently, not retrying yet")
+        try:
+            with database.session() as db:
+                row = db.fetch_one(POSTER_SQL, (imdb_id,))
+        except database.DatabaseError as err:
+            print(f"Error looking up poster of {imdb_id}: {err}")
+            raise PosterUnavailable("Database unavailable")
+        if not row or not row['PosterURL']:
+            raise PosterNotFound(imdb_id)
+        try:
+            data = fetch(row['PosterURL'])
+        except (OSError, ValueError, http.client.HTTPException) as err: # URLError and timeouts are OSErrors
+            print(f"Error fetching poster of {imdb_id} from {row['PosterURL']}: {err}")
+            self.failed[imdb_id] = time.time()
+            raise PosterUnavailable("Poster could not be fetched")
+        self.failed.pop(imdb_id, None)
+        self.write(path, data)
+        return data
+
+    def write(self, path, data):
+        """Writes the file atomically (readers never see half of it) and evicts if the cache is over its size."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            f.write(data)
+        os.chmod(f.name, 0o644) # Readable by a front web server sending it (POSTER_X_SENDFILE)
+        os.replace(f.name, path)
+        with self.size_lock:
+            if self.size is None:
+                self.size = sum(size for _, _, size in self._files())
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict(path)
+        return path
+
+    def _files(self):
+        """(mtime, path, size) of every cached file."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # Evicted by another process
+                files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def _evict(self, keep):
+        # Down to 90% of the limit, so the walk over the files doesn't happen again on the next write.
+        # keep: the file just written, about to be sent
+        files = sorted(self._files())
+        self.size = sum(size for _, _, size in files)
+        removed = 0
+        for _, path, size in files:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            removed += 1
+        print(f"Poster cache over {self.max_bytes // 2**20}MB, removed {removed} least recently used files.")
+
+
+def fetch(url):
+    """Downloads a poster. Only https URLs on POSTER_ALLOWED_HOSTS, at most POSTER_MAX_SOURCE_MB."""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme != 'https' or parsed.hostname not in config.POSTER_ALLOWED_HOSTS:
+        raise ValueError("only https URLs on POSTER_ALLOWED_HOSTS are fetched")
+    limit = int(config.POSTER_MAX_SOURCE_MB * 2**20)
+    request = urllib.request.Request(url, headers={'User-Agent': 'Watchlist-Wizard poster cache'})
+    with urllib.request.urlopen(request, timeout=config.POSTER_FETCH_TIMEOUT) as response:
+        data = response.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"poster is over {config.POSTER_MAX_SOURCE_MB}MB")
+    return data
+
+def resize(data, width, fmt):
+    """Encoded thumbnail `width` pixels wide (never wider than the original), aspect ratio kept."""
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', (width, width * 4)) # JPEGs decode straight at a smaller scale, much faster
+    image = image.convert('RGB')
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', quality=config.POSTER_QUALITY, method=4)
+    else:
+        image.save(out, 'JPEG', quality=config.POSTER_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+cache = PosterCache(config.POSTER_CACHE_DIR, config.POSTER_CACHE_MB * 2**20)
@@ -0,0 +1,461 @@
+# backend/recommender.py
+"""
+Content-based "more like this" recommendations. Every movie becomes a sparse feature vector (genres,
+TF-IDF weighted plot keywords, directors, actors, decade and rating bucket), each block normalized and
+weighted, so the cosine similarity of two movies is a plain dot product. The top RECOMMENDER_NEIGHBORS
+neighbours of every movie are precomputed with sparse matrix products, kept in memory and saved to
+RECOMMENDER_PATH, so /api/recommendations?imdb_id= is a lookup.
+
+When the catalog version changes, a background thread vectorizes the movies added or changed since
+(MovieSearch.ChangedVersion: re-crawled movies and movies that got credits linked later, too) with the
+existing vocabulary and merges them into the neighbour lists of a copy of the model, which then replaces
+it. Once they make up more than RECOMMENDER_REBUILD_FRACTION of the model the whole model is rebuilt
+instead (IDF weights drift as the catalog grows).
+
+With several worker processes only one builds and updates the model: the one holding a lock on
+RECOMMENDER_PATH.lock, which saves every new model to RECOMMENDER_PATH. The others load that file and
+reload it when it changes, so the work (and the wait before ?imdb_id= can be answered) isn't repeated per
+worker.
+
+Precompute from the backend directory: python recommender.py build
+"""
+import argparse
+import collections
+import copy
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import sparse
+import config
+import watchlist_wizard_db as database
+
+try:
+    import fcntl
+except ImportError: # Windows: every process builds its own model
+    fcntl = None
+
+# Relative weight of each feature block in the similarity
+BLOCK_WEIGHTS = {'genre': 1.0, 'keyword': 1.0, 'director': 0.7, 'actor': 1.0, 'decade': 0.4, 'rating': 0.4}
+
+# {where} is a condition on the MovieID column ({column}), the whole catalog or one chunk of changed movies
+MOVIES_SQL = "SELECT MovieID, IMDbID, Title, Year, Rating, PosterURL FROM Movies WHERE {where} ORDER BY MovieID"
+GENRES_SQL = """
+    SELECT mg.MovieID, g.GenreName FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+    WHERE {where}
+"""
+KEYWORDS_SQL = "SELECT MovieID, KeywordID FROM MovieKeywords WHERE {where}"
+CREDITS_SQL = """
+    SELECT mp.MovieID, mp.PersonID, r.RoleName FROM MoviePeople mp JOIN Roles r ON r.RoleID = mp.RoleID
+    WHERE {where} AND r.RoleName IN ('Director', 'Actor')
+"""
+LISTING_SQL = "SELECT MovieID, IMDbID, Title, Year, Rating, PosterURL FROM Movies"
+VERSION_SQL = "SELECT Version, UpdatedAt FROM CatalogVersion WHERE ID = 1"
+# Written by refresh_movie_search() in the transaction that changed the movie (migration 7)
+CHANGED_MOVIES_SQL = "SELECT MovieID FROM MovieSearch WHERE ChangedVersion > %s"
+LOAD_CHUNK = 1000 # Changed MovieIDs per feature query
+
+SIMILARITY_CELLS = 20_000_000 # Size of the dense similarity block computed at once (80MB of float32)
+BUILD_THREADS = min(4, os.cpu_count() or 1) # Each holds one similarity block in memory
+DENSE_COLUMN_SHARE = 0.01 # Features of more than 1% of movies are multiplied as dense columns
+
+
+def load_features(db, movie_ids=None):
+    """Movies (all of them, or those of movie_ids) and their tokens: ([movie rows], {MovieID: [(block, token)]})."""
+    if movie_ids is None:
+        chunks = [("1 = 1", ())]
+    else:
+        movie_ids = sorted(set(movie_ids))
+        chunks = [(f"{{column}} IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+                  for chunk in (movie_ids[i:i + LOAD_CHUNK] for i in range(0, len(movie_ids), LOAD_CHUNK))]
+    movies = []
+    tokens = collections.defaultdict(list)
+    for where, params in chunks:
+        chunk_movies = db.fetch_all(MOVIES_SQL.format(where=where.format(column='MovieID')), params)
+        for movie in chunk_movies:
+            if movie['Year']:
+                tokens[movie['MovieID']].append(('decade', movie['Year'] // 10 * 10))
+            if movie['Rating'] is not None:
+                tokens[movie['MovieID']].append(('rating', int(movie['Rating'])))
+        movies += chunk_movies
+        for row in db.fetch_all(GENRES_SQL.format(where=where.format(column='mg.MovieID')), params):
+            tokens[row['MovieID']].append(('genre', row['GenreName']))
+        for row in db.fetch_all(KEYWORDS_SQL.format(where=where.format(column='MovieID')), params):
+            tokens[row['MovieID']].append(('keyword', row['KeywordID']))
+        for row in db.fetch_all(CREDITS_SQL.format(where=where.format(column='mp.MovieID')), params):
+            tokens[row['MovieID']].append(('director' if row['RoleName'] == 'Director' else 'actor', row['PersonID']))
+    return movies, tokens
+
+
+def keyword_idf(df, movie_count):
+    return math.log((1 + movie_count) / (1 + df)) + 1
+
+
+def vectorize(movie_ids, tokens, vocabulary, idf, new_keyword_idf=1.0):
+    """Rows of L2-normalized feature vectors. New tokens are appended to vocabulary/idf in place."""
+    rows, cols, values = [], [], []
+    for row, movie_id in enumerate(movie_ids):
+        blocks = collections.defaultdict(dict)
+        for block, token in tokens.get(movie_id, ()):
+            column = vocabulary.get((block, token))
+            if column is None:
+                column = vocabulary[(block, token)] = len(vocabulary)
+                idf.append(new_keyword_idf if block == 'keyword' else 1.0)
+            blocks[block][column] = idf[column] if block == 'keyword' else 1.0
+        for block, weights in blocks.items():
+            # Each block gets unit length times its weight, so a movie with 40 keywords and 3 genres
+            # isn't compared on keywords alone
+            scale = BLOCK_WEIGHTS[block] / math.sqrt(sum(w * w for w in weights.values()))
+            for column, weight in weights.items():
+                rows.append(row)
+                cols.append(column)
+                values.append(weight * scale)
+    matrix = sparse.csr_matrix((np.array(values, dtype=np.float32), (rows, cols)),
+                               shape=(len(movie_ids), len(vocabulary)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms).astype(np.float32) @ matrix)
+
+
+class SimilarityIndex:
+    """Computes dot products of query rows against a matrix. Columns shared by many movies (genres,
+    decades, rating buckets) make almost every pair of movies overlap, which is slow as a sparse product,
+    so those are multiplied as a small dense block with BLAS and only the rare columns (keywords, people)
+    go through the sparse product."""
+
+    def __init__(self, matrix):
+        movies_per_column = np.diff(matrix.tocsc().indptr)
+        self.dense_columns = np.flatnonzero(movies_per_column > matrix.shape[0] * DENSE_COLUMN_SHARE)
+        self.sparse_columns = np.flatnonzero(movies_per_column <= matrix.shape[0] * DENSE_COLUMN_SHARE)
+        self.dense_t = np.ascontiguousarray(matrix[:, self.dense_columns].toarray().T)
+        self.sparse_t = matrix[:, self.sparse_columns].T.tocsr()
+
+    def similarities(self, queries):
+        queries = sparse.csr_matrix(queries)
+        sims = queries[:, self.dense_columns].toarray() @ self.dense_t
+        sims += (queries[:, self.sparse_columns] @ self.sparse_t).toarray()
+        return sims
+
+
+def top_k(queries, matrix, k, query_rows=None):
+    """(neighbour rows, scores) of each query row against matrix, best first. If the queries are rows
+    query_rows of matrix itself, a movie is not its own neighbour."""
+    k = min(k, matrix.shape[0] - (1 if query_rows is not None else 0))
+    neighbors = np.full((queries.shape[0], max(k, 0)), -1, dtype=np.int32)
+    scores = np.zeros((queries.shape[0], max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return neighbors, scores
+    index = SimilarityIndex(matrix)
+    chunk = max(1, SIMILARITY_CELLS // max(matrix.shape[0], 1))
+
+    def run(start):
+        end = min(start + chunk, queries.shape[0])
+        sims = index.similarities(queries[start:end])
+        if query_rows is not None:
+            sims[np.arange(end - start), query_rows[start:end]] = -np.inf
+        best = np.argpartition(sims, -k, axis=1)[:, -k:]
+        best_scores = np.take_along_axis(sims, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        neighbors[start:end] = np.take_along_axis(best, order, axis=1)
+        scores[start:end] = np.take_along_axis(best_scores, order, axis=1)
+
+    # NumPy's BLAS and partition release the GIL, so chunks run in parallel on several cores
+    with ThreadPoolExecutor(max_workers=BUILD_THREADS) as executor:
+        list(executor.map(run, range(0, queries.shape[0], chunk)))
+    return neighbors, scores
+
+
+class Recommender:
+    """Feature matrix and precomputed neighbour lists, rows in MovieID order."""
+
+    def __init__(self, movie_ids, matrix, vocabulary, idf, neighbors, scores, version, built_count,
+                 updated_at=None, changed_count=0):
+        self.movie_ids = movie_ids # np.int64 MovieID per row
+        self.matrix = matrix
+        self.vocabulary = vocabulary # (block, token) -> column
+        self.idf = idf
+        self.neighbors = neighbors
+        self.scores = scores
+        self.version = version # Catalog version the model includes, None if the database has none
+        self.updated_at = updated_at # Its CatalogVersion.UpdatedAt as text, tells a restored database from a lagging replica
+        self.built_count = built_count # Movies in the last full build, for the rebuild threshold
+        self.changed_count = changed_count # Movies added or re-vectorized since then
+        self.row_of = {int(movie_id): row for row, movie_id in enumerate(movie_ids)}
+        self.movies = {} # row -> listing fields, from refresh_listing()
+        self.row_of_imdb_id = {}
+
+    @classmethod
+    def build(cls, k=None):
+        """Full batch build from the database."""
+        k = k or config.RECOMMENDER_NEIGHBORS
+        start = time.perf_counter()
+        with database.session() as db:
+            version = db.fetch_one(VERSION_SQL) # Read before the movies: a write in between is only applied again
+            movies, tokens = load_features(db)
+        movie_ids = np.array([movie['MovieID'] for movie in movies], dtype=np.int64)
+        df = collections.Counter(token for movie_tokens in tokens.values()
+                                 for block, token in set(movie_tokens) if block == 'keyword')
+        vocabulary, idf = {}, []
+        for keyword_id, count in df.items():
+            vocabulary[('keyword', keyword_id)] = len(idf)
+            idf.append(keyword_idf(count, len(movies)))
+        matrix = vectorize(movie_ids, tokens, vocabulary, idf)
+        neighbors, scores = top_k(matrix, matrix, k, query_rows=np.arange(len(movies)))
+        engine = cls(movie_ids, matrix, vocabulary, idf, neighbors, scores, version and version['Version'],
+                     len(movies), version and str(version['UpdatedAt']))
+        engine.refresh_listing()
+        print(f"Recommender built for {len(movies)} movies in {time.perf_counter() - start:.1f}s.")
+        return engine
+
+    def updated(self, movies, tokens, version):
+        """
+        Incremental update: a copy of the model with `movies` (new, or changed since they were vectorized)
+        vectorized and merged into everyone's neighbour lists. This one is left untouched for the requests
+        using it meanwhile. version: the CatalogVersion row the movies were read at.
+        """
+        if not movies:
+            engine = copy.copy(self)
+            engine.version, engine.updated_at = version['Version'], str(version['UpdatedAt'])
+            return engine
+        k = self.neighbors.shape[1] or config.RECOMMENDER_NEIGHBORS
+        old_count = len(self.movie_ids)
+        vocabulary, idf, row_of = dict(self.vocabulary), list(self.idf), dict(self.row_of)
+        movie_ids = np.array([movie['MovieID'] for movie in movies], dtype=np.int64)
+        # Keywords the model hasn't seen are weighted as if they were unique to one movie
+        new_rows = vectorize(movie_ids, tokens, vocabulary, idf, keyword_idf(1, self.built_count))
+        added = [movie_id for movie_id in movie_ids.tolist() if movie_id not in row_of]
+        row_of.update({movie_id: old_count + i for i, movie_id in enumerate(added)})
+        rows = np.array([row_of[movie_id] for movie_id in movie_ids.tolist()], dtype=np.int64)
+        all_ids = np.concatenate([self.movie_ids, np.array(added, dtype=np.int64)])
+
+        # Changed movies' rows are replaced by their new vectors, new movies' appended
+        matrix = self.matrix.copy()
+        matrix.resize((old_count, len(vocabulary))) # New tokens may have added columns
+        take = np.arange(len(all_ids))
+        take[rows] = old_count + np.arange(len(movie_ids))
+        matrix = sparse.vstack([matrix, new_rows]).tocsr()[take]
+
+        neighbors = np.full((len(all_ids), k), -1, dtype=np.int32)
+        scores = np.zeros((len(all_ids), k), dtype=np.float32)
+        # Other movies: their neighbours among the updated movies are scored again, then the best k kept.
+        # A list that loses an updated movie this way is one shorter until the next rebuild.
+        is_updated = np.zeros(len(all_ids), dtype=bool)
+        is_updated[rows] = True
+        new_index = SimilarityIndex(new_rows)
+        chunk = max(1, SIMILARITY_CELLS // max(len(movie_ids), 1))
+        for start in range(0, old_count, chunk):
+            end = min(start + chunk, old_count)
+            sims = new_index.similarities(matrix[start:end])
+            old_neighbors = self.neighbors[start:end]
+            old_scores = self.scores[start:end].astype(np.float32)
+            old_scores[(old_neighbors < 0) | is_updated[old_neighbors.clip(min=0)]] = -np.inf # Padding, stale scores
+            merged_scores = np.hstack([old_scores, sims])
+            merged = np.hstack([old_neighbors, np.broadcast_to(rows.astype(np.int32), sims.shape)])
+            order = np.argsort(-merged_scores, axis=1)[:, :k]
+            neighbors[start:end, :order.shape[1]] = np.take_along_axis(merged, order, axis=1)
+            scores[start:end, :order.shape[1]] = np.take_along_axis(merged_scores, order, axis=1)
+        neighbors[np.isneginf(scores)] = -1
+        # Updated movies: ranked against the whole catalog (an updated movie's old list is overwritten here)
+        new_neighbors, new_scores = top_k(new_rows, matrix, k, query_rows=rows)
+        neighbors[rows] = -1
+        neighbors[rows, :new_neighbors.shape[1]] = new_neighbors
+        scores[rows] = 0
+        scores[rows, :new_scores.shape[1]] = new_scores
+        scores[neighbors < 0] = 0
+
+        engine = Recommender(all_ids, matrix, vocabulary, idf, neighbors, scores, version['Version'], self.built_count,
+                             str(version['UpdatedAt']), self.changed_count + len(movie_ids))
+        engine.movies, engine.row_of_imdb_id = dict(self.movies), dict(self.row_of_imdb_id)
+        for movie, row in zip(movies, rows.tolist()):
+            engine.movies[row] = movie # Same fields as the listing rows
+            engine.row_of_imdb_id[movie['IMDbID']] = row
+        return engine
+
+    def refresh_listing(self):
+        """Loads the listing fields returned with recommendations (updated() keeps them current afterwards)."""
+        with database.session() as db:
+            rows = db.fetch_all(LISTING_SQL)
+        movies, row_of_imdb_id = {}, {}
+        for movie in rows:
+            row = self.row_of.get(movie['MovieID'])
+            if row is not None:
+                movies[row] = movie
+                row_of_imdb_id[movie['IMDbID']] = row
+        self.movies, self.row_of_imdb_id = movies, row_of_imdb_id
+
+    def similar(self, imdb_id, limit=20):
+        """Most similar movies to imdb_id with their Score (cosine similarity), None if it isn't in the model."""
+        row = self.row_of_imdb_id.get(imdb_id)
+        if row is None:
+            return None
+        result = []
+        for neighbor, score in zip(self.neighbors[row], self.scores[row]):
+            if neighbor < 0 or len(result) >= limit:
+                break
+            movie = self.movies.get(int(neighbor))
+            if movie: # Deleted since the build
+                result.append({**movie, 'Score': round(float(score), 4)})
+        return result
+
+    def save(self, path):
+        keys = sorted(self.vocabulary, key=self.vocabulary.get)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, movie_ids=self.movie_ids, neighbors=self.neighbors, scores=self.scores,
+                 data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+                 shape=np.array(self.matrix.shape), idf=np.array(self.idf, dtype=np.float64),
+                 vocabulary_blocks=np.array([block for block, _ in keys]),
+                 vocabulary_tokens=np.array([str(token) for _, token in keys]),
+                 version=np.array(self.version if self.version is not None else -1),
+                 updated_at=np.array(self.updated_at or ''),
+                 built_count=np.array(self.built_count), changed_count=np.array(self.changed_count))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            matrix = sparse.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+            # Keyword and person tokens are IDs, genre names stay strings
+            vocabulary = {(block, token if block == 'genre' else int(token)): column for column, (block, token)
+                          in enumerate(zip(saved['vocabulary_blocks'].tolist(), saved['vocabulary_tokens'].tolist()))}
+            version = int(saved['version'])
+            # Models saved before updated_at and changed_count were added don't have them
+            updated_at = str(saved['updated_at']) if 'updated_at' in saved else ''
+            changed_count = int(saved['changed_count']) if 'changed_count' in saved else len(saved['movie_ids']) - int(saved['built_count'])
+            engine = cls(saved['movie_ids'], matrix, vocabulary, saved['idf'].tolist(), saved['neighbors'],
+                         saved['scores'], None if version < 0 else version, int(saved['built_count']),
+                         updated_at or None, changed_count)
+        engine.refresh_listing()
+        return engine
+
+
+_engine = None
+_lock = threading.Lock() # Held by the one thread building or updating the model
+_builder_lock = None # The open RECOMMENDER_PATH.lock once this process is the builder
+_loaded_mtime = None # Of the RECOMMENDER_PATH file _engine was loaded from
+
+
+def _is_builder():
+    """True if this process builds the model, False if it loads the one another worker process saves."""
+    global _builder_lock
+    if _builder_lock is not None or fcntl is None or not config.RECOMMENDER_PATH:
+        return True
+    try:
+        lock_file = open(f"{config.RECOMMENDER_PATH}.lock", 'a')
+    except OSError:
+        return True # Nowhere to share the model either
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB) # Released by the OS if the process dies
+    except OSError:
+        lock_file.close()
+        return False
+    _builder_lock = lock_file
+    return True
+
+
+def _load_saved():
+    """Loads the model at RECOMMENDER_PATH if the file changed since this process last loaded it."""
+    global _engine, _loaded_mtime
+    try:
+        mtime = os.stat(config.RECOMMENDER_PATH).st_mtime_ns
+    except OSError:
+        return # Not saved yet
+    if mtime != _loaded_mtime:
+        _engine = Recommender.load(config.RECOMMENDER_PATH)
+        _loaded_mtime = mtime
+        print(f"Recommender loaded for {len(_engine.movie_ids)} movies.")
+
+
+def _save(engine):
+    global _loaded_mtime
+    if config.RECOMMENDER_PATH:
+        engine.save(config.RECOMMENDER_PATH)
+        _loaded_mtime = os.stat(config.RECOMMENDER_PATH).st_mtime_ns
+
+
+def _needs_rebuild(engine, version, changed):
+    if engine.version is None:
+        return True # Built without a catalog version, what changed since is unknown
+    if version['Version'] < engine.version:
+        # The counter went back: a recreated or restored database, unless this replica is just behind
+        return engine.updated_at is None or str(version['UpdatedAt']) >= engine.updated_at
+    return engine.changed_count + changed > engine.built_count * config.RECOMMENDER_REBUILD_FRACTION
+
+
+def _update():
+    global _engine
+    try:
+        if not _is_builder():
+            _load_saved() # What the builder process saved, it does the catching up
+            return
+        engine = _engine
+        if engine is not None:
+            start = time.perf_counter()
+            with database.session() as db:
+                version = db.fetch_one(VERSION_SQL) # Read before the changed movies, like in build()
+                if version is None or version['Version'] == engine.version:
+                    return
+                changed = []
+                if engine.version is not None and version['Version'] > engine.version:
+                    changed = [row['MovieID'] for row in db.fetch_all(CHANGED_MOVIES_SQL, (engine.version,))]
+                rebuild = _needs_rebuild(engine, version, len(changed))
+                if not rebuild and version['Version'] < engine.version:
+                    return # A replica behind the one the model was read from
+                if not rebuild:
+                    movies, tokens = load_features(db, changed)
+            if not rebuild:
+                engine = engine.updated(movies, tokens, version)
+                _save(engine)
+                _engine = engine
+                print(f"Recommender updated for {len(movies)} new or changed movies in {time.perf_counter() - start:.1f}s.")
+                return
+        engine = Recommender.build() # Requests keep using the current model meanwhile
+        _save(engine)
+        _engine = engine
+    except (OSError, ValueError, KeyError) + database.DatabaseError as err:
+        print(f"Error updating recommendations: {err}")
+    finally:
+        _lock.release()
+
+
+def _start_update():
+    if _lock.acquire(blocking=False):
+        threading.Thread(target=_update, name='recommender-update', daemon=True).start()
+
+
+def start():
+    """Loads the saved model, or builds one in the background (or waits for the builder process to save
+    one). Called once when the app starts."""
+    if config.RECOMMENDER_PATH:
+        try:
+            _load_saved()
+        except (OSError, ValueError, KeyError) + database.DatabaseError as err:
+            print(f"Could not load {config.RECOMMENDER_PATH}, rebuilding: {err}")
+    if _engine is None:
+        _start_update() # Else the first request at a newer catalog version catches up with it
+
+
+def get_recommender(version):
+    """
+    The current model (None until the first build is done). If it is behind catalog version `version` it
+    is brought up to date in the background, never in the caller's request.
+    """
+    engine = _engine
+    if engine is None or (version is not None and engine.version != version):
+        _start_update()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomputes the recommendation model.")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--path', default=config.RECOMMENDER_PATH)
+    args = parser.parse_args()
+    engine = Recommender.build()
+    engine.save(args.path)
+    print(f"Saved to {args.path}.")
+
+
+if __name__ == '__main__':
+    main()
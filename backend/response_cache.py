@@ -0,0 +1,356 @@
+# backend/response_cache.py
+"""
+Response cache for the read-only API endpoints. Entries are keyed on the request path with normalized
+query parameters and tagged with the catalog version, which the crawler bumps on every write, so a
+cached response is served until the data it was built from changes and never after. The version is read
+from the primary; with read replicas a response is only cached once every replica in use has applied it
+(see replicas.py), so a lagging replica's older rows are never stored under the newer version.
+
+Two tiers: an in-process LRU, and optionally a directory (RESPONSE_CACHE_DIR) shared by every worker
+process on the machine, so a response computed by one gunicorn worker is a hit in all the others.
+
+Cached responses also get an ETag and Last-Modified from the catalog version, so a browser revalidating
+an unchanged page gets a 304 without touching the database, and are compressed (brotli or gzip) once
+per cache entry instead of on every request.
+"""
+import collections
+import datetime
+import functools
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from urllib.parse import parse_qs, urlencode
+from flask import current_app, request
+import config
+import watchlist_wizard_db as database
+try:
+    import brotli
+except ImportError:
+    brotli = None # Optional, responses are only gzipped without it
+
+# Always warmed at startup, on top of the most requested queries recorded by earlier runs
+DEFAULT_WARMUP_PATHS = ['/api/genres', '/api/movies?cursor=&limit=60', '/api/movies?limit=250']
+POPULARITY_KEPT = 10 # Keys counted per warm-up query; past twice that the counts decay and the rest is dropped
+POPULARITY_SAVE_INTERVAL = 60 # Seconds between saves of the counts
+
+
+# Preferred first when the client accepts several
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if brotli:
+    COMPRESSORS = {'br': lambda body: brotli.compress(body, quality=5), **COMPRESSORS}
+
+
+def choose_encoding(accept_encodings):
+    """Best Content-Encoding the client accepts, or None for the plain body."""
+    for encoding in COMPRESSORS:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress_response(response):
+    """after_request hook: compresses large responses that didn't come from the cache (those are already)."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    body = response.get_data()
+    if encoding and len(body) >= config.COMPRESS_MIN_SIZE:
+        response.set_data(COMPRESSORS[encoding](body))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class CachedBody:
+    """A cached response body, with its compressed variants made on first use."""
+
+    def __init__(self, body):
+        self.body = body
+        self.encoded = {}
+
+    def encode(self, encoding):
+        if encoding is None or len(self.body) < config.COMPRESS_MIN_SIZE:
+            return self.body, None
+        if encoding not in self.encoded:
+            self.encoded[encoding] = COMPRESSORS[encoding](self.body)
+        return self.encoded[encoding], encoding
+
+
+def cache_key(path, items):
+    """Request path plus its non-empty query parameters ((name, value) pairs) in sorted order, itself a valid URL."""
+    items = list(items)
+    params = sorted((name, value.strip()) for name, value in items if value.strip())
+    # cursor= (first keyset page) changes the response format, so it is kept even though it is empty
+    cursors = [value for name, value in items if name == 'cursor']
+    if cursors and not cursors[0].strip():
+        params = sorted(params + [('cursor', '')])
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+class ResponseCache:
+    """Version-tagged LRU of response bodies with an optional on-disk tier."""
+
+    def __init__(self, maxsize, directory=None, version_check_interval=2.0):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.version_check_interval = version_check_interval
+        self.entries = collections.OrderedDict() # key -> CachedBody, all built at self.version
+        self.lock = threading.Lock()
+        self.version = None
+        self.version_row = None # The CatalogVersion row self.version was read from
+        self.generation = None # Directory of self.version's entries on disk, see _new_version()
+        self.updated_at = None # When the catalog last changed, for Last-Modified
+        self.version_checked_at = 0.0
+        self.popularity = collections.Counter() # Requests per key, see count()
+        self.popularity_saved_at = time.monotonic()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def catalog_version(self):
+        """Current catalog version, re-read from the DB at most every version_check_interval seconds."""
+        if self.version_due():
+            return self.record_version(database.get_catalog_version())
+        return self.version
+
+    def version_due(self):
+        return self.version is None or time.monotonic() - self.version_checked_at >= self.version_check_interval
+
+    def record_version(self, row):
+        """Applies a freshly read CatalogVersion row (the ASGI app reads it asynchronously), returns the version."""
+        if row is None:
+            return None # DB error, don't serve anything we can't validate
+        self.version_checked_at = time.monotonic()
+        # Any change counts, not only a higher Version: a restored or recreated database can restart the counter
+        if self.version_row is None or (row['Version'], row['UpdatedAt']) != (self.version_row['Version'],
+                                                                             self.version_row['UpdatedAt']):
+            self._new_version(row)
+        return self.version
+
+    def replicas_caught_up(self):
+        """True if responses built now read data at least as new as the current version (see replicas.py)."""
+        row = self.version_row
+        return row is not None and database.replicas_caught_up(row)
+
+    def _new_version(self, row):
+        updated_at = _as_utc(row['UpdatedAt'])
+        # UpdatedAt is part of the directory name, so a restored database that restarts the counter doesn't
+        # find the entries an older catalog left under the same version
+        stamp = int(updated_at.timestamp()) if isinstance(updated_at, datetime.datetime) else 0
+        with self.lock:
+            self.version, self.version_row, self.updated_at = row['Version'], row, updated_at
+            self.generation = f"v{row['Version']}-{stamp}"
+            self.entries.clear()
+        if self.directory:
+            # Other versions' entries can never be served again (best effort, another worker may be doing the same)
+            for path in glob.glob(os.path.join(self.directory, 'v*')):
+                if os.path.basename(path) != self.generation:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _disk_path(self, key, version):
+        """Where the entry is kept on disk, None if `version` is no longer the current one."""
+        with self.lock:
+            if version != self.version:
+                return None
+            generation = self.generation
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, generation, f"{name}.json")
+
+    def get(self, key, version):
+        with self.lock:
+            self.count(key)
+            if version == self.version and key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self.entries[key]
+        path = self.directory and self._disk_path(key, version)
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    entry = CachedBody(f.read())
+                self._remember(key, version, entry)
+                with self.lock:
+                    self.stats['disk_hits'] += 1
+                return entry
+            except OSError:
+                pass
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key, version, body):
+        entry = CachedBody(body)
+        self._remember(key, version, entry)
+        path = self.directory and self._disk_path(key, version)
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(temp_path, path) # Readers in other processes never see a half-written file
+            except OSError as err:
+                print(f"Could not write response cache entry: {err}")
+        return entry
+
+    def _remember(self, key, version, entry):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def count(self, key):
+        """Counts a request for the warm-up (called with the lock held). Later keyset pages (a non-empty cursor=)
+        are never warmed, and the counts are kept to the most requested keys so free-text searches can't
+        grow them without bound."""
+        if 'cursor' in parse_qs(key.partition('?')[2]):
+            return
+        self.popularity[key] += 1
+        if len(self.popularity) > 2 * self.popularity_limit():
+            self._trim()
+
+    @staticmethod
+    def popularity_limit():
+        return max(config.CACHE_WARMUP_QUERIES, 1) * POPULARITY_KEPT
+
+    def _trim(self):
+        # Halving every count makes the old favourites give way to what is requested now
+        top = self.popularity.most_common(self.popularity_limit())
+        self.popularity = collections.Counter({key: count // 2 for key, count in top if count > 1})
+
+    def maybe_save_popularity(self):
+        """save_popularity() every POPULARITY_SAVE_INTERVAL seconds, called on requests."""
+        if self.directory and time.monotonic() - self.popularity_saved_at >= POPULARITY_SAVE_INTERVAL:
+            self.save_popularity()
+
+    def save_popularity(self):
+        """Writes this process's most requested keys to the cache directory for the next warm-up."""
+        self.popularity_saved_at = time.monotonic()
+        if not self.directory:
+            return
+        with self.lock:
+            top = dict(self.popularity.most_common(config.CACHE_WARMUP_QUERIES * 2))
+            self._trim()
+        try:
+            with open(os.path.join(self.directory, f"popular-{os.getpid()}.json"), 'w') as f:
+                json.dump(top, f)
+        except OSError as err:
+            print(f"Could not save popular queries: {err}")
+
+    def popular_keys(self, count):
+        """Most requested keys over every worker's saved counts, defaults first."""
+        totals = collections.Counter()
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, 'popular-*.json')):
+                try:
+                    with open(path) as f:
+                        totals.update(json.load(f))
+                except (OSError, ValueError):
+                    pass
+        keys = list(DEFAULT_WARMUP_PATHS)
+        keys += [key for key, _ in totals.most_common(count) if key not in keys]
+        return keys[:max(count, len(DEFAULT_WARMUP_PATHS))]
+
+
+def _as_utc(value):
+    """CatalogVersion.UpdatedAt as an aware datetime (SQLite returns the UTC timestamp as text)."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def make_etag(key, version, encoding):
+    """Strong ETag for one representation: the same query at the same catalog version, same encoding."""
+    # The catalog's UpdatedAt goes into the digest, so a restored database reusing a version number gets new ETags
+    digest = hashlib.sha256(f"{key}\n{cache.updated_at}".encode()).hexdigest()[:16]
+    return f"{version}-{digest}-{encoding}" if encoding else f"{version}-{digest}"
+
+
+cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_DIR or None,
+                      config.CATALOG_VERSION_CHECK_INTERVAL)
+
+
+def not_modified(etags, if_none_match, if_modified_since):
+    """True if the client's copy (If-None-Match, or If-Modified-Since without it) is still current."""
+    if if_none_match:
+        return any(if_none_match.contains_weak(etag) for etag in etags)
+    if if_modified_since and cache.updated_at:
+        return cache.updated_at.replace(microsecond=0) <= if_modified_since
+    return False
+
+
+def _with_validators(response, etag, encoding):
+    response.set_etag(etag)
+    if cache.updated_at:
+        response.last_modified = cache.updated_at
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def cached(view):
+    """Serves a GET endpoint's 200 JSON responses from the cache while the catalog version is unchanged."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.RESPONSE_CACHE_ENABLED:
+            return view(*args, **kwargs)
+        version = cache.catalog_version()
+        if version is None:
+            return view(*args, **kwargs)
+        key = cache_key(request.path, request.args.items(multi=True))
+        encoding = choose_encoding(request.accept_encodings)
+        etag = make_etag(key, version, encoding)
+        plain_etag = make_etag(key, version, None) # Sent instead when the body is below the compression threshold
+        if not_modified([etag, plain_etag], request.if_none_match, request.if_modified_since):
+            # Only 200 responses carry validators, so a match means the client has the current body
+            return _with_validators(current_app.response_class(status=304), etag, None)
+
+        entry = cache.get(key, version)
+        cache.maybe_save_popularity()
+        status = 'HIT'
+        if entry is None:
+            caught_up = cache.replicas_caught_up() # Checked before the reads: replicas only move forward
+            response = current_app.make_response(view(*args, **kwargs))
+            # Query helpers turn DB errors into empty results, those must not be cached until the next version
+            if (response.status_code != 200 or response.mimetype != 'application/json' or database.request_failed()
+                    or not caught_up):
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            entry = cache.put(key, version, response.get_data())
+            status = 'MISS'
+
+        body, encoding = entry.encode(encoding)
+        if encoding is None:
+            etag = plain_etag
+        response = current_app.response_class(body, mimetype='application/json')
+        response.headers['X-Cache'] = status
+        return _with_validators(response, etag, encoding)
+    return wrapper
+
+
+def warm_up(app):
+    """Requests the most popular queries in a background thread so the first real requests are hits."""
+    if not config.RESPONSE_CACHE_ENABLED or config.CACHE_WARMUP_QUERIES <= 0:
+        return
+
+    def run():
+        start = time.perf_counter()
+        client = app.test_client()
+        keys = cache.popular_keys(config.CACHE_WARMUP_QUERIES)
+        for key in keys:
+            client.get(key)
+        print(f"Response cache warmed with {len(keys)} queries in {time.perf_counter() - start:.2f}s.")
+
+    threading.Thread(target=run, name='cache-warmup', daemon=True).start()
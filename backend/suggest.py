@@ -0,0 +1,283 @@
+# backend/suggest.py
+"""
+Typeahead suggestions for the search, keyword and actor inputs, answered from memory: /api/suggest never
+touches the database. Each type (title, actor, genre, keyword) is a sorted array of normalized keys, one
+per word start ("the dark knight", "dark knight", "knight"), so a prefix is a bisect to a range of the
+array. Suggestions are the most popular entries of the range (titles by rating, actors, genres and keywords
+by number of movies). The best SUGGEST_MAX_LIMIT of every prefix that matches more than SCAN_LIMIT keys
+are precomputed, any other range is small enough to rank on the fly.
+
+When the catalog version changes, the movies added or changed since (MovieSearch.ChangedVersion, like the
+recommender) are read in a background thread and merged in, with the movie counts of their actors, genres
+and keywords counted again (the index keeps answering meanwhile). Once SUGGEST_REBUILD_FRACTION of the
+movies were merged in this way the index is rebuilt, which also drops credits deleted since.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+import config
+import watchlist_wizard_db as database
+
+TYPES = ('title', 'actor', 'genre', 'keyword')
+SCAN_LIMIT = 256 # Largest key range ranked per request, prefixes matching more have their top entries cached
+MAX_KEY_LENGTH = 24 # Keys (and queries) are cut to this many characters
+END = '\U0010ffff' # Sorts after every character, prefix + END bounds the prefix's range
+
+# Read in the same session as the movies, which may come from a replica behind the primary's version
+VERSION_SQL = "SELECT Version FROM CatalogVersion WHERE ID = 1"
+# Written by refresh_movie_search() in the transaction that changed the movie (migration 7)
+CHANGED_MOVIES_SQL = "SELECT MovieID FROM MovieSearch WHERE ChangedVersion > %s"
+LOAD_CHUNK = 1000 # Changed MovieIDs per query
+
+# The entries of each type, {where} is "1 = 1" on a build and CHANGED_WHERE for a chunk of changed movies.
+# Popularity of actors, genres and keywords is their movie count, always over the whole catalog.
+TITLES_SQL = "SELECT MovieID, IMDbID, Title, Year, Rating FROM Movies WHERE {where}"
+ACTORS_SQL = """
+    SELECT p.PersonID, p.IMDbID, p.Name, COUNT(*) AS Movies
+    FROM MoviePeople mp JOIN People p ON p.PersonID = mp.PersonID JOIN Roles r ON r.RoleID = mp.RoleID
+    WHERE {where} AND r.RoleName = 'Actor'
+    GROUP BY p.PersonID, p.IMDbID, p.Name
+"""
+GENRES_SQL = """
+    SELECT g.GenreID, g.GenreName, COUNT(*) AS Movies FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+    WHERE {where} GROUP BY g.GenreID, g.GenreName
+"""
+KEYWORDS_SQL = """
+    SELECT pk.KeywordID, pk.Keyword, COUNT(*) AS Movies
+    FROM MovieKeywords mk JOIN PlotKeywords pk ON pk.KeywordID = mk.KeywordID
+    WHERE {where} GROUP BY pk.KeywordID, pk.Keyword
+"""
+# {ids}: placeholders of the chunk's MovieIDs. The changed movies' actors, genres and keywords are counted again.
+CHANGED_WHERE = {
+    'title': "MovieID IN ({ids})",
+    'actor': "mp.PersonID IN (SELECT PersonID FROM MoviePeople WHERE MovieID IN ({ids}))",
+    'genre': "mg.GenreID IN (SELECT GenreID FROM MovieGenres WHERE MovieID IN ({ids}))",
+    'keyword': "mk.KeywordID IN (SELECT KeywordID FROM MovieKeywords WHERE MovieID IN ({ids}))",
+}
+
+
+def normalize(text):
+    """Lowercase words without accents or punctuation: "Amélie (2001)" -> "amelie 2001"."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'\w+', text))
+
+def index_keys(text):
+    """The keys an entry is found by: its normalized text from every word on."""
+    words = normalize(text).split(' ')
+    return {' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """Entries of one type in a sorted key array, with cached top entries for the big prefixes."""
+
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.entries = [] # Entry ID -> suggestion dict
+        self.popularity = [] # Entry ID -> score, higher first
+        self.entity_entry = {} # Database ID (MovieID, PersonID...) -> entry ID
+        # (sorted keys, entry ID of each key, {prefix: best entry IDs}), replaced as a whole so readers see one state
+        self.view = ([], [], {})
+
+    def search(self, prefix, limit):
+        keys, ids, top = self.view
+        best = top.get(prefix)
+        if best is None:
+            lo = bisect.bisect_left(keys, prefix)
+            hi = bisect.bisect_left(keys, prefix + END, lo)
+            best = self._best(ids[lo:hi])
+        return [self.entries[entry_id] for entry_id in best[:limit]]
+
+    def _best(self, entry_ids):
+        return heapq.nlargest(self.top_k, set(entry_ids), key=lambda entry_id: (self.popularity[entry_id], -entry_id))
+
+    def update(self, rows):
+        """Adds new entries and replaces changed ones. rows: (entity ID, suggestion dict, popularity)."""
+        new_keys, old_keys, changed = [], set(), set()
+        for entity_id, entry, popularity in rows:
+            entry_id = self.entity_entry.get(entity_id)
+            if entry_id is None:
+                entry_id = self.entity_entry[entity_id] = len(self.entries)
+                self.entries.append(entry)
+                self.popularity.append(popularity)
+                new_keys.extend((key, entry_id) for key in index_keys(entry['value']))
+                continue
+            if entry['value'] != self.entries[entry_id]['value']: # Renamed: found by other keys now
+                before, after = index_keys(self.entries[entry_id]['value']), index_keys(entry['value'])
+                old_keys.update((key, entry_id) for key in before - after)
+                new_keys.extend((key, entry_id) for key in after - before)
+            self.entries[entry_id] = entry
+            if popularity != self.popularity[entry_id]:
+                self.popularity[entry_id] = popularity
+                changed.add(entry_id)
+        if not new_keys and not old_keys and not changed:
+            return
+        keys, ids, top = self.view
+        if not keys:
+            self._build(sorted(new_keys))
+            return
+        if old_keys:
+            keys, ids = self._without(keys, ids, old_keys)
+        keys, ids = self._merged(keys, ids, sorted(new_keys))
+        # Every prefix of a new, removed or re-ranked key may have a different top list now, deepest first
+        # so each one is computed from its (already updated) children
+        affected = {key[:length] for key, _ in new_keys + list(old_keys) for length in range(len(key) + 1)}
+        affected.update(key[:length] for entry_id in changed for key in index_keys(self.entries[entry_id]['value'])
+                        for length in range(len(key) + 1))
+        top = dict(top)
+        for prefix in sorted(affected, key=len, reverse=True):
+            lo = bisect.bisect_left(keys, prefix)
+            hi = bisect.bisect_left(keys, prefix + END, lo)
+            if hi - lo > SCAN_LIMIT:
+                top[prefix] = self._node_best(keys, ids, top, prefix, lo, hi)
+            else:
+                top.pop(prefix, None) # Small enough to rank on the fly now
+        self.view = (keys, ids, top)
+
+    def _build(self, pairs):
+        keys = [key for key, _ in pairs]
+        ids = [entry_id for _, entry_id in pairs]
+        top = {}
+        self._fill(keys, ids, top, '', 0, len(keys))
+        self.view = (keys, ids, top)
+
+    def _fill(self, keys, ids, top, prefix, lo, hi):
+        """Caches the best entries of prefix and of every longer prefix over SCAN_LIMIT keys, returns prefix's."""
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(ids[lo:hi])
+        candidates = []
+        for child, child_lo, child_hi in self._children(keys, ids, prefix, lo, hi, candidates):
+            candidates += self._fill(keys, ids, top, child, child_lo, child_hi)
+        top[prefix] = self._best(candidates)
+        return top[prefix]
+
+    def _node_best(self, keys, ids, top, prefix, lo, hi):
+        """Best entries of prefix from its children's cached lists (or their ranges when small)."""
+        candidates = []
+        for child, child_lo, child_hi in self._children(keys, ids, prefix, lo, hi, candidates):
+            # A child over SCAN_LIMIT is cached, and already updated if it was affected (deeper prefixes go first)
+            candidates += top[child] if child_hi - child_lo > SCAN_LIMIT else ids[child_lo:child_hi]
+        return self._best(candidates)
+
+    def _children(self, keys, ids, prefix, lo, hi, exact):
+        """Yields (prefix + next character, range) of the keys in lo:hi, after adding keys equal to prefix to exact."""
+        depth = len(prefix)
+        while lo < hi and len(keys[lo]) == depth: # Keys equal to the prefix sort first
+            exact.append(ids[lo])
+            lo += 1
+        while lo < hi:
+            child = prefix + keys[lo][depth]
+            child_hi = bisect.bisect_left(keys, child + END, lo, hi)
+            yield child, lo, child_hi
+            lo = child_hi
+
+    @staticmethod
+    def _without(keys, ids, old_pairs):
+        """The arrays without the (key, entry ID) pairs in old_pairs."""
+        kept = [(key, entry_id) for key, entry_id in zip(keys, ids) if (key, entry_id) not in old_pairs]
+        return [key for key, _ in kept], [entry_id for _, entry_id in kept]
+
+    @staticmethod
+    def _merged(keys, ids, new_pairs):
+        """The arrays with the sorted new (key, entry ID) pairs inserted, copying the old ones in slices."""
+        merged_keys, merged_ids, done = [], [], 0
+        for key, entry_id in new_pairs:
+            position = bisect.bisect_right(keys, key, done)
+            merged_keys += keys[done:position]
+            merged_ids += ids[done:position]
+            merged_keys.append(key)
+            merged_ids.append(entry_id)
+            done = position
+        merged_keys += keys[done:]
+        merged_ids += ids[done:]
+        return merged_keys, merged_ids
+
+
+class SuggestIndex:
+    """A PrefixIndex per type, filled from the database up to a catalog version."""
+
+    def __init__(self):
+        self.indexes = {kind: PrefixIndex(config.SUGGEST_MAX_LIMIT) for kind in TYPES}
+        self.version = None
+        self.built_movies = 0
+        self.changed_movies = 0 # Merged in by catch_up() since the build
+
+    def suggest(self, query, kind=None, limit=10):
+        """Up to `limit` suggestions of each requested type (all types when kind is None), best first."""
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        kinds = [kind] if kind else TYPES
+        return [{'type': kind, **entry} for kind in kinds for entry in self.indexes[kind].search(prefix, limit)]
+
+    def catch_up(self):
+        """Merges in the movies (and their actors, genres and keywords) added or changed since the last call,
+        everything on the first call."""
+        with database.session() as db:
+            row = db.fetch_one(VERSION_SQL) # Read before the movies: a write in between is only caught up with later
+            if self.version is None or (row and row['Version'] < self.version):
+                # First call, or the counter went back (a restored database, or a replica behind the last one read)
+                wheres = [({kind: "1 = 1" for kind in TYPES}, ())]
+            else:
+                movie_ids = sorted(movie['MovieID'] for movie in db.fetch_all(CHANGED_MOVIES_SQL, (self.version,)))
+                chunks = [movie_ids[i:i + LOAD_CHUNK] for i in range(0, len(movie_ids), LOAD_CHUNK)]
+                wheres = [({kind: where.format(ids=', '.join(['%s'] * len(chunk))) for kind, where in CHANGED_WHERE.items()},
+                           tuple(chunk)) for chunk in chunks]
+            titles, actors, genres, keywords = [], [], [], []
+            for where, params in wheres:
+                titles += db.fetch_all(TITLES_SQL.format(where=where['title']), params)
+                actors += db.fetch_all(ACTORS_SQL.format(where=where['actor']), params)
+                genres += db.fetch_all(GENRES_SQL.format(where=where['genre']), params)
+                keywords += db.fetch_all(KEYWORDS_SQL.format(where=where['keyword']), params)
+        self.indexes['title'].update(
+            (row['MovieID'], {'value': row['Title'], 'imdb_id': row['IMDbID'], 'year': row['Year']}, float(row['Rating'] or 0))
+            for row in titles if row['Title'])
+        self.indexes['actor'].update(
+            (row['PersonID'], {'value': row['Name'], 'imdb_id': row['IMDbID']}, row['Movies']) for row in actors)
+        self.indexes['genre'].update((row['GenreID'], {'value': row['GenreName']}, row['Movies']) for row in genres)
+        self.indexes['keyword'].update((row['KeywordID'], {'value': row['Keyword']}, row['Movies']) for row in keywords)
+        self.changed_movies += len(titles)
+        self.version = row['Version'] if row else None
+
+    @classmethod
+    def build(cls):
+        start = time.perf_counter()
+        index = cls()
+        index.catch_up()
+        index.built_movies, index.changed_movies = index.changed_movies, 0
+        print(f"Suggestion index built for {index.built_movies} movies in {time.perf_counter() - start:.1f}s.")
+        return index
+
+
+_index = None
+_lock = threading.Lock() # Held by the one thread building or updating the index
+
+
+def _update():
+    global _index
+    try:
+        index = _index
+        if index is None or index.changed_movies > index.built_movies * config.SUGGEST_REBUILD_FRACTION:
+            index = SuggestIndex.build() # Rebuilt aside, the current index keeps answering
+        else:
+            index.catch_up()
+        _index = index
+    except database.DatabaseError as err:
+        print(f"Error updating suggestions: {err}")
+    finally:
+        _lock.release()
+
+
+def _start_update():
+    if _lock.acquire(blocking=False):
+        threading.Thread(target=_update, name='suggest-update', daemon=True).start()
+
+
+def get_index(version):
+    """The index (None until the first build is done, which the first call starts). If it is behind catalog
+    version `version` it is brought up to date in the background, never in the caller's request."""
+    index = _index
+    if index is None or (version is not None and index.version != version):
+        _start_update()
+    return index
@@ -0,0 +1,12 @@
+"""
+Shared data-access layer for the API (imported as watchlist_wizard_db from the backend directory)
+and the crawler (imported as backend.watchlist_wizard_db from the project root).
+"""
+from .backends import get_backend, DatabaseUnavailable
+from .connection import DatabaseError, get_db_connection, session, transaction, begin_request, end_request, request_failed, mark_request_stale, replicas_caught_up, request_stats, pool_stats
+from .migrations import create_database, migrate, current_version
+from .writes import link_pending_credits, bump_catalog_version, insert_movie_data, insert_person_data
+from .projection import refresh_movie_search, rebuild_movie_search
+from .querylog import slow_queries
+from .snapshot import export_catalog, load_catalog
+from .queries import get_all_movies, get_movies_page, get_movie_by_imdb_id, get_movies_by_imdb_ids, get_filtered_movie_ids, export_movies, get_all_genres, get_top_movies_by_genre, get_catalog_version
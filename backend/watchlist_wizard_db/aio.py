@@ -0,0 +1,238 @@
+"""
+Async data access for the ASGI app (backend/asgi.py). On MySQL queries go through an aiomysql connection
+pool, so a request waiting on the database doesn't hold a thread. SQLite is an in-process library with
+no network round trip to wait on, so its queries run on the default thread pool with the sync pool.
+
+Same SQL and the same results as queries.py: multi-query functions are written there as steps
+(queries.movies_page_steps) and driven here with await, errors are printed and give empty results.
+"""
+import asyncio
+import time
+from . import backends, queries, querylog
+from .connection import DatabaseError, session, pool_stats, record_query, _mark_failed
+try:
+    from .. import config
+except ImportError:
+    import config
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None # Only needed for the ASGI mode on MySQL
+
+AsyncDatabaseError = DatabaseError + ((aiomysql.MySQLError,) if aiomysql else ()) + (asyncio.TimeoutError,)
+
+
+def _fetch_all_sync(sql, params):
+    with session() as db:
+        return db.fetch_all(sql, params)
+
+
+class AsyncPool:
+    """aiomysql pool on MySQL, the thread pool plus the sync connection pool on SQLite."""
+
+    def __init__(self):
+        self.pool = None
+        self.replica_pools = {} # Replica name -> aiomysql pool, see replicas.py
+        self.waits = 0 # Acquires that found every connection busy
+
+    async def open(self):
+        backend = backends.get_backend()
+        if backend.name != 'mysql' or self.pool is not None:
+            return
+        if aiomysql is None:
+            raise RuntimeError("The ASGI mode on MySQL needs aiomysql (pip install aiomysql).")
+        args = backend.connection_args()
+        self.pool = await self._create_pool(args['host'], args['port'], minsize=1)
+        for replica in (backend.replicas.replicas if backend.replicas else []):
+            # Opened empty, so a replica that is down doesn't stop the app from starting
+            self.replica_pools[replica.name] = await self._create_pool(replica.host, replica.port, minsize=0,
+                                                                       connect_timeout=config.DB_POOL_TIMEOUT)
+
+    async def _create_pool(self, host, port, minsize, **options):
+        args = backends.get_backend().connection_args()
+        return await aiomysql.create_pool(host=host, port=port, user=args['user'], password=args['password'],
+                                          db=args['database'], minsize=minsize, maxsize=config.ASYNC_DB_POOL_SIZE,
+                                          autocommit=True, pool_recycle=config.DB_POOL_HEALTH_CHECK_INTERVAL * 60, **options)
+
+    async def close(self):
+        for pool in [self.pool] + list(self.replica_pools.values()):
+            if pool is not None:
+                pool.close()
+                await pool.wait_closed()
+        self.pool = None
+        self.replica_pools = {}
+
+    async def _acquire(self, primary=False):
+        """(pool, connection) for a read: a healthy replica's (round-robin, see replicas.py), else the primary's."""
+        replicas = backends.get_backend().replicas
+        replica = replicas.choose() if replicas and not primary else None
+        if replica is not None:
+            pool = self.replica_pools[replica.name]
+            try:
+                return pool, await asyncio.wait_for(pool.acquire(), config.DB_POOL_TIMEOUT)
+            except AsyncDatabaseError + (OSError,) as err:
+                if not (isinstance(err, asyncio.TimeoutError) and pool.size >= pool.maxsize):
+                    replicas.mark_failed(replica, err) # Else only busy: this read goes to the primary
+        if self.pool.freesize == 0:
+            self.waits += 1
+        # Same limit as the sync pool: give up after DB_POOL_TIMEOUT seconds without a free connection
+        return self.pool, await asyncio.wait_for(self.pool.acquire(), config.DB_POOL_TIMEOUT)
+
+    async def fetch_all(self, sql, params=(), primary=False):
+        """Rows of a read. primary: skip the replicas, for reads that must not lag behind the writes."""
+        if self.pool is None:
+            return await asyncio.to_thread(_fetch_all_sync, sql, params) # SQLite, no replicas
+        pool, conn = await self._acquire(primary)
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                start = time.perf_counter()
+                await cursor.execute(sql, tuple(params))
+                rows = list(await cursor.fetchall())
+                seconds = time.perf_counter() - start
+                record_query(seconds, len(rows))
+                if querylog.is_slow(seconds):
+                    querylog.log_slow_query(sql, params, seconds, len(rows))
+                return rows
+        finally:
+            pool.release(conn)
+
+    async def stream(self, sql, params=(), batch_size=1000):
+        """Async Session.stream: batches of rows from an unbuffered (server-side) cursor, MySQL only."""
+        pool, conn = await self._acquire()
+        start = time.perf_counter()
+        rows, finished = 0, False
+        try:
+            cursor = await conn.cursor(aiomysql.SSDictCursor)
+            await cursor.execute(sql, tuple(params))
+            while True:
+                batch = await cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows += len(batch)
+                yield list(batch)
+            finished = True
+            await cursor.close()
+        finally:
+            record_query(time.perf_counter() - start, rows)
+            if not finished:
+                conn.close() # Unread rows would have to be drained first, the pool drops closed connections
+            pool.release(conn)
+
+    async def run_steps(self, steps):
+        """Async run_steps (see queries.run_steps)."""
+        try:
+            query = next(steps)
+            while True:
+                query = steps.send(await self.fetch_all(*query))
+        except StopIteration as done:
+            return done.value
+
+    def stats(self):
+        if self.pool is None:
+            return pool_stats()
+        stats = {'max_size': self.pool.maxsize, 'open': self.pool.size, 'idle': self.pool.freesize,
+                 'in_use': self.pool.size - self.pool.freesize, 'waits': self.waits}
+        replicas = backends.get_backend().replicas
+        if replicas:
+            stats.update(replicas.stats()) # Health and lag, the sync pools in it serve the background jobs
+            for name, replica_pool in self.replica_pools.items():
+                stats['replicas'][name]['async_pool'] = {'open': replica_pool.size, 'idle': replica_pool.freesize}
+        return stats
+
+
+pool = AsyncPool()
+
+
+def _failed(message, err):
+    print(f"{message}: {err}")
+    _mark_failed() # Keeps the empty result out of the response cache
+
+
+async def ping():
+    """Raises if the database can't be reached."""
+    await pool.fetch_all("SELECT 1 AS ok")
+
+async def get_all_movies(limit=250, offset=0, search_term=None, genre_filter=None, keyword_filter=None, actor_filter=None,
+                         sort='rating'):
+    sql, params = queries.movie_listing_query(limit, offset, search_term, genre_filter, keyword_filter, actor_filter, sort)
+    try:
+        return await pool.fetch_all(sql, params)
+    except AsyncDatabaseError as err:
+        _failed("Error fetching filtered movies", err)
+        return []
+
+async def get_movies_page(limit=250, cursor=None, search_term=None, genre_filter=None, keyword_filter=None,
+                          actor_filter=None, sort='rating'):
+    """Raises ValueError for an invalid cursor, like queries.get_movies_page."""
+    steps = queries.movies_page_steps(limit, cursor, search_term, genre_filter, keyword_filter, actor_filter, sort)
+    try:
+        return await pool.run_steps(steps)
+    except AsyncDatabaseError as err:
+        _failed("Error fetching movies page", err)
+        return {'movies': [], 'next_cursor': None}
+
+async def get_movie_by_imdb_id(imdb_id):
+    try:
+        movies = await pool.run_steps(queries.movie_details_steps([imdb_id]))
+        return movies[0] if movies else None
+    except AsyncDatabaseError as err:
+        _failed("Error fetching movie details", err)
+        return None
+
+async def get_movies_by_imdb_ids(imdb_ids):
+    imdb_ids = queries.batch_ids(imdb_ids)
+    if not imdb_ids:
+        return []
+    try:
+        return await pool.run_steps(queries.movie_details_steps(imdb_ids))
+    except AsyncDatabaseError as err:
+        _failed("Error fetching movie details", err)
+        return []
+
+async def get_filtered_movie_ids(search_term=None, keyword_filter=None, actor_filter=None):
+    try:
+        rows = await pool.fetch_all(*queries.movie_ids_query(search_term, keyword_filter, actor_filter))
+        return [row['MovieID'] for row in rows]
+    except AsyncDatabaseError as err:
+        _failed("Error fetching filtered movie IDs", err)
+        return None
+
+async def export_movies(after_id=0, genre_filter=None, keyword_filter=None, actor_filter=None, batch_size=1000):
+    """Async queries.export_movies. Raises AsyncDatabaseError, possibly after some batches were yielded."""
+    if pool.pool is not None:
+        sql, params = queries.export_query(after_id, genre_filter, keyword_filter, actor_filter)
+        async for batch in pool.stream(sql, params, batch_size):
+            yield [queries.export_row(row) for row in batch]
+        return
+    batches = queries.export_movies(after_id, genre_filter, keyword_filter, actor_filter, batch_size)
+    try:
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            yield batch
+    finally:
+        await asyncio.to_thread(batches.close)
+
+async def get_all_genres():
+    try:
+        return [row['GenreName'] for row in await pool.fetch_all(queries.GENRES_SQL)]
+    except AsyncDatabaseError as err:
+        _failed("Error fetching genres", err)
+        return []
+
+async def get_top_movies_by_genre(genre_name, limit=20):
+    try:
+        return await pool.fetch_all(queries.TOP_MOVIES_BY_GENRE_SQL, (genre_name, limit))
+    except AsyncDatabaseError as err:
+        _failed("Error getting recommendations", err)
+        return []
+
+async def get_catalog_version():
+    try:
+        rows = await pool.fetch_all(queries.CATALOG_VERSION_SQL, primary=True)
+        return rows[0] if rows else None
+    except AsyncDatabaseError as err:
+        _failed("Error fetching catalog version", err)
+        return None
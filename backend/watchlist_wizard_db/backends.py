@@ -0,0 +1,449 @@
+import functools
+import re
+import sqlite3
+import threading
+import time
+from .pool import ConnectionPool, PoolTimeout
+from .replicas import Replica, ReplicaSet, parse_hosts
+try:
+    from .. import config # Imported as backend.watchlist_wizard_db (crawler)
+except ImportError:
+    import config # Imported as watchlist_wizard_db from the backend directory (API)
+try:
+    import mysql.connector
+except ImportError: # Only needed when DB_BACKEND=mysql
+    mysql = None
+
+
+class DatabaseUnavailable(Exception):
+    """Raised by the DB modules when no connection could be established."""
+
+# Catch this instead of mysql.connector.Error so DB code works with either backend
+DatabaseError = (DatabaseUnavailable, PoolTimeout, sqlite3.Error) + ((mysql.connector.Error,) if mysql else ())
+
+
+def _new_pool(connect):
+    return ConnectionPool(connect, max_size=config.DB_POOL_SIZE, timeout=config.DB_POOL_TIMEOUT,
+                          health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL)
+
+
+def parse_search(term):
+    """
+    Splits a search string into (kind, text) parts: "quoted words" are a 'phrase', word* is a 'prefix' and
+    other words must match whole. The last bare word is matched as a prefix too, so a word that is still
+    being typed already finds results.
+    """
+    parts = []
+    for phrase, word, star in re.findall(r'"([^"]*)"|(\w+)(\*?)', term):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                parts.append(('phrase', " ".join(words)))
+        elif word:
+            parts.append(('prefix' if star else 'word', word))
+    if parts and parts[-1][0] == 'word' and not term.rstrip().endswith('"'):
+        parts[-1] = ('prefix', parts[-1][1])
+    return parts
+
+def _like_search_source(parts):
+    """Derived table (MovieID, Relevance) of movies whose title/plot contain every part, title hits rank higher."""
+    conditions, scores, params, score_params = [], [], [], []
+    for _, text in parts:
+        conditions.append("(Title LIKE %s OR PlotSummary LIKE %s)")
+        params += [f"%{text}%", f"%{text}%"]
+        scores.append("(CASE WHEN Title LIKE %s THEN 2 ELSE 1 END)")
+        score_params.append(f"%{text}%")
+    sql = f"SELECT MovieID, {' + '.join(scores)} AS Relevance FROM Movies WHERE {' AND '.join(conditions)}"
+    return sql, score_params + params
+
+
+# (index name, columns) on Movies, added by migration 3 on MySQL
+FULLTEXT_INDEXES = [('ft_movies_title', 'Title'), ('ft_movies_title_plot', 'Title, PlotSummary')]
+
+FULLTEXT_RECHECK_INTERVAL = 30 # Seconds between checks for the FULLTEXT indexes while the first one failed
+
+# MoviesFTS options from migration 3: accent-insensitive tokens and prefix indexes for 2-4 character prefixes
+FTS_RANKED_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'"
+
+
+class MySQLBackend:
+    """MySQL server backend, the SQL in the DB modules is written in its dialect."""
+    name = 'mysql'
+    json_array_agg = 'JSON_ARRAYAGG' # Aggregates rows into one JSON array (NULL for no rows)
+    json_object = 'JSON_OBJECT'
+    explain_prefix = 'EXPLAIN ' # Prepended to a SELECT to get its plan
+
+    def __init__(self):
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.has_fulltext = None # Checked when the app starts (detect_search_index), the indexes come with migration 3
+        self.fulltext_checked_at = None
+        self.replicas = None
+        hosts = parse_hosts(config.DB_REPLICA_HOSTS, config.DB_PORT)
+        if hosts:
+            replicas = []
+            for host, port in hosts:
+                connect = functools.partial(self.connect, host, port)
+                replicas.append(Replica(host, port, connect, _new_pool(connect)))
+            self.replicas = ReplicaSet(replicas, config.DB_REPLICA_MAX_LAG, config.DB_REPLICA_CHECK_INTERVAL, DatabaseError)
+
+    def connection_args(self):
+        return {
+            'host': config.DB_HOST,
+            'port': config.DB_PORT,
+            'user': config.DB_USER,
+            'password': config.DB_PASSWORD,
+            'database': config.DB_NAME,
+        }
+
+    def connect(self, host=None, port=None):
+        """Opens a new, unpooled connection to the primary, or to the replica at host:port."""
+        if mysql is None:
+            raise RuntimeError("DB_BACKEND is 'mysql' but mysql-connector-python is not installed.")
+        args = self.connection_args()
+        if host:
+            # A replica that is down must not hold up the read that falls back to the primary
+            args.update(host=host, port=port, connection_timeout=max(1, int(config.DB_POOL_TIMEOUT)))
+        return mysql.connector.connect(**args)
+
+    def get_connection(self, read_only=False):
+        """Borrows a connection from the pool, close() hands it back. read_only: a replica's, when there is a usable one."""
+        if read_only and self.replicas:
+            replica = self.replicas.choose()
+            if replica:
+                try:
+                    return replica.pool.get_connection()
+                except PoolTimeout:
+                    pass # Only busy: this read goes to the primary, the replica stays in use
+                except DatabaseError as err:
+                    self.replicas.mark_failed(replica, err)
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = _new_pool(self.connect)
+        return self.pool.get_connection()
+
+    def index_exists(self, cursor, name, table):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        return cursor.fetchone()[0] > 0
+
+    def create_index(self, cursor, name, table, columns):
+        """Creates an index unless it exists (MySQL has no CREATE INDEX IF NOT EXISTS)."""
+        if not self.index_exists(cursor, name, table):
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+    def drop_index(self, cursor, name, table):
+        if self.index_exists(cursor, name, table):
+            cursor.execute(f"DROP INDEX {name} ON {table}")
+
+    def explain(self, cursor, sql, params=()):
+        """Returns the query plan as one line per table access."""
+        cursor.execute("EXPLAIN " + sql, tuple(params))
+        columns = [column[0] for column in cursor.description]
+        plan = []
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            plan.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                        f"rows={row.get('rows')} extra={row.get('Extra')}")
+        return plan
+
+    def begin_snapshot(self, cursor):
+        """Starts a read transaction that sees one consistent version of every table."""
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+    def bulk_load(self, cursor, enabled):
+        """Skips foreign key and secondary unique checks on this connection while loading trusted data."""
+        cursor.execute(f"SET foreign_key_checks = {0 if enabled else 1}")
+        cursor.execute(f"SET unique_checks = {0 if enabled else 1}")
+
+    def create_search_index(self, cursor):
+        """Full-text search used LIKE before migration 3 added the FULLTEXT indexes, nothing to set up."""
+
+    def create_fulltext_index(self, cursor):
+        """InnoDB FULLTEXT indexes for search: titles alone (ranked higher) and titles with plots."""
+        for name, columns in FULLTEXT_INDEXES:
+            if not self.index_exists(cursor, name, 'Movies'):
+                cursor.execute(f"CREATE FULLTEXT INDEX {name} ON Movies ({columns})")
+        self.has_fulltext = True
+
+    def drop_fulltext_index(self, cursor):
+        for name, _ in FULLTEXT_INDEXES:
+            self.drop_index(cursor, name, 'Movies')
+        self.has_fulltext = False
+
+    def detect_search_index(self):
+        """
+        Checks whether the FULLTEXT indexes exist. Runs on its own unpooled connection, so it never waits for
+        a pool slot while the caller holds one (a request searching on a saturated pool would otherwise).
+        """
+        self.fulltext_checked_at = time.monotonic()
+        try:
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                self.has_fulltext = self.index_exists(cursor, FULLTEXT_INDEXES[-1][0], 'Movies')
+                cursor.close()
+            finally:
+                conn.close()
+        except DatabaseError as err:
+            print(f"Could not check for FULLTEXT indexes, searching with LIKE for now: {err}")
+
+    def search_source(self, term):
+        """Returns (sql, params) of a derived table (MovieID, Relevance) of the movies matching term."""
+        if self.has_fulltext is None and time.monotonic() - (self.fulltext_checked_at or 0) > FULLTEXT_RECHECK_INTERVAL:
+            self.detect_search_index() # The check at startup failed, LIKE is used until it succeeds
+        parts = parse_search(term)
+        # Boolean mode: every part is required (+), prefixes get *, phrases stay quoted. Bare words below
+        # innodb_ft_min_token_size (3) are never indexed and would make a required term match nothing,
+        # so they are matched with LIKE instead, as the start of a word of the title ("up 2009", "it follows").
+        terms, short_words = [], []
+        for kind, text in parts:
+            if kind == 'phrase':
+                terms.append(f'+"{text}"')
+            elif len(text) >= 3:
+                terms.append(f"+{text}*" if kind == 'prefix' else f"+{text}")
+            else:
+                short_words.append(text)
+        if not self.has_fulltext or not terms:
+            return _like_search_source(parts or [('word', term)])
+        query = " ".join(terms)
+        short_sql = "".join(" AND (Title LIKE %s OR Title LIKE %s)" for _ in short_words)
+        short_params = [pattern for text in short_words for pattern in (f"{text}%", f"% {text}%")]
+        # InnoDB ranks boolean matches by BM25-style TF-IDF, title matches are weighted double
+        return f"""
+            SELECT MovieID, 2 * MATCH(Title) AGAINST (%s IN BOOLEAN MODE)
+                   + MATCH(Title, PlotSummary) AGAINST (%s IN BOOLEAN MODE) AS Relevance
+            FROM Movies WHERE MATCH(Title, PlotSummary) AGAINST (%s IN BOOLEAN MODE){short_sql}
+        """, [query, query, query] + short_params
+
+
+class SQLiteBackend:
+    """Embedded SQLite backend: WAL mode, tuned pragmas and an FTS5 index for search."""
+    name = 'sqlite'
+    json_array_agg = 'json_group_array' # Aggregates rows into one JSON array ('[]' for no rows)
+    json_object = 'json_object'
+    explain_prefix = 'EXPLAIN QUERY PLAN '
+
+    def __init__(self, path):
+        self.path = path
+        self.has_fts = None # Checked lazily, FTS5 may be missing from the SQLite build
+        self.pool = _new_pool(self.connect)
+
+    def get_connection(self, read_only=False):
+        """Borrows a connection from the pool, close() hands it back. One file, no replicas: read_only changes nothing."""
+        return self.pool.get_connection()
+
+    def connect(self):
+        """Opens a new connection with the tuned pragmas."""
+        conn = sqlite3.connect(self.path, timeout=config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL") # Readers don't block the crawler's writes and vice versa
+        conn.execute("PRAGMA synchronous = NORMAL") # Safe with WAL, avoids an fsync per commit
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = -{int(config.SQLITE_CACHE_MB) * 1024}") # Negative value is KiB
+        conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_MB) * 1024 * 1024}")
+        return SQLiteConnection(conn)
+
+    def create_index(self, cursor, name, table, columns):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    def drop_index(self, cursor, name, table):
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def explain(self, cursor, sql, params=()):
+        """Returns the query plan as one line per step."""
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, tuple(params))
+        return [row[-1] for row in cursor.fetchall()]
+
+    def begin_snapshot(self, cursor):
+        cursor.execute("BEGIN") # WAL readers keep the snapshot of their first read until the transaction ends
+
+    def bulk_load(self, cursor, enabled):
+        """Skips foreign key checks and fsyncs on this connection while loading trusted data (outside a transaction)."""
+        cursor.execute(f"PRAGMA foreign_keys = {'OFF' if enabled else 'ON'}")
+        cursor.execute(f"PRAGMA synchronous = {'OFF' if enabled else 'NORMAL'}")
+
+    def create_search_index(self, cursor, options=None):
+        """Creates the MoviesFTS external-content FTS5 table and the triggers that keep it in sync with Movies."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'MoviesFTS'")
+        is_new = cursor.fetchone() is None
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS MoviesFTS
+                USING fts5(Title, PlotSummary, content='Movies', content_rowid='MovieID'{', ' + options if options else ''})
+            """)
+        except sqlite3.OperationalError as err:
+            print(f"FTS5 not available, search falls back to LIKE: {err}")
+            self.has_fts = False
+            return
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON Movies BEGIN
+                INSERT INTO MoviesFTS (rowid, Title, PlotSummary) VALUES (new.MovieID, new.Title, new.PlotSummary);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON Movies BEGIN
+                INSERT INTO MoviesFTS (MoviesFTS, rowid, Title, PlotSummary) VALUES ('delete', old.MovieID, old.Title, old.PlotSummary);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE ON Movies BEGIN
+                INSERT INTO MoviesFTS (MoviesFTS, rowid, Title, PlotSummary) VALUES ('delete', old.MovieID, old.Title, old.PlotSummary);
+                INSERT INTO MoviesFTS (rowid, Title, PlotSummary) VALUES (new.MovieID, new.Title, new.PlotSummary);
+            END
+        """)
+        if is_new:
+            cursor.execute("INSERT INTO MoviesFTS (MoviesFTS) VALUES ('rebuild')") # Index rows that predate the triggers
+        self.has_fts = True
+
+    def _recreate_search_index(self, cursor, options):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'MoviesFTS'")
+        if cursor.fetchone() is None:
+            return # FTS5 isn't available in this SQLite build, search keeps using LIKE
+        cursor.execute("DROP TABLE MoviesFTS") # The triggers reference it by name and are kept
+        self.create_search_index(cursor, options)
+
+    def create_fulltext_index(self, cursor):
+        """Rebuilds MoviesFTS with prefix indexes and diacritics folding for ranked search."""
+        self._recreate_search_index(cursor, FTS_RANKED_OPTIONS)
+
+    def drop_fulltext_index(self, cursor):
+        self._recreate_search_index(cursor, None)
+
+    def detect_search_index(self):
+        """Checks whether MoviesFTS exists (its own short-lived connection, outside the pool)."""
+        conn = sqlite3.connect(self.path)
+        try:
+            self.has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'MoviesFTS'").fetchone() is not None
+        finally:
+            conn.close()
+
+    def search_source(self, term):
+        """Returns (sql, params) of a derived table (MovieID, Relevance) of the movies matching term."""
+        if self.has_fts is None:
+            self.detect_search_index()
+        parts = parse_search(term)
+        if not self.has_fts or not parts:
+            return _like_search_source(parts or [('word', term)])
+        fts_query = " ".join(f'"{text}"*' if kind == 'prefix' else f'"{text}"' for kind, text in parts)
+        # bm25() is lower for better matches, title hits count 3x as much as plot hits
+        return """
+            SELECT rowid AS MovieID, -bm25(MoviesFTS, 3.0, 1.0) AS Relevance
+            FROM MoviesFTS WHERE MoviesFTS MATCH %s
+        """, [fts_query]
+
+
+@functools.lru_cache(maxsize=1024)
+def translate_sql(sql):
+    """Rewrites the MySQL dialect used by the DB modules into SQLite."""
+    sql = sql.replace("%s", "?")
+    # SQLite has a single writer, so a read in a write transaction needs no row lock
+    sql = re.sub(r"\s+FOR\s+UPDATE\s*$", "", sql, flags=re.I)
+    upsert = re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", sql, re.I)
+    if upsert:
+        # ON CONFLICT without a target (SQLite 3.35+) matches any unique constraint, like ON DUPLICATE KEY
+        tail = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", sql[upsert.end():], flags=re.I)
+        sql = sql[:upsert.start()] + "ON CONFLICT DO UPDATE SET" + tail
+        sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT", sql, flags=re.I)
+    else:
+        sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.I)
+    if re.match(r"\s*CREATE\s+TABLE", sql, re.I):
+        sql = re.sub(r"\bINT\s+PRIMARY\s+KEY\s+AUTO_INCREMENT\b", "INTEGER PRIMARY KEY AUTOINCREMENT", sql, flags=re.I)
+        # Match MySQL's case-insensitive default collation for names and IDs
+        sql = re.sub(r"\b(VARCHAR\(\d+\))", r"\1 COLLATE NOCASE", sql, flags=re.I)
+    return sql
+
+
+class SQLiteCursor:
+    """Wraps a sqlite3 cursor with the parts of the mysql.connector cursor API the DB modules use."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self.dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate_sql(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_sql(sql), [tuple(params) for params in seq_of_params])
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Wraps a sqlite3 connection with the parts of the mysql.connector connection API the DB modules use."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._open = True
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        """In-process database, there is no server connection to lose."""
+
+    def close(self):
+        if self._open:
+            self._conn.close()
+            self._open = False
+
+
+_backend = None
+
+def get_backend():
+    """Returns the storage backend selected by config.DB_BACKEND ('mysql' or 'sqlite')."""
+    global _backend
+    if _backend is None:
+        if config.DB_BACKEND == 'sqlite':
+            _backend = SQLiteBackend(config.SQLITE_PATH)
+        elif config.DB_BACKEND == 'mysql':
+            _backend = MySQLBackend()
+        else:
+            raise ValueError(f"Unknown DB_BACKEND '{config.DB_BACKEND}', expected 'mysql' or 'sqlite'.")
+    return _backend
@@ -0,0 +1,244 @@
+import contextvars
+import time
+import weakref
+from contextlib import contextmanager
+from . import backends, querylog
+try:
+    from .. import config
+except ImportError:
+    import config
+
+DatabaseError = backends.DatabaseError
+
+# Raw MySQL connection -> {sql: prepared cursor}. Pooled connections live for the whole process,
+# so a statement is prepared once per connection and later calls only send the parameters.
+_prepared_cursors = weakref.WeakKeyDictionary()
+
+# Connection borrowed for the current request (None outside begin_request()/end_request()), so all the
+# queries of one API request share a single pool checkout. A ContextVar works for threads and asyncio tasks.
+_request_connection = contextvars.ContextVar('request_connection', default=None)
+
+
+def get_db_connection(read_only=False):
+    """
+    Borrows a connection from the backend's pool (close() returns it), or None if the DB is unreachable.
+    read_only: the connection may be a read replica's (see replicas.py), only for reads that can lag behind writes.
+    """
+    try:
+        return backends.get_backend().get_connection(read_only)
+    except DatabaseError as err:
+        print(f"Error connecting to database: {err}")
+        return None
+
+
+def begin_request():
+    """Starts request scope: session() reuses one connection until end_request(), transaction() another one."""
+    # Borrowed lazily, requests that don't query never touch the pool. Reads may come from a replica,
+    # so a request that also writes gets a second connection, to the primary.
+    _request_connection.set({'conn': None, 'write_conn': None, 'failed': False, 'queries': 0, 'db_seconds': 0.0, 'rows': 0})
+
+def end_request():
+    """Returns the request's connections to the pool (rolling back anything left uncommitted)."""
+    state = _request_connection.get()
+    _request_connection.set(None)
+    for key in ('conn', 'write_conn'):
+        if state and state[key]:
+            state[key].close()
+
+def request_failed():
+    """True if a query of the current request hit a DB error (the query helpers hide it behind an empty result)."""
+    state = _request_connection.get()
+    return bool(state and state['failed'])
+
+def request_stats():
+    """{'queries', 'db_seconds', 'rows'} of the current request's reads so far (zeros outside a request)."""
+    state = _request_connection.get() or {}
+    return {'queries': state.get('queries', 0), 'db_seconds': state.get('db_seconds', 0.0), 'rows': state.get('rows', 0)}
+
+def record_query(seconds, rows):
+    """Adds a finished read to the request's totals (done by fetch_all, and by the async API in aio.py)."""
+    state = _request_connection.get()
+    if state is not None:
+        state['queries'] += 1
+        state['db_seconds'] += seconds
+        state['rows'] += rows
+
+def mark_request_stale():
+    """Keeps the current request's response out of the response cache: it came from an in-memory index still
+    catching up with the catalog version the response would be cached under."""
+    _mark_failed()
+
+def _mark_failed():
+    state = _request_connection.get()
+    if state is not None:
+        state['failed'] = True
+
+def _borrow(read_only):
+    """Returns (connection, whether the caller must close it)."""
+    state = _request_connection.get()
+    if state is None:
+        return get_db_connection(read_only), True
+    key = 'conn' if read_only else 'write_conn'
+    if state[key] is None:
+        state[key] = get_db_connection(read_only)
+    return state[key], False
+
+def replicas_caught_up(row):
+    """True if reads (session(), and the async API's) return data at least as new as CatalogVersion row `row`,
+    read from the primary: always without read replicas, see ReplicaSet.caught_up() with them."""
+    replicas = getattr(backends.get_backend(), 'replicas', None)
+    return not replicas or replicas.caught_up(row)
+
+def pool_stats():
+    """Size and wait-time metrics of this process's connection pool (the primary's), plus the read replicas'."""
+    backend = backends.get_backend()
+    stats = backend.pool.stats() if backend.pool else {}
+    if getattr(backend, 'replicas', None):
+        stats.update(backend.replicas.stats())
+    return stats
+
+
+class Session:
+    """A borrowed connection plus query helpers, obtained from session() or transaction()."""
+
+    def __init__(self, conn, owns_connection=True):
+        self.conn = conn
+        self.owns_connection = owns_connection
+        self.cursors = []
+        self.use_prepared = config.DB_PREPARED_STATEMENTS and backends.get_backend().name == 'mysql'
+
+    def cursor(self, dictionary=False):
+        """Plain cursor, closed automatically when the session ends."""
+        cursor = self.conn.cursor(dictionary=dictionary)
+        self.cursors.append(cursor)
+        return cursor
+
+    def fetch_all(self, sql, params=()):
+        """Runs a read query and returns all rows as dicts, through a prepared statement on MySQL."""
+        start = time.perf_counter()
+        rows = self._fetch_all(sql, params)
+        seconds = time.perf_counter() - start
+        record_query(seconds, len(rows))
+        if querylog.is_slow(seconds):
+            querylog.log_slow_query(sql, params, seconds, len(rows))
+        return rows
+
+    def _fetch_all(self, sql, params):
+        if not self.use_prepared:
+            cursor = self.cursor(dictionary=True)
+            cursor.execute(sql, tuple(params))
+            return cursor.fetchall()
+
+        cursor = self._prepared_cursor(sql)
+        try:
+            cursor.execute(sql, tuple(params))
+            columns = cursor.column_names
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except DatabaseError:
+            self._forget_prepared(sql) # Don't reuse a statement handle that may be broken
+            raise
+
+    def stream(self, sql, params=(), batch_size=1000):
+        """
+        Runs a read query and yields its rows as lists of at most batch_size dicts, as they come in. On MySQL
+        the cursor is unbuffered: rows stay on the server until fetched, so memory holds one batch however
+        large the result. Exhaust or close the generator before running other queries on this session.
+        """
+        start = time.perf_counter()
+        cursor = self.conn.cursor(dictionary=True, buffered=False)
+        rows, finished = 0, False
+        try:
+            cursor.execute(sql, tuple(params))
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows += len(batch)
+                yield batch
+            finished = True
+        finally:
+            record_query(time.perf_counter() - start, rows)
+            if finished or backends.get_backend().name != 'mysql':
+                cursor.close()
+            else:
+                # Stopped mid-result (the client went away): MySQL would send every remaining row before the
+                # connection could run another query, so close it instead and let the pool open a new one
+                self._raw_connection().close()
+
+    def explain(self, sql, params=()):
+        """The query plan of a SELECT as a list of dicts, None if EXPLAIN fails."""
+        try:
+            cursor = self.cursor(dictionary=True)
+            cursor.execute(backends.get_backend().explain_prefix + sql, tuple(params))
+            return cursor.fetchall()
+        except DatabaseError as err:
+            print(f"Could not EXPLAIN slow query: {err}")
+            return None
+
+    def fetch_one(self, sql, params=()):
+        rows = self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        for cursor in self.cursors:
+            cursor.close()
+        self.cursors = []
+        if self.owns_connection:
+            self.conn.close()
+
+    def _raw_connection(self):
+        return getattr(self.conn, '_cnx', self.conn) # Pooled connections wrap the real one in _cnx
+
+    def _prepared_cursor(self, sql):
+        statements = _prepared_cursors.setdefault(self._raw_connection(), {})
+        cursor = statements.get(sql)
+        if cursor is None:
+            cursor = self.conn.cursor(prepared=True)
+            statements[sql] = cursor
+        return cursor
+
+    def _forget_prepared(self, sql):
+        statements = _prepared_cursors.get(self._raw_connection(), {})
+        cursor = statements.pop(sql, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except DatabaseError:
+                pass
+
+
+@contextmanager
+def session():
+    """Borrows a connection for reads (from a read replica if there are any): `with session() as db: db.fetch_all(sql, params)`."""
+    conn, owned = _borrow(read_only=True)
+    if not conn:
+        _mark_failed()
+        raise backends.DatabaseUnavailable("Failed to get database connection.")
+    db = Session(conn, owned)
+    try:
+        yield db
+    except DatabaseError:
+        _mark_failed()
+        raise
+    finally:
+        db.close()
+
+
+@contextmanager
+def transaction():
+    """Like session(), but on the primary, and commits when the block succeeds and rolls back if it raises."""
+    conn, owned = _borrow(read_only=False)
+    if not conn:
+        _mark_failed()
+        raise backends.DatabaseUnavailable("Failed to get database connection.")
+    db = Session(conn, owned)
+    try:
+        yield db
+        conn.commit()
+    except BaseException as err:
+        conn.rollback()
+        if isinstance(err, DatabaseError):
+            _mark_failed()
+        raise
+    finally:
+        db.close()
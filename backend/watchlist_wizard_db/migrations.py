@@ -0,0 +1,299 @@
+import argparse
+from collections import namedtuple
+from . import backends, projection
+from .connection import DatabaseError, transaction
+
+# A schema change: upgrade(cursor, backend) applies it, downgrade(cursor, backend) reverts it (None if irreversible)
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade', 'downgrade'])
+
+
+def _v1_initial_schema(cursor, backend):
+    # IF NOT EXISTS so databases created by the old create_database() are adopted as version 1
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Movies (
+            MovieID INT PRIMARY KEY AUTO_INCREMENT,
+            Title VARCHAR(255) NOT NULL,
+            Year INT,
+            Runtime INT,
+            Rating DECIMAL(3, 1),
+            PlotSummary TEXT,
+            PosterURL VARCHAR(255),
+            IMDbID VARCHAR(20) UNIQUE,
+            ReleaseDate DATE,
+            MPAARating VARCHAR(10)
+        )
+    ''')
+    print("Movies table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Genres (
+            GenreID INT PRIMARY KEY AUTO_INCREMENT,
+            GenreName VARCHAR(50) NOT NULL UNIQUE
+        )
+    ''')
+    print("Genres table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MovieGenres (
+            MovieID INT,
+            GenreID INT,
+            PRIMARY KEY (MovieID, GenreID),
+            FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE,
+            FOREIGN KEY (GenreID) REFERENCES Genres(GenreID) ON DELETE CASCADE
+        )
+    ''')
+    print("MovieGenres table created (or already exists).")
+
+    cursor.execute('''
+       CREATE TABLE IF NOT EXISTS People (
+            PersonID INT PRIMARY KEY AUTO_INCREMENT,
+            IMDbID VARCHAR(20),
+            Name VARCHAR(255) NOT NULL,
+            BirthDate DATE NULL,
+            Bio TEXT NULL,
+            UNIQUE (IMDbID, Name)
+        )
+    ''')
+    print("People table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Roles (
+            RoleID INT PRIMARY KEY AUTO_INCREMENT,
+            RoleName VARCHAR(50) NOT NULL UNIQUE
+        )
+    ''')
+    print("Roles table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MoviePeople (
+            MovieID INT,
+            PersonID INT,
+            RoleID INT,
+            PRIMARY KEY (MovieID, PersonID, RoleID),
+            FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE,
+            FOREIGN KEY (PersonID) REFERENCES People(PersonID) ON DELETE CASCADE,
+            FOREIGN KEY (RoleID) REFERENCES Roles(RoleID) ON DELETE CASCADE
+        )
+    ''')
+    print("MoviePeople table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlotKeywords (
+            KeywordID INT PRIMARY KEY AUTO_INCREMENT,
+            Keyword VARCHAR(50) NOT NULL UNIQUE
+        )
+    ''')
+    print("PlotKeywords table created (or already exists).")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MovieKeywords (
+            MovieID INT,
+            KeywordID INT,
+            PRIMARY KEY (MovieID, KeywordID),
+            FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE,
+            FOREIGN KEY (KeywordID) REFERENCES PlotKeywords(KeywordID) ON DELETE CASCADE
+        )
+    ''')
+    print("MovieKeywords table created (or already exists).")
+
+    # Filmography credits from person pages wait here until both the person and the movie are in the DB
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PendingMoviePeople (
+            PersonIMDbID VARCHAR(20) NOT NULL,
+            MovieIMDbID VARCHAR(20) NOT NULL,
+            RoleName VARCHAR(50) NOT NULL DEFAULT 'Credited',
+            PRIMARY KEY (PersonIMDbID, MovieIMDbID, RoleName)
+        )
+    ''')
+    backend.create_index(cursor, 'idx_pending_movie', 'PendingMoviePeople', 'MovieIMDbID')
+    print("PendingMoviePeople table created (or already exists).")
+
+    # Pre-populate Roles table
+    cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES ('Actor')")
+    cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES ('Director')")
+    cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES ('Writer')")
+    cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES ('Producer')")
+    cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES ('Credited')") # Person page credit, exact role unknown
+    backend.create_search_index(cursor)
+
+
+# (index name, table, columns) added by version 2, each backs one of the API's hot queries
+HOT_QUERY_INDEXES = [
+    # get_all_movies: ORDER BY Rating DESC, Year DESC, covering every listed column so the unfiltered
+    # listing is read in index order without a filesort or a lookup into the table rows
+    ('idx_movies_listing', 'Movies', 'Rating DESC, Year DESC, Title, PosterURL, IMDbID'),
+    # get_all_movies genre filter and /api/recommendations: MovieGenres by GenreID (the PK starts with MovieID)
+    ('idx_moviegenres_genre', 'MovieGenres', 'GenreID, MovieID'),
+    # get_all_movies keyword filter: MovieKeywords by KeywordID
+    ('idx_moviekeywords_keyword', 'MovieKeywords', 'KeywordID, MovieID'),
+    # get_all_movies actor filter: MoviePeople by PersonID and RoleID
+    ('idx_moviepeople_person', 'MoviePeople', 'PersonID, RoleID, MovieID'),
+]
+# get_movie_by_imdb_id needs nothing new: Movies.IMDbID is UNIQUE and the MovieGenres, MoviePeople and
+# MovieKeywords primary keys all start with MovieID. People lookups by IMDbID alone use the leftmost
+# column of the UNIQUE (IMDbID, Name) key, so a separate People(IMDbID) index would be redundant.
+
+def _v2_hot_query_indexes(cursor, backend):
+    for name, table, columns in HOT_QUERY_INDEXES:
+        backend.create_index(cursor, name, table, columns)
+        print(f"Index {name} on {table} ({columns}) created (or already exists).")
+
+def _v2_downgrade(cursor, backend):
+    for name, table, _ in HOT_QUERY_INDEXES:
+        backend.drop_index(cursor, name, table)
+
+
+def _v3_fulltext_search(cursor, backend):
+    # Ranked title/plot search: FULLTEXT indexes on MySQL, MoviesFTS with prefix indexes on SQLite
+    backend.create_fulltext_index(cursor)
+    print("Full-text search index created.")
+
+def _v3_downgrade(cursor, backend):
+    backend.drop_fulltext_index(cursor)
+
+
+def _v4_keyset_listing_index(cursor, backend):
+    # The listing now ends its ORDER BY with MovieID DESC, so the index carries it right after the sort keys
+    # and a keyset page seeks straight to (Rating, Year, MovieID) of the previous page's last row
+    backend.create_index(cursor, 'idx_movies_keyset', 'Movies', 'Rating DESC, Year DESC, MovieID DESC, Title, PosterURL, IMDbID')
+    backend.drop_index(cursor, 'idx_movies_listing', 'Movies')
+    print("Index idx_movies_keyset on Movies created (replaces idx_movies_listing).")
+
+def _v4_downgrade(cursor, backend):
+    backend.create_index(cursor, 'idx_movies_listing', 'Movies', 'Rating DESC, Year DESC, Title, PosterURL, IMDbID')
+    backend.drop_index(cursor, 'idx_movies_keyset', 'Movies')
+
+
+def _v5_catalog_version(cursor, backend):
+    # One row counting catalog changes: every crawler write bumps it, API response caches are keyed on it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS CatalogVersion (
+            ID INT PRIMARY KEY,
+            Version BIGINT NOT NULL,
+            UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("INSERT IGNORE INTO CatalogVersion (ID, Version) VALUES (1, 1)")
+    print("CatalogVersion table created (or already exists).")
+
+def _v5_downgrade(cursor, backend):
+    cursor.execute("DROP TABLE IF EXISTS CatalogVersion")
+
+
+def _v6_movie_search(cursor, backend):
+    # Denormalized listing rows (see projection.py), kept current by the write paths
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MovieSearch (
+            MovieID INT PRIMARY KEY,
+            IMDbID VARCHAR(20),
+            Title VARCHAR(255) NOT NULL,
+            Year INT,
+            Rating DECIMAL(3, 1),
+            PosterURL VARCHAR(255),
+            GenreMask BIGINT NOT NULL DEFAULT 0,
+            Genres TEXT NOT NULL,
+            Actors TEXT NOT NULL,
+            Keywords TEXT NOT NULL,
+            FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE
+        )
+    ''')
+    # Same order and covering columns as idx_movies_keyset, an unfiltered listing reads only the index
+    backend.create_index(cursor, 'idx_moviesearch_listing', 'MovieSearch',
+                         'Rating DESC, Year DESC, MovieID DESC, Title, PosterURL, IMDbID')
+    cursor.execute("DELETE FROM MovieSearch")
+    projection.backfill_movie_search(cursor)
+    print("MovieSearch table created and filled.")
+
+def _v6_downgrade(cursor, backend):
+    cursor.execute("DROP TABLE IF EXISTS MovieSearch")
+
+
+def _v7_movie_search_changed_version(cursor, backend):
+    # Catalog version of each row's last refresh (see projection.refresh_movie_search), so the recommender
+    # finds re-crawled movies and movies that got new credits, not only the ones past its highest MovieID
+    cursor.execute("ALTER TABLE MovieSearch ADD COLUMN ChangedVersion BIGINT NOT NULL DEFAULT 0")
+    backend.create_index(cursor, 'idx_moviesearch_changed', 'MovieSearch', 'ChangedVersion')
+    print("MovieSearch.ChangedVersion column added.")
+
+def _v7_downgrade(cursor, backend):
+    backend.drop_index(cursor, 'idx_moviesearch_changed', 'MovieSearch')
+    cursor.execute("ALTER TABLE MovieSearch DROP COLUMN ChangedVersion")
+
+
+MIGRATIONS = [
+    Migration(1, "Initial schema", _v1_initial_schema, None),
+    Migration(2, "Indexes for listing, filter and recommendation queries", _v2_hot_query_indexes, _v2_downgrade),
+    Migration(3, "Full-text search indexes for ranked search", _v3_fulltext_search, _v3_downgrade),
+    Migration(4, "Listing index with MovieID for keyset pagination", _v4_keyset_listing_index, _v4_downgrade),
+    Migration(5, "Catalog version counter for response caching", _v5_catalog_version, _v5_downgrade),
+    Migration(6, "MovieSearch denormalized listing table", _v6_movie_search, _v6_downgrade),
+    Migration(7, "MovieSearch change versions for incremental recommendations", _v7_movie_search_changed_version, _v7_downgrade),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SchemaMigrations (
+            Version INT PRIMARY KEY,
+            Description VARCHAR(255) NOT NULL,
+            AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def current_version():
+    """Returns the highest applied migration version (0 for an empty database)."""
+    with transaction() as db:
+        cursor = db.cursor()
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT MAX(Version) FROM SchemaMigrations")
+        return cursor.fetchone()[0] or 0
+
+def migrate(target=None):
+    """
+    Applies pending migrations in order (or reverts down to target if it is below the current version).
+    Each migration runs in its own transaction and is recorded in SchemaMigrations. MySQL commits DDL
+    implicitly, so a failed migration may be partially applied and should be fixed before re-running.
+    """
+    backend = backends.get_backend()
+    version = current_version()
+    target = MIGRATIONS[-1].version if target is None else target
+
+    for migration in MIGRATIONS:
+        if version < migration.version <= target:
+            print(f"Applying migration {migration.version}: {migration.description}")
+            with transaction() as db:
+                cursor = db.cursor()
+                migration.upgrade(cursor, backend)
+                cursor.execute("INSERT INTO SchemaMigrations (Version, Description) VALUES (%s, %s)",
+                               (migration.version, migration.description))
+
+    for migration in reversed(MIGRATIONS):
+        if target < migration.version <= version:
+            if migration.downgrade is None:
+                raise ValueError(f"Migration {migration.version} ({migration.description}) can't be reverted.")
+            print(f"Reverting migration {migration.version}: {migration.description}")
+            with transaction() as db:
+                cursor = db.cursor()
+                migration.downgrade(cursor, backend)
+                cursor.execute("DELETE FROM SchemaMigrations WHERE Version = %s", (migration.version,))
+    return target
+
+def create_database():
+    """Creates the database tables (if they don't exist) by bringing the schema up to the latest version."""
+    try:
+        version = migrate()
+        print(f"Database and tables setup complete (schema version {version}).")
+    except DatabaseError as err:
+        print(f"Error during database setup: {err}")
+
+
+if __name__ == "__main__":
+    # python -m backend.watchlist_wizard_db.migrations [--target N] from the project root
+    parser = argparse.ArgumentParser(description="Apply or revert Watchlist Wizard schema migrations.")
+    parser.add_argument('--target', type=int, default=None, help="Version to migrate to (default: latest)")
+    parser.add_argument('--status', action='store_true', help="Only print the current version")
+    args = parser.parse_args()
+    if args.status:
+        print(f"Schema version {current_version()} (latest {MIGRATIONS[-1].version})")
+    else:
+        migrate(args.target)
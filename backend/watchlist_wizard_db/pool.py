@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the pool timeout."""
+
+
+class PooledConnection:
+    """A borrowed connection, every attribute except close() goes to the real connection."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._cnx = conn # Same attribute name as mysql.connector's pooled connections, see Session._raw_connection
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+    def close(self):
+        """Hands the connection back to the pool (safe to call twice)."""
+        if self._cnx is not None:
+            conn, self._cnx = self._cnx, None
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most max_size connections. get_connection() blocks up to timeout seconds when
+    they are all in use, and pings connections that sat idle longer than health_check_interval before
+    handing them out, replacing the ones that fail.
+    """
+
+    def __init__(self, connect, max_size, timeout, health_check_interval):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.slots = threading.BoundedSemaphore(max_size) # One per connection that may be in use
+        self.idle = queue.LifoQueue() # (connection, time returned), most recently used first
+        self.lock = threading.Lock()
+        self.open_connections = 0
+        self.in_use = 0
+        self.counters = {'borrows': 0, 'connects': 0, 'timeouts': 0, 'health_check_failures': 0,
+                         'waits': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def get_connection(self):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.counters['timeouts'] += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s ({self.max_size} in use).")
+        waited = time.perf_counter() - start
+        try:
+            conn = self._idle_connection()
+            if conn is None:
+                conn = self.connect()
+                with self.lock:
+                    self.open_connections += 1
+                    self.counters['connects'] += 1
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.in_use += 1
+            self.counters['borrows'] += 1
+            if waited > 0.001: # Only count borrows that actually had to wait for a free connection
+                self.counters['waits'] += 1
+            self.counters['wait_seconds_total'] += waited
+            self.counters['wait_seconds_max'] = max(self.counters['wait_seconds_max'], waited)
+        return PooledConnection(self, conn)
+
+    def _idle_connection(self):
+        """Most recently returned healthy connection, or None if a new one has to be opened."""
+        while True:
+            try:
+                conn, returned_at = self.idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - returned_at < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            with self.lock:
+                self.counters['health_check_failures'] += 1
+            self._discard(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            return conn.is_connected() # Pings without reconnecting, which would drop the prepared statements
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self.lock:
+            self.open_connections -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn):
+        """Takes a connection back, rolling back anything the borrower left uncommitted."""
+        try:
+            if getattr(conn, 'in_transaction', True):
+                conn.rollback()
+            self.idle.put((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn) # Broken connection, the next borrower opens a new one
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+
+    def stats(self):
+        """Pool size and wait-time metrics, for the API's health endpoint."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update(max_size=self.max_size, open=self.open_connections, in_use=self.in_use)
+        stats['idle'] = self.idle.qsize()
+        stats['wait_ms_avg'] = round(stats.pop('wait_seconds_total') * 1000 / max(stats['borrows'], 1), 3)
+        stats['wait_ms_max'] = round(stats.pop('wait_seconds_max') * 1000, 3)
+        return stats
@@ -0,0 +1,105 @@
+"""
+MovieSearch: one denormalized row per movie with everything the listing shows or filters on (genre
+bitmask and names, actor names, keywords, rating, year, poster), so /api/movies reads a single table
+instead of joining genres, keywords and credits at read time. The write paths refresh the rows of the
+movies they touch in the same transaction; rebuild_movie_search() backfills the whole table:
+
+    python -m backend.watchlist_wizard_db.projection rebuild
+"""
+import argparse
+import time
+from . import backends
+from .connection import DatabaseError, transaction
+
+# Genre bits fit a signed BIGINT on both backends, GenreIDs above this are only in the Genres list
+MAX_GENRE_BIT = 62
+
+# Genres, Actors and Keywords are JSON arrays of names: ["Crime", "Drama"], for the export and facets. The
+# listing filters use GenreMask and the normalized tables instead (see queries.LISTING_FILTERS).
+MOVIE_SEARCH_ROWS_SQL = """
+    INSERT INTO MovieSearch (MovieID, IMDbID, Title, Year, Rating, PosterURL, GenreMask, Genres, Actors, Keywords{columns})
+    SELECT m.MovieID, m.IMDbID, m.Title, m.Year, m.Rating, m.PosterURL,
+        COALESCE((SELECT SUM(1 << (mg.GenreID - 1)) FROM MovieGenres mg
+                  WHERE mg.MovieID = m.MovieID AND mg.GenreID <= {max_bit}), 0),
+        COALESCE((SELECT {array_agg}(g.GenreName)
+                  FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+                  WHERE mg.MovieID = m.MovieID), '[]'),
+        COALESCE((SELECT {array_agg}(p.Name)
+                  FROM MoviePeople mp JOIN People p ON p.PersonID = mp.PersonID JOIN Roles r ON r.RoleID = mp.RoleID
+                  WHERE mp.MovieID = m.MovieID AND r.RoleName = 'Actor'), '[]'),
+        COALESCE((SELECT {array_agg}(pk.Keyword)
+                  FROM MovieKeywords mk JOIN PlotKeywords pk ON pk.KeywordID = mk.KeywordID
+                  WHERE mk.MovieID = m.MovieID), '[]'){values}
+    FROM Movies m
+    WHERE {where}
+"""
+
+# The version the current write transaction will commit (bump_catalog_version() adds 1 before it commits).
+# FOR UPDATE reads the latest committed value and holds the row until then, so concurrent writers get
+# different versions in commit order.
+NEXT_VERSION_SQL = "SELECT Version FROM CatalogVersion WHERE ID = 1 FOR UPDATE"
+
+REFRESH_CHUNK = 1000 # Movie IDs per refresh statement
+REBUILD_CHUNK = 10000 # MovieID range per rebuild transaction
+
+
+def _rows_sql(where, changed_version=None):
+    # changed_version: ChangedVersion of the rows (migration 7), None while the column doesn't exist yet
+    backend = backends.get_backend()
+    columns, values = ("", "") if changed_version is None else (", ChangedVersion", f", {int(changed_version)}")
+    return MOVIE_SEARCH_ROWS_SQL.format(array_agg=backend.json_array_agg, max_bit=MAX_GENRE_BIT, where=where,
+                                        columns=columns, values=values)
+
+def backfill_movie_search(cursor):
+    """Fills an empty MovieSearch in one statement (used by the migration that creates it)."""
+    cursor.execute(_rows_sql("1 = 1"))
+
+def refresh_movie_search(cursor, movie_ids):
+    """
+    Recomputes the MovieSearch rows of movie_ids, call it in the transaction that changed them (which must
+    end with bump_catalog_version()). The rows get the catalog version it commits as their ChangedVersion,
+    so the in-memory indexes re-read only the movies changed since the version they were built at.
+    """
+    movie_ids = sorted(set(movie_ids))
+    if not movie_ids:
+        return
+    cursor.execute(NEXT_VERSION_SQL)
+    row = cursor.fetchone()
+    changed_version = row[0] + 1 if row else 0
+    for i in range(0, len(movie_ids), REFRESH_CHUNK):
+        chunk = movie_ids[i:i + REFRESH_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM MovieSearch WHERE MovieID IN ({placeholders})", tuple(chunk))
+        cursor.execute(_rows_sql(f"m.MovieID IN ({placeholders})", changed_version), tuple(chunk))
+
+def rebuild_movie_search():
+    """
+    Recomputes every MovieSearch row. Each MovieID range is replaced in its own transaction, so no single
+    transaction gets huge and readers see either the old or the new rows of a range, never none.
+    """
+    start = time.perf_counter()
+    with transaction() as db:
+        cursor = db.cursor()
+        cursor.execute("SELECT COALESCE(MAX(MovieID), 0) FROM Movies")
+        last_id = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM MovieSearch WHERE MovieID > %s", (last_id,))
+        cursor.execute("SELECT Version FROM CatalogVersion WHERE ID = 1")
+        row = cursor.fetchone()
+        changed_version = row[0] if row else 0 # Same contents, nothing for the in-memory indexes to re-read
+    for low in range(0, last_id, REBUILD_CHUNK):
+        with transaction() as db:
+            cursor = db.cursor()
+            cursor.execute("DELETE FROM MovieSearch WHERE MovieID > %s AND MovieID <= %s", (low, low + REBUILD_CHUNK))
+            cursor.execute(_rows_sql("m.MovieID > %s AND m.MovieID <= %s", changed_version), (low, low + REBUILD_CHUNK))
+    print(f"MovieSearch rebuilt up to MovieID {last_id} in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    # Run from the project root: python -m backend.watchlist_wizard_db.projection rebuild
+    parser = argparse.ArgumentParser(description="Maintain the MovieSearch listing projection.")
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+    try:
+        rebuild_movie_search()
+    except DatabaseError as err:
+        print(f"MovieSearch rebuild failed: {err}")
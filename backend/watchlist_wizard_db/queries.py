@@ -0,0 +1,354 @@
+import base64
+import decimal
+import json
+from . import backends
+from .connection import DatabaseError, session, transaction
+from .projection import MAX_GENRE_BIT
+
+# Movie details in one round trip: genres, credits and keywords come back as JSON arrays built by correlated
+# subqueries, so fetching any number of movies is a single query instead of 1 + 3 per movie
+MOVIE_DETAILS_SQL = """
+    SELECT m.*,
+        (SELECT {array_agg}(g.GenreName)
+         FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+         WHERE mg.MovieID = m.MovieID) AS GenresJSON,
+        (SELECT {array_agg}({object}('Name', p.Name, 'PersonIMDbID', p.IMDbID, 'RoleName', r.RoleName))
+         FROM MoviePeople mp JOIN People p ON p.PersonID = mp.PersonID JOIN Roles r ON r.RoleID = mp.RoleID
+         WHERE mp.MovieID = m.MovieID) AS PeopleJSON,
+        (SELECT {array_agg}(pk.Keyword)
+         FROM MovieKeywords mk JOIN PlotKeywords pk ON pk.KeywordID = mk.KeywordID
+         WHERE mk.MovieID = m.MovieID) AS KeywordsJSON
+    FROM Movies m
+    WHERE m.IMDbID IN ({placeholders})
+"""
+
+GENRES_SQL = "SELECT GenreName FROM Genres ORDER BY GenreName"
+
+CATALOG_VERSION_SQL = "SELECT Version, UpdatedAt FROM CatalogVersion WHERE ID = 1"
+
+MAX_BATCH_IDS = 500 # Most IMDb IDs get_movies_by_imdb_ids() accepts in one call
+
+TOP_MOVIES_BY_GENRE_SQL = """
+    SELECT m.MovieID, m.Title, m.Year, m.Rating, m.PosterURL, m.IMDbID
+    FROM Movies m
+    JOIN MovieGenres mg ON m.MovieID = mg.MovieID
+    JOIN Genres g ON mg.GenreID = g.GenreID
+    WHERE g.GenreName = %s
+    ORDER BY m.Rating DESC
+    LIMIT %s
+"""
+
+
+# Catalog export: every movie with its genres, actors and keywords (the JSON arrays of MovieSearch), in
+# MovieID order so an interrupted export can continue after the last MovieID it got
+EXPORT_SQL = """
+    SELECT m.MovieID, m.IMDbID, m.Title, m.Year, mv.Runtime, m.Rating, mv.MPAARating, mv.ReleaseDate, mv.PlotSummary,
+        m.PosterURL, m.Genres, m.Actors, m.Keywords
+    FROM MovieSearch m JOIN Movies mv ON mv.MovieID = m.MovieID
+    WHERE {where}
+    ORDER BY m.MovieID
+"""
+
+# Listing filters: (condition on alias m, parameter builder). The listing reads MovieSearch (see projection.py)
+# in rating order, and each active filter adds one condition, so a movie row is never multiplied by its
+# genres/keywords/people and no DISTINCT is needed. They match whole genres, keywords and people, never the
+# text of MovieSearch's JSON arrays, where a pattern could run across two names.
+LISTING_FILTERS = {
+    # A bit of GenreMask (the genre's bit is looked up once), so even a genre matching most movies is a cheap
+    # test on the rows scanned in rating order. Genres past the mask's bits are looked up in MovieGenres.
+    'genre': (f"""((m.GenreMask & (SELECT COALESCE(MAX(1 << (g.GenreID - 1)), 0) FROM Genres g
+                                  WHERE g.GenreName = %s AND g.GenreID <= {MAX_GENRE_BIT})) <> 0
+               OR m.MovieID IN (SELECT mg.MovieID FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+                                WHERE g.GenreName = %s AND g.GenreID > {MAX_GENRE_BIT}))""",
+              lambda value: [value, value]),
+    # Keyword and actor filters are driven from the matching keywords/people: the nested IN looks those up
+    # first, then their movies through idx_moviekeywords_keyword / idx_moviepeople_person. A specific name
+    # matches a handful of movies, where probing every movie in rating order would scan most of the catalog.
+    'keyword': ("""m.MovieID IN (SELECT mk.MovieID FROM MovieKeywords mk
+                   WHERE mk.KeywordID IN (SELECT KeywordID FROM PlotKeywords WHERE Keyword LIKE %s))""",
+                lambda value: [f"%{value}%"]),
+    'actor': ("""m.MovieID IN (SELECT mp.MovieID FROM MoviePeople mp
+                 WHERE mp.PersonID IN (SELECT PersonID FROM People WHERE Name LIKE %s)
+                 AND mp.RoleID IN (SELECT RoleID FROM Roles WHERE RoleName = 'Actor'))""",
+              lambda value: [f"%{value}%"]),
+}
+
+def compile_listing_filters(genre_filter=None, keyword_filter=None, actor_filter=None):
+    """Returns (where clauses, params) with one condition per active filter."""
+    where_clauses = []
+    params = []
+    for name, value in (('genre', genre_filter), ('keyword', keyword_filter), ('actor', actor_filter)):
+        if value:
+            clause, param = LISTING_FILTERS[name]
+            where_clauses.append(clause)
+            params.extend(param(value))
+    return where_clauses, params
+
+# Listing sort orders, every column descending. MovieID is last so rows tied on rating and year still have
+# one fixed order, which keyset pagination needs (and which makes offset pages stable too).
+LISTING_ORDER = {
+    'rating': ['m.Rating', 'm.Year', 'm.MovieID'],
+    'relevance': ['s.Relevance', 'm.Rating', 'm.Year', 'm.MovieID'],
+}
+
+RATED_LISTED = 'rated-listed' # movie_listing_query(after=...) value: continue with the movies that have no rating
+
+def _seek_clause(columns, values):
+    """
+    (sql, params) matching the rows after values in (columns DESC) order. Rating and Year can be NULL,
+    which sorts last in descending order on both MySQL and SQLite, so NULL is treated as the smallest value.
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return (f"{column} < %s", [value]) if value is not None else ("1 = 0", [])
+    rest_sql, rest_params = _seek_clause(columns[1:], values[1:])
+    if value is None:
+        return f"({column} IS NULL AND {rest_sql})", rest_params
+    return f"({column} < %s OR {column} IS NULL OR ({column} = %s AND {rest_sql}))", [value, value] + rest_params
+
+def _keyset_clause(columns, values):
+    """
+    Like _seek_clause, but the first column gets a plain upper bound the index can seek to. That leaves out
+    rows where it is NULL, get_movies_page fetches those with a follow-up query when it runs out of rows.
+    """
+    column, value = columns[0], values[0]
+    rest_sql, rest_params = _seek_clause(columns[1:], values[1:])
+    if value is None:
+        return f"{column} IS NULL AND {rest_sql}", rest_params
+    return f"{column} <= %s AND ({column} < %s OR ({column} = %s AND {rest_sql}))", [value, value, value] + rest_params
+
+def encode_cursor(row, sort='rating'):
+    """Opaque page token holding the sort key of the last row of a page."""
+    values = [row[column.split('.')[1]] for column in LISTING_ORDER[sort]]
+    values = [float(value) if isinstance(value, decimal.Decimal) else value for value in values]
+    payload = json.dumps({'sort': sort, 'after': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort='rating'):
+    """Returns the sort key values stored in a page token, raises ValueError if it is invalid."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = payload['after']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if payload.get('sort') != sort or not isinstance(values, list) or len(values) != len(LISTING_ORDER[sort]):
+        raise ValueError("Cursor does not belong to this sort order.")
+    return values
+
+def movie_listing_query(limit=250, offset=0, search_term=None, genre_filter=None, keyword_filter=None, actor_filter=None,
+                        sort='rating', after=None):
+    """
+    Builds the (sql, params) for get_all_movies. sort='relevance' orders search results by match score.
+    after (decoded cursor values) seeks past the previous page through the listing index instead of an OFFSET.
+    """
+    if sort != 'relevance' or not search_term:
+        sort = 'rating'
+    sql = "SELECT m.MovieID, m.Title, m.Year, m.Rating, m.PosterURL, m.IMDbID"
+    params = []
+    if search_term:
+        # The full-text index finds the matches and scores them, see the backends' search_source()
+        search_sql, search_params = backends.get_backend().search_source(search_term)
+        sql += f", s.Relevance FROM MovieSearch m JOIN ({search_sql}) s ON s.MovieID = m.MovieID"
+        params.extend(search_params)
+    else:
+        sql += " FROM MovieSearch m"
+
+    where_clauses, filter_params = compile_listing_filters(genre_filter, keyword_filter, actor_filter)
+    params.extend(filter_params)
+    if after == RATED_LISTED:
+        where_clauses.append("m.Rating IS NULL")
+    elif after is not None:
+        seek_sql, seek_params = _keyset_clause(LISTING_ORDER[sort], after)
+        where_clauses.append(seek_sql)
+        params.extend(seek_params)
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+
+    # Add ordering and pagination
+    sql += " ORDER BY " + ", ".join(f"{column} DESC" for column in LISTING_ORDER[sort]) + " LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    return sql, params
+
+def movie_ids_query(search_term=None, keyword_filter=None, actor_filter=None):
+    """(sql, params) of the MovieIDs matching the listing's text filters, for the facet counts (facets.py)."""
+    sql = "SELECT m.MovieID FROM MovieSearch m"
+    params = []
+    if search_term:
+        search_sql, search_params = backends.get_backend().search_source(search_term)
+        sql += f" JOIN ({search_sql}) s ON s.MovieID = m.MovieID"
+        params.extend(search_params)
+    where_clauses, filter_params = compile_listing_filters(None, keyword_filter, actor_filter)
+    params.extend(filter_params)
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    return sql, params
+
+def get_all_movies(limit=250, offset=0, search_term=None, genre_filter=None, keyword_filter=None, actor_filter=None,
+                   sort='rating'):
+    """Fetches a list of movies with pagination and filtering."""
+    sql, params = movie_listing_query(limit, offset, search_term, genre_filter, keyword_filter, actor_filter, sort)
+    try:
+        with session() as db:
+            return db.fetch_all(sql, params)
+    except DatabaseError as err:
+        print(f"Error fetching filtered movies: {err}")
+        return []
+
+def run_steps(db, steps):
+    """Runs a query-steps generator on a sync session: each yielded (sql, params) is sent back its rows."""
+    try:
+        query = next(steps)
+        while True:
+            query = steps.send(db.fetch_all(*query))
+    except StopIteration as done:
+        return done.value
+
+def movies_page_steps(limit=250, cursor=None, search_term=None, genre_filter=None, keyword_filter=None,
+                      actor_filter=None, sort='rating'):
+    """get_movies_page's queries as steps (see run_steps), shared with the async API in aio.py."""
+    if sort != 'relevance' or not search_term:
+        sort = 'rating'
+    after = decode_cursor(cursor, sort) if cursor else None
+    # One extra row tells whether there is a next page
+    rows = yield movie_listing_query(limit + 1, 0, search_term, genre_filter, keyword_filter, actor_filter, sort, after)
+    if sort == 'rating' and after and after[0] is not None and len(rows) <= limit:
+        # The seek skipped unrated movies, which come after every rated one
+        rows += yield movie_listing_query(limit + 1 - len(rows), 0, search_term, genre_filter, keyword_filter,
+                                          actor_filter, sort, RATED_LISTED)
+    movies = rows[:limit]
+    next_cursor = encode_cursor(movies[-1], sort) if len(rows) > limit and movies else None
+    return {'movies': movies, 'next_cursor': next_cursor}
+
+def get_movies_page(limit=250, cursor=None, search_term=None, genre_filter=None, keyword_filter=None, actor_filter=None,
+                    sort='rating'):
+    """
+    Keyset-paginated get_all_movies: returns {'movies': [...], 'next_cursor': token or None}. Pass the
+    previous page's next_cursor to continue, every page costs the same however deep it is.
+    Raises ValueError for an invalid cursor.
+    """
+    steps = movies_page_steps(limit, cursor, search_term, genre_filter, keyword_filter, actor_filter, sort)
+    try:
+        with session() as db:
+            return run_steps(db, steps)
+    except DatabaseError as err:
+        print(f"Error fetching movies page: {err}")
+        return {'movies': [], 'next_cursor': None}
+
+def movie_details_query(count):
+    """Details SQL for `count` IMDb IDs. The placeholder list is padded to a power of two so MySQL only
+    prepares a handful of distinct statements per connection; pad with repeats of a real ID."""
+    size = 1
+    while size < count:
+        size *= 2
+    backend = backends.get_backend()
+    sql = MOVIE_DETAILS_SQL.format(array_agg=backend.json_array_agg, object=backend.json_object,
+                                   placeholders=", ".join(["%s"] * size))
+    return sql, size
+
+def _json_list(value):
+    if value is None:
+        return [] # MySQL's JSON_ARRAYAGG of no rows
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode()
+    return json.loads(value)
+
+def _movie_details(row):
+    """Turns a MOVIE_DETAILS_SQL row into the /api/movies/<imdb_id> shape."""
+    row['genres'] = _json_list(row.pop('GenresJSON'))
+    row['people'] = _json_list(row.pop('PeopleJSON'))
+    row['plot_keywords'] = _json_list(row.pop('KeywordsJSON'))
+    return row
+
+def movie_details_steps(imdb_ids):
+    """Details of imdb_ids (unique, at most MAX_BATCH_IDS) in their order, as steps (see run_steps)."""
+    sql, size = movie_details_query(len(imdb_ids))
+    params = list(imdb_ids) + [imdb_ids[-1]] * (size - len(imdb_ids))
+    movies = {row['IMDbID']: _movie_details(row) for row in (yield sql, params)}
+    return [movies[imdb_id] for imdb_id in imdb_ids if imdb_id in movies]
+
+def batch_ids(imdb_ids):
+    """Drops duplicate IDs (keeping the order) and enforces MAX_BATCH_IDS (ValueError)."""
+    imdb_ids = list(dict.fromkeys(imdb_ids))
+    if len(imdb_ids) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} IDs per request.")
+    return imdb_ids
+
+def get_filtered_movie_ids(search_term=None, keyword_filter=None, actor_filter=None):
+    """MovieIDs matching the text filters of the listing, None on error."""
+    try:
+        with session() as db:
+            return [row['MovieID'] for row in db.fetch_all(*movie_ids_query(search_term, keyword_filter, actor_filter))]
+    except DatabaseError as err:
+        print(f"Error fetching filtered movie IDs: {err}")
+        return None
+
+def export_query(after_id=0, genre_filter=None, keyword_filter=None, actor_filter=None):
+    """(sql, params) of the catalog export, the listing filters narrow it down."""
+    where_clauses, params = compile_listing_filters(genre_filter, keyword_filter, actor_filter)
+    return EXPORT_SQL.format(where=" AND ".join(["m.MovieID > %s"] + where_clauses)), [after_id] + params
+
+def export_row(row):
+    """Turns an EXPORT_SQL row into the exported shape (JSON arrays as lists)."""
+    row['Genres'] = _json_list(row['Genres'])
+    row['Actors'] = _json_list(row['Actors'])
+    row['Keywords'] = _json_list(row['Keywords'])
+    return row
+
+def export_movies(after_id=0, genre_filter=None, keyword_filter=None, actor_filter=None, batch_size=1000):
+    """
+    Generator of the catalog in lists of at most batch_size movies, read through an unbuffered cursor
+    (see Session.stream). Raises DatabaseError, possibly after some batches were yielded.
+    """
+    sql, params = export_query(after_id, genre_filter, keyword_filter, actor_filter)
+    with session() as db:
+        for batch in db.stream(sql, params, batch_size):
+            yield [export_row(row) for row in batch]
+
+def get_movie_by_imdb_id(imdb_id):
+    """Fetches a single movie by its IMDb ID, including related data."""
+    try:
+        with session() as db:
+            movies = run_steps(db, movie_details_steps([imdb_id]))
+            return movies[0] if movies else None
+    except DatabaseError as err:
+        print(f"Error fetching movie details: {err}")
+        return None
+
+def get_movies_by_imdb_ids(imdb_ids):
+    """Details of several movies in one query, in the order of imdb_ids (unknown IDs are left out)."""
+    imdb_ids = batch_ids(imdb_ids)
+    if not imdb_ids:
+        return []
+    try:
+        with session() as db:
+            return run_steps(db, movie_details_steps(imdb_ids))
+    except DatabaseError as err:
+        print(f"Error fetching movie details: {err}")
+        return []
+
+def get_all_genres():
+    """Fetches all unique genre names."""
+    try:
+        with session() as db:
+            return [row['GenreName'] for row in db.fetch_all(GENRES_SQL)]
+    except DatabaseError as err:
+        print(f"Error fetching genres: {err}")
+        return []
+
+def get_top_movies_by_genre(genre_name, limit=20):
+    """Fetches the highest rated movies of one genre (used by /api/recommendations)."""
+    try:
+        with session() as db:
+            return db.fetch_all(TOP_MOVIES_BY_GENRE_SQL, (genre_name, limit))
+    except DatabaseError as err:
+        print(f"Error getting recommendations: {err}")
+        return []
+
+def get_catalog_version():
+    """Returns {'Version', 'UpdatedAt'} of the catalog (bumped by every crawler write), or None on error."""
+    try:
+        with transaction() as db: # From the primary: a replica's may be behind (see replicas_caught_up())
+            return db.fetch_one(CATALOG_VERSION_SQL)
+    except DatabaseError as err:
+        print(f"Error fetching catalog version: {err}")
+        return None
@@ -0,0 +1,95 @@
+"""
+Query timing for the API's metrics and the slow-query log. Every fetch_all() adds its time and row count
+to the current request's totals (see connection.request_stats()); queries slower than SLOW_QUERY_MS are
+kept (their SQL, not the parameter values, which can be what users typed), the last SLOW_QUERY_LOG_SIZE
+in memory (/metrics/slow-queries) and all of them appended to SLOW_QUERY_LOG_FILE as JSON lines if it is set.
+
+The EXPLAIN plan of a slow statement is added by a background thread on its own connection, never in the
+request that ran it, and each statement is explained at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds.
+"""
+import collections
+import datetime
+import json
+import queue
+import threading
+import time
+try:
+    from .. import config
+except ImportError:
+    import config
+
+EXPLAIN_QUEUE_SIZE = 16 # Slow queries waiting for their plan, more are logged without one
+EXPLAINED_KEEP = 1000 # Statements remembered as explained recently
+
+_slow_queries = collections.deque(maxlen=config.SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+_explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+_explained_at = {} # SQL -> time.monotonic() of its last EXPLAIN
+_worker = None
+
+
+def is_slow(seconds):
+    return config.SLOW_QUERY_MS > 0 and seconds * 1000 >= config.SLOW_QUERY_MS
+
+def log_slow_query(sql, params, seconds, rows):
+    """Records a slow query. `params` are only used to EXPLAIN it (in the background), never kept."""
+    entry = {
+        'at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'ms': round(seconds * 1000, 1),
+        'rows': rows,
+        'sql': " ".join(sql.split()),
+        'plan': None,
+    }
+    with _lock:
+        _slow_queries.append(entry)
+        explain = _explain_due(entry['sql'])
+    print(f"Slow query ({entry['ms']} ms, {rows} rows): {entry['sql'][:200]}")
+    if explain:
+        try:
+            _explain_queue.put_nowait((entry, sql, tuple(params)))
+            return # The worker writes the entry to the file once it has the plan
+        except queue.Full:
+            pass
+    _write(entry)
+
+def _explain_due(sql):
+    # Called with _lock held: claims the statement's next EXPLAIN if none ran in the last interval
+    global _worker
+    if config.SLOW_QUERY_EXPLAIN_INTERVAL <= 0:
+        return False
+    now = time.monotonic()
+    if now - _explained_at.get(sql, -config.SLOW_QUERY_EXPLAIN_INTERVAL) < config.SLOW_QUERY_EXPLAIN_INTERVAL:
+        return False
+    if len(_explained_at) >= EXPLAINED_KEEP:
+        _explained_at.clear()
+    _explained_at[sql] = now
+    if _worker is None:
+        _worker = threading.Thread(target=_explain_worker, name='slow-query-explain', daemon=True)
+        _worker.start()
+    return True
+
+def _explain_worker():
+    from .connection import DatabaseError, session # Not at import time: connection imports this module
+    while True:
+        entry, sql, params = _explain_queue.get()
+        try:
+            with session() as db:
+                entry['plan'] = db.explain(sql, params)
+        except DatabaseError as err:
+            print(f"Could not EXPLAIN slow query: {err}")
+        _write(entry)
+
+def _write(entry):
+    if not config.SLOW_QUERY_LOG_FILE:
+        return
+    with _lock:
+        try:
+            with open(config.SLOW_QUERY_LOG_FILE, 'a') as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as err:
+            print(f"Could not write slow query log: {err}")
+
+def slow_queries():
+    """The most recent slow queries, newest first."""
+    with _lock:
+        return list(reversed(_slow_queries))
@@ -0,0 +1,167 @@
+"""
+Read replicas for the API (MySQL): session() reads are spread round-robin over the replicas listed in
+DB_REPLICA_HOSTS, transaction() writes and the crawler always use the primary (DB_HOST).
+
+A background thread checks every replica each DB_REPLICA_CHECK_INTERVAL seconds: it must answer, and
+(unless DB_REPLICA_MAX_LAG is 0) its replication must be running and at most DB_REPLICA_MAX_LAG seconds
+behind. Replicas failing the check, or a connection attempt, are skipped until they pass again; with no
+usable replica the reads go to the primary.
+
+Each check also reads the replica's CatalogVersion row, so the response cache (which reads the version
+from the primary) only caches responses once every replica in use has applied that version.
+"""
+import itertools
+import threading
+import time
+
+# Newest syntax first: SHOW REPLICA STATUS is MySQL 8.0.22+, SHOW SLAVE STATUS older versions and MariaDB
+LAG_QUERIES = (("SHOW REPLICA STATUS", 'Seconds_Behind_Source'), ("SHOW SLAVE STATUS", 'Seconds_Behind_Master'))
+CATALOG_VERSION_SQL = "SELECT Version, UpdatedAt FROM CatalogVersion WHERE ID = 1"
+
+
+def parse_hosts(value, default_port):
+    """'db-r1:3307, db-r2' -> [('db-r1', 3307), ('db-r2', default_port)]."""
+    hosts = []
+    for item in value.split(','):
+        host, _, port = item.strip().partition(':')
+        if host:
+            hosts.append((host, int(port) if port else default_port))
+    return hosts
+
+
+class Replica:
+    def __init__(self, host, port, connect, pool):
+        self.host, self.port = host, port
+        self.name = f"{host}:{port}"
+        self.connect = connect # Opens an unpooled connection
+        self.pool = pool
+        self.monitor_conn = None # The checks' own connection, so a busy pool doesn't look like a failure
+        self.healthy = False # Until the first check passes
+        self.lag = None # Seconds behind the primary at the last check
+        self.catalog_version = None # Its CatalogVersion row at the last check
+        self.error = None # Why the replica is skipped
+        self.failures = 0
+
+
+class ReplicaSet:
+    """Round-robin choice among the healthy replicas, kept current by a monitor thread."""
+
+    def __init__(self, replicas, max_lag, check_interval, error_types):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.error_types = error_types # The backend's DatabaseError
+        self.turn = itertools.count()
+        self.fallbacks = 0 # Reads sent to the primary because no replica was usable
+        self.monitor = None
+        self.lock = threading.Lock()
+
+    def choose(self):
+        """The replica for the next read, None to use the primary. Starts the monitor on first use."""
+        if self.monitor is None:
+            self.start()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.fallbacks += 1
+            return None
+        return healthy[next(self.turn) % len(healthy)]
+
+    def mark_failed(self, replica, err):
+        """A read couldn't get a connection: skip the replica until the next check passes."""
+        if replica.healthy:
+            print(f"Read replica {replica.name} failed, reading from the primary: {err}")
+        replica.healthy, replica.error = False, str(err)
+        replica.failures += 1
+
+    def check(self, replica):
+        try:
+            if replica.monitor_conn is None:
+                replica.monitor_conn = replica.connect()
+            lag = self._lag(replica.monitor_conn)
+            catalog_version = self._catalog_version(replica.monitor_conn)
+            # The connection isn't pooled (the pool rolls back on release) and autocommit is off: end the
+            # transaction, or under REPEATABLE READ every later check would see this same CatalogVersion row
+            replica.monitor_conn.rollback()
+        except self.error_types as err:
+            self.mark_failed(replica, err)
+            if replica.monitor_conn is not None:
+                try:
+                    replica.monitor_conn.close()
+                except self.error_types:
+                    pass
+                replica.monitor_conn = None
+            return
+        replica.lag, replica.catalog_version = lag, catalog_version
+        if self.max_lag > 0 and lag is None:
+            replica.healthy, replica.error = False, "replication is not running"
+        elif self.max_lag > 0 and lag > self.max_lag:
+            replica.healthy, replica.error = False, f"{lag}s behind the primary"
+        else:
+            if not replica.healthy:
+                print(f"Read replica {replica.name} is in use" + (f" ({lag}s behind)." if lag is not None else "."))
+            replica.healthy, replica.error = True, None
+
+    def _lag(self, conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            if self.max_lag <= 0:
+                cursor.execute("SELECT 1 AS ok")
+                cursor.fetchall()
+                return None
+            for sql, column in LAG_QUERIES:
+                try:
+                    cursor.execute(sql)
+                except self.error_types:
+                    continue # Syntax the server doesn't know
+                rows = cursor.fetchall()
+                return rows[0].get(column) if rows else None # No rows: not a replica
+            return None
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _catalog_version(conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(CATALOG_VERSION_SQL)
+            rows = cursor.fetchall()
+            return rows[0] if rows else None
+        finally:
+            cursor.close()
+
+    def caught_up(self, row):
+        """
+        True if every replica reads may go to has applied CatalogVersion row `row` (the primary's), or a later
+        one. Compared on (UpdatedAt, Version) rather than Version alone, so after a database is restored or
+        recreated with a lower counter, replicas still holding the old catalog aren't taken as ahead of it.
+        """
+        if self.monitor is None:
+            self.start()
+        target = (row['UpdatedAt'], row['Version'])
+        return all(replica.catalog_version is not None
+                   and (replica.catalog_version['UpdatedAt'], replica.catalog_version['Version']) >= target
+                   for replica in self.replicas if replica.healthy) # None healthy: the reads go to the primary
+
+    def start(self):
+        with self.lock:
+            if self.monitor is None:
+                for replica in self.replicas:
+                    self.check(replica) # First check in the caller, so the first reads can use the replicas
+                self.monitor = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+                self.monitor.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_interval)
+            for replica in self.replicas:
+                self.check(replica)
+
+    def stats(self):
+        """Health, lag and pool usage per replica, for /api/health."""
+        return {
+            'fallbacks_to_primary': self.fallbacks,
+            'replicas': {replica.name: {'healthy': replica.healthy, 'lag_seconds': replica.lag, 'error': replica.error,
+                                        'catalog_version': replica.catalog_version and replica.catalog_version['Version'],
+                                        'failures': replica.failures, 'pool': replica.pool.stats()}
+                         for replica in self.replicas},
+        }
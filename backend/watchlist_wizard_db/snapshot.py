@@ -0,0 +1,311 @@
+"""
+Catalog snapshots: exports Movies and its genre, people and keyword relations to partitioned
+Parquet (or Arrow IPC) files, and bulk-loads a snapshot into a fresh database.
+
+    python -m backend.watchlist_wizard_db.snapshot export snapshots/2024-05-01 [--format arrow]
+    python -m backend.watchlist_wizard_db.snapshot load snapshots/2024-05-01
+
+Layout: one directory per table with part-NNNNN files plus manifest.json. Partition N of movies,
+movie_genres, movie_people and movie_keywords covers the same MovieID range, so each partition can be
+read on its own. Genre and role names are dictionary-encoded. Rows keep their database IDs, which lets
+the loader insert without any lookups.
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import time
+from contextlib import contextmanager
+from . import backends, migrations
+from .connection import DatabaseError, get_db_connection, Session, transaction
+from .writes import bump_catalog_version
+
+SNAPSHOT_VERSION = 1
+ROW_GROUP_SIZE = 10000 # Relation rows fetched and written at a time
+
+# table: (key column for keyset paging, SELECT list, source table), exported in ID order
+ENTITY_TABLES = {
+    'movies': ('MovieID', "MovieID, IMDbID, Title, Year, Runtime, Rating, PlotSummary, PosterURL, ReleaseDate, MPAARating", 'Movies'),
+    'people': ('PersonID', "PersonID, IMDbID, Name, BirthDate, Bio", 'People'),
+    'keywords': ('KeywordID', "KeywordID, Keyword", 'PlotKeywords'),
+}
+
+# Relation exports, one partition per movie partition (MovieID range)
+RELATION_SQL = {
+    'movie_genres': """
+        SELECT mg.MovieID, g.GenreName AS Genre
+        FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+        WHERE mg.MovieID BETWEEN %s AND %s ORDER BY mg.MovieID
+    """,
+    'movie_people': """
+        SELECT mp.MovieID, mp.PersonID, r.RoleName AS Role
+        FROM MoviePeople mp JOIN Roles r ON r.RoleID = mp.RoleID
+        WHERE mp.MovieID BETWEEN %s AND %s ORDER BY mp.MovieID
+    """,
+    'movie_keywords': """
+        SELECT MovieID, KeywordID FROM MovieKeywords
+        WHERE MovieID BETWEEN %s AND %s ORDER BY MovieID
+    """,
+}
+
+
+def _pyarrow():
+    """pyarrow is only needed for snapshots, so it is imported on first use."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Catalog snapshots need pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def _schemas(pa):
+    dictionary = pa.dictionary(pa.int16(), pa.string()) # Genres and roles are a few dozen distinct names
+    return {
+        'movies': pa.schema([
+            ('MovieID', pa.int32()), ('IMDbID', pa.string()), ('Title', pa.string()), ('Year', pa.int32()),
+            ('Runtime', pa.int32()), ('Rating', pa.float64()), ('PlotSummary', pa.string()),
+            ('PosterURL', pa.string()), ('ReleaseDate', pa.date32()), ('MPAARating', pa.string()),
+        ]),
+        'people': pa.schema([
+            ('PersonID', pa.int32()), ('IMDbID', pa.string()), ('Name', pa.string()),
+            ('BirthDate', pa.date32()), ('Bio', pa.string()),
+        ]),
+        'keywords': pa.schema([('KeywordID', pa.int32()), ('Keyword', pa.string())]),
+        'movie_genres': pa.schema([('MovieID', pa.int32()), ('Genre', dictionary)]),
+        'movie_people': pa.schema([('MovieID', pa.int32()), ('PersonID', pa.int32()), ('Role', dictionary)]),
+        'movie_keywords': pa.schema([('MovieID', pa.int32()), ('KeywordID', pa.int32())]),
+    }
+
+
+def _normalize(value):
+    """MySQL returns DECIMAL/DATE objects, SQLite returns floats and ISO strings, Arrow wants one type per column."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+def _normalize_date(value):
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return value
+
+
+class PartWriter:
+    """Writes one partition file, a row group at a time, in Parquet or Arrow IPC format."""
+
+    def __init__(self, pa, path, schema, file_format):
+        self.pa = pa
+        self.schema = schema
+        self.rows = 0
+        if file_format == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_file(path, schema)
+
+    def write(self, rows):
+        """rows is a list of tuples in schema column order."""
+        if not rows:
+            return
+        columns = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in rows]
+            if self.pa.types.is_date32(field.type):
+                values = [_normalize_date(value) for value in values]
+            else:
+                values = [_normalize(value) for value in values]
+            columns.append(self.pa.array(values, type=field.type))
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        self.writer.close()
+
+
+@contextmanager
+def _bulk_session(bulk_load=False):
+    """One connection for the whole export/load. bulk_load turns off FK and sync overhead until the end."""
+    conn = get_db_connection()
+    if not conn:
+        raise backends.DatabaseUnavailable("Failed to get database connection.")
+    backend = backends.get_backend()
+    db = Session(conn)
+    try:
+        if bulk_load:
+            backend.bulk_load(db.cursor(), True)
+        yield db
+    finally:
+        try:
+            conn.rollback() # Ends the export's read snapshot, a no-op after the loader's commits
+            if bulk_load:
+                backend.bulk_load(db.cursor(), False)
+        finally:
+            db.close()
+
+
+def export_catalog(directory, file_format='parquet', batch_size=20000):
+    """Writes a snapshot of the catalog to directory, batch_size movies (or people/keywords) per partition."""
+    pa = _pyarrow()
+    schemas = _schemas(pa)
+    extension = 'parquet' if file_format == 'parquet' else 'arrow'
+    manifest = {'snapshot_version': SNAPSHOT_VERSION, 'format': file_format,
+                'exported_at': datetime.datetime.now().isoformat(timespec='seconds'), 'tables': {}}
+    for table in list(ENTITY_TABLES) + list(RELATION_SQL):
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+        manifest['tables'][table] = {'files': [], 'rows': 0}
+
+    def new_part(table, number):
+        name = f"{table}/part-{number:05d}.{extension}"
+        manifest['tables'][table]['files'].append(name)
+        return PartWriter(pa, os.path.join(directory, name), schemas[table], file_format)
+
+    def finish(table, writer):
+        writer.close()
+        manifest['tables'][table]['rows'] += writer.rows
+
+    start = time.perf_counter()
+    with _bulk_session() as db:
+        backends.get_backend().begin_snapshot(db.cursor()) # All tables are read from one consistent snapshot
+        for table, (key, columns, source) in ENTITY_TABLES.items():
+            last_id, number = 0, 0
+            while True:
+                cursor = db.cursor()
+                cursor.execute(f"SELECT {columns} FROM {source} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+                               (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                writer = new_part(table, number)
+                writer.write(rows)
+                finish(table, writer)
+
+                if table == 'movies':
+                    # The relations of this MovieID range go to the matching partition number
+                    for relation, sql in RELATION_SQL.items():
+                        relation_writer = new_part(relation, number)
+                        cursor = db.cursor()
+                        cursor.execute(sql, (rows[0][0], rows[-1][0]))
+                        while True:
+                            chunk = cursor.fetchmany(ROW_GROUP_SIZE)
+                            if not chunk:
+                                break
+                            relation_writer.write(chunk)
+                        finish(relation, relation_writer)
+
+                last_id, number = rows[-1][0], number + 1
+                print(f"Exported {table} partition {number} (up to ID {last_id}).")
+
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    counts = ", ".join(f"{table}: {info['rows']}" for table, info in manifest['tables'].items())
+    print(f"Snapshot written to {directory} in {time.perf_counter() - start:.1f}s ({counts}).")
+    return manifest
+
+
+def _read_batches(pa, path, file_format):
+    """Yields the record batches of one partition file without reading the whole file at once."""
+    if file_format == 'parquet':
+        yield from pa.parquet.ParquetFile(path).iter_batches(batch_size=ROW_GROUP_SIZE)
+    else:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+
+def _name_ids(cursor, table, id_column, name_column, names, known):
+    """Maps genre/role names to IDs, inserting the ones the database doesn't have yet."""
+    missing = [name for name in names if name is not None and name not in known]
+    if missing:
+        cursor.executemany(f"INSERT IGNORE INTO {table} ({name_column}) VALUES (%s)", [(name,) for name in missing])
+        placeholders = ", ".join(["%s"] * len(missing))
+        cursor.execute(f"SELECT {id_column}, {name_column} FROM {table} WHERE {name_column} IN ({placeholders})", missing)
+        for row_id, name in cursor.fetchall():
+            known[name] = row_id
+    return known
+
+def _dictionary_rows(batch, column, ids):
+    """Rows of a batch with its dictionary-encoded column replaced by database IDs (decoded once per batch)."""
+    encoded = batch.column(batch.schema.get_field_index(column))
+    dictionary_ids = [ids.get(name) for name in encoded.dictionary.to_pylist()]
+    mapped = [None if index is None else dictionary_ids[index] for index in encoded.indices.to_pylist()]
+    other = [batch.column(i).to_pylist() for i, field in enumerate(batch.schema) if field.name != column]
+    return list(zip(*other, mapped))
+
+
+INSERT_SQL = {
+    'keywords': "INSERT INTO PlotKeywords (KeywordID, Keyword) VALUES (%s, %s)",
+    'people': "INSERT INTO People (PersonID, IMDbID, Name, BirthDate, Bio) VALUES (%s, %s, %s, %s, %s)",
+    'movies': """
+        INSERT INTO Movies (MovieID, IMDbID, Title, Year, Runtime, Rating, PlotSummary, PosterURL, ReleaseDate, MPAARating)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    'movie_genres': "INSERT INTO MovieGenres (MovieID, GenreID) VALUES (%s, %s)",
+    'movie_people': "INSERT INTO MoviePeople (MovieID, PersonID, RoleID) VALUES (%s, %s, %s)",
+    'movie_keywords': "INSERT INTO MovieKeywords (MovieID, KeywordID) VALUES (%s, %s)",
+}
+
+def load_catalog(directory):
+    """
+    Bulk-loads a snapshot into an empty database. The secondary indexes are dropped (migration 2 reverted)
+    during the load and rebuilt once at the end, and each partition file is inserted with executemany in
+    one transaction, which is much faster than replaying the crawler's per-movie inserts.
+    """
+    pa = _pyarrow()
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('snapshot_version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('snapshot_version')}.")
+    file_format = manifest['format']
+
+    migrations.migrate()
+    with _bulk_session() as db:
+        if db.fetch_one("SELECT COUNT(*) AS n FROM Movies")['n']:
+            raise ValueError("The database already has movies, snapshots can only be loaded into an empty database.")
+    migrations.migrate(1) # Drop the hot query indexes while the tables are empty, they are rebuilt after the load
+
+    start = time.perf_counter()
+    genre_ids, role_ids = {}, {}
+    with _bulk_session(bulk_load=True) as db:
+        cursor = db.cursor()
+        # Entities before the relations that reference them
+        for table in ['keywords', 'people', 'movies', 'movie_genres', 'movie_people', 'movie_keywords']:
+            for name in manifest['tables'][table]['files']:
+                for batch in _read_batches(pa, os.path.join(directory, name), file_format):
+                    if table == 'movie_genres':
+                        _name_ids(cursor, 'Genres', 'GenreID', 'GenreName', batch.column('Genre').dictionary.to_pylist(), genre_ids)
+                        rows = _dictionary_rows(batch, 'Genre', genre_ids)
+                    elif table == 'movie_people':
+                        _name_ids(cursor, 'Roles', 'RoleID', 'RoleName', batch.column('Role').dictionary.to_pylist(), role_ids)
+                        rows = _dictionary_rows(batch, 'Role', role_ids)
+                    else:
+                        rows = list(zip(*[column.to_pylist() for column in batch.columns]))
+                    cursor.executemany(INSERT_SQL[table], rows)
+                db.conn.commit()
+            print(f"Loaded {table} ({manifest['tables'][table]['rows']} rows).")
+
+    migrations.migrate() # Builds the indexes in one pass over the loaded tables
+    with transaction() as db:
+        bump_catalog_version(db.cursor())
+    print(f"Snapshot loaded from {directory} in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    # Run from the project root: python -m backend.watchlist_wizard_db.snapshot export|load DIRECTORY
+    parser = argparse.ArgumentParser(description="Export or bulk-load a Watchlist Wizard catalog snapshot.")
+    parser.add_argument('command', choices=['export', 'load'])
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help="Export file format")
+    parser.add_argument('--batch-size', type=int, default=20000, help="Movies per partition")
+    args = parser.parse_args()
+    try:
+        if args.command == 'export':
+            export_catalog(args.directory, args.format, args.batch_size)
+        else:
+            load_catalog(args.directory)
+    except DatabaseError + (ValueError, RuntimeError) as err:
+        print(f"Snapshot {args.command} failed: {err}")
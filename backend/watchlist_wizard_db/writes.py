@@ -0,0 +1,210 @@
+from .connection import DatabaseError, transaction
+from .projection import refresh_movie_search
+
+# Pending person-page credits of the batch ({column} is one of the batch's IMDbIDs) whose movie and person
+# have both arrived. Only credits touching the batch can have become linkable, so the cost follows the batch
+# size, not the backlog of unresolved credits. A person with several (IMDbID, Name) rows is linked once.
+PENDING_CREDITS_SQL = """
+    FROM PendingMoviePeople pe
+    JOIN Movies m ON m.IMDbID = pe.MovieIMDbID
+    JOIN Roles r ON r.RoleName = pe.RoleName
+    WHERE pe.{column} IN ({placeholders})
+      AND EXISTS (SELECT 1 FROM People p WHERE p.IMDbID = pe.PersonIMDbID)
+"""
+
+# Movies that link_pending_credits() is about to give new credits, their MovieSearch rows need a refresh
+PENDING_CREDIT_MOVIES_SQL = "SELECT DISTINCT m.MovieID" + PENDING_CREDITS_SQL
+
+# Pairs already linked by the movie page's own credits (which know the real role) are not duplicated
+LINK_PENDING_CREDITS_SQL = """
+    INSERT IGNORE INTO MoviePeople (MovieID, PersonID, RoleID)
+    SELECT m.MovieID, (SELECT MIN(p.PersonID) FROM People p WHERE p.IMDbID = pe.PersonIMDbID), r.RoleID
+""" + PENDING_CREDITS_SQL + """
+      AND NOT EXISTS (
+          SELECT 1 FROM MoviePeople mp JOIN People p ON p.PersonID = mp.PersonID
+          WHERE mp.MovieID = m.MovieID AND p.IMDbID = pe.PersonIMDbID
+      )
+"""
+
+DELETE_LINKED_CREDITS_SQL = """
+    DELETE FROM PendingMoviePeople
+    WHERE {column} IN ({placeholders})
+      AND EXISTS (SELECT 1 FROM Movies m WHERE m.IMDbID = PendingMoviePeople.MovieIMDbID)
+      AND EXISTS (SELECT 1 FROM People p WHERE p.IMDbID = PendingMoviePeople.PersonIMDbID)
+"""
+
+LINK_CHUNK = 1000 # IMDbIDs per statement
+
+
+def link_pending_credits(cursor, movie_imdb_ids=(), person_imdb_ids=(), written_movie_ids=()):
+    """
+    Moves the pending credits of the movies and people just written (whose other side exists) into
+    MoviePeople, returns the number linked. Pass every person the batch created, the credited cast of
+    its movies included. written_movie_ids: the MovieIDs the transaction wrote, their MovieSearch rows
+    are refreshed together with those of the movies that got credits (each refresh locks CatalogVersion).
+    """
+    linked = 0
+    movie_ids = set(written_movie_ids)
+    for column, imdb_ids in (('MovieIMDbID', movie_imdb_ids), ('PersonIMDbID', person_imdb_ids)):
+        imdb_ids = sorted(set(filter(None, imdb_ids)))
+        for i in range(0, len(imdb_ids), LINK_CHUNK):
+            chunk = tuple(imdb_ids[i:i + LINK_CHUNK])
+            sql = {'column': column, 'placeholders': ", ".join(["%s"] * len(chunk))}
+            cursor.execute(PENDING_CREDIT_MOVIES_SQL.format(**sql), chunk)
+            chunk_movie_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(LINK_PENDING_CREDITS_SQL.format(**sql), chunk)
+            if cursor.rowcount > 0:
+                linked += cursor.rowcount
+                movie_ids.update(chunk_movie_ids)
+            cursor.execute(DELETE_LINKED_CREDITS_SQL.format(**sql), chunk)
+    if movie_ids:
+        refresh_movie_search(cursor, movie_ids)
+    return linked
+
+def bump_catalog_version(cursor):
+    """Marks the catalog as changed, call it in the same transaction as the write so readers see both together."""
+    cursor.execute("UPDATE CatalogVersion SET Version = Version + 1, UpdatedAt = CURRENT_TIMESTAMP WHERE ID = 1")
+
+def insert_movie_data(movie_data):
+    """Inserts or updates a single movie (the crawler batches through imdb_crawler/db_writer.py instead)."""
+    try:
+        with transaction() as db:
+            cursor = db.cursor()
+
+            # Check if the movie already exists
+            cursor.execute("SELECT MovieID FROM Movies WHERE IMDbID = %s", (movie_data.get('imdb_id'),))
+            existing_movie = cursor.fetchone()
+
+            if existing_movie:
+                movie_id = existing_movie[0]
+                print(f"Movie '{movie_data.get('title', 'N/A')}' already exists (ID: {movie_id}). Updating...")
+
+                # UPDATE the existing movie
+                cursor.execute('''
+                    UPDATE Movies
+                    SET Title = %s, Year = %s, Runtime = %s, Rating = %s,
+                        PlotSummary = %s, PosterURL = %s, ReleaseDate = %s,
+                        MPAARating = %s
+                    WHERE MovieID = %s
+                ''', (movie_data.get('title'), movie_data.get('year'), movie_data.get('runtime'),
+                      movie_data.get('rating'), movie_data.get('plot_summary'),
+                      movie_data.get('poster_url'), movie_data.get('release_date'),
+                      movie_data.get('age_restriction'), movie_id))
+            else:
+                # INSERT a new movie
+                cursor.execute('''
+                    INSERT INTO Movies (Title, Year, Runtime, Rating, PlotSummary, PosterURL, IMDbID, ReleaseDate, MPAARating)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''', (movie_data.get('title'), movie_data.get('year'), movie_data.get('runtime'), movie_data.get('rating'),
+                      movie_data.get('plot_summary'), movie_data.get('poster_url'), movie_data.get('imdb_id'),
+                      movie_data.get('release_date'), movie_data.get('age_restriction')))
+                movie_id = cursor.lastrowid
+                if movie_id == 0:
+                     cursor.execute("SELECT MovieID FROM Movies WHERE IMDbID = %s", (movie_data.get('imdb_id'),))
+                     movie_id = cursor.fetchone()[0]
+                print(f"Inserted new movie: {movie_data.get('title', 'N/A')} (ID: {movie_id})")
+
+            # Insert Genres
+            for genre_name in movie_data.get('genres', []):
+                if not genre_name: continue
+                cursor.execute("INSERT IGNORE INTO Genres (GenreName) VALUES (%s)", (genre_name,))
+                cursor.execute("SELECT GenreID FROM Genres WHERE GenreName = %s", (genre_name,))
+                result = cursor.fetchone()
+                if result:
+                    genre_id = result[0]
+                    cursor.execute("INSERT IGNORE INTO MovieGenres (MovieID, GenreID) VALUES (%s, %s)", (movie_id, genre_id))
+
+            # Insert People
+            seen_people = set()  # Prevent duplicate person entries for this movie
+            for person in movie_data.get('people', []):
+                person_imdb_id = person.get('person_id')
+                person_name = person.get('name')
+                person_role = person.get('role')
+                if not person_imdb_id or not person_name or not person_role: continue
+
+                if (person_imdb_id, person_role) not in seen_people:
+                    cursor.execute("INSERT IGNORE INTO People (IMDbID, Name) VALUES (%s, %s)", (person_imdb_id, person_name))
+
+                    # Get PersonID
+                    cursor.execute("SELECT PersonID FROM People WHERE IMDbID = %s AND Name = %s", (person_imdb_id, person_name))
+                    person_id_result = cursor.fetchone()
+                    if not person_id_result:
+                        print(f"Warning: Could not retrieve PersonID for {person_name}")
+                        continue
+
+                    person_id = person_id_result[0]
+
+                    # Get RoleID
+                    cursor.execute("SELECT RoleID FROM Roles WHERE RoleName = %s", (person_role,))
+                    role_result = cursor.fetchone()
+                    if role_result:
+                        role_id = role_result[0]
+                    else:
+                        cursor.execute("INSERT IGNORE INTO Roles (RoleName) VALUES (%s)", (person_role,))
+                        cursor.execute("SELECT RoleID FROM Roles WHERE RoleName = %s", (person_role,))
+                        role_result = cursor.fetchone()
+                        if not role_result:
+                             print(f"Warning: Could not retrieve RoleID for {person_role}")
+                             continue
+                        role_id = role_result[0]
+
+                    cursor.execute("INSERT IGNORE INTO MoviePeople (MovieID, PersonID, RoleID) VALUES (%s, %s, %s)", (movie_id, person_id, role_id))
+                    seen_people.add((person_imdb_id, person_role))
+
+            # Insert Plot Keywords
+            for keyword_text in movie_data.get('plot_keywords', []):
+                if not keyword_text: continue # Skip empty keywords
+                cursor.execute("INSERT IGNORE INTO PlotKeywords (Keyword) VALUES (%s)", (keyword_text,))
+                cursor.execute("SELECT KeywordID FROM PlotKeywords WHERE Keyword = %s", (keyword_text,))
+                result = cursor.fetchone()
+                if result:
+                    keyword_id = result[0]
+                    cursor.execute("INSERT IGNORE INTO MovieKeywords (MovieID, KeywordID) VALUES (%s, %s)", (movie_id, keyword_id))
+
+            # Link credits from person pages that were waiting for this movie or its cast, and refresh its listing row
+            link_pending_credits(cursor, [movie_data.get('imdb_id')],
+                                 [person.get('person_id') for person in movie_data.get('people', [])], [movie_id])
+            bump_catalog_version(cursor)
+
+    except DatabaseError as err:
+        print(f"Database error (movie insertion): {err}")
+
+def insert_person_data(person_data):
+    """Inserts person data and queues their filmography credits."""
+    try:
+        with transaction() as db:
+            cursor = db.cursor()
+
+            person_imdb_id = person_data.get('imdb_id')
+            person_name = person_data.get('name')
+            if not person_imdb_id or not person_name:
+                 print(f"Skipping person insert due to missing ID or Name: {person_data}")
+                 return
+
+            # Insert person using INSERT IGNORE (using IMDbID and Name for uniqueness)
+            cursor.execute("""
+                INSERT IGNORE INTO People (IMDbID, Name, BirthDate, Bio)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE BirthDate=VALUES(BirthDate), Bio=VALUES(Bio)
+            """, (person_imdb_id, person_name, person_data.get('birth_date'), person_data.get('bio')))
+            print(f"Inserted/Updated person: {person_name}")
+
+            # Get the PersonID
+            cursor.execute("SELECT PersonID FROM People WHERE IMDbID = %s AND Name = %s", (person_imdb_id, person_name))
+            result = cursor.fetchone()
+            if result:
+                person_id = result[0]
+            else:
+                print(f"Error: Could not retrieve PersonID for {person_name}")
+                return
+
+            # Queue filmography credits and link the ones whose movies are already in the DB
+            filmography = [(person_imdb_id, movie_imdb_id) for movie_imdb_id in person_data.get('filmography', []) if movie_imdb_id]
+            if filmography:
+                cursor.executemany("INSERT IGNORE INTO PendingMoviePeople (PersonIMDbID, MovieIMDbID) VALUES (%s, %s)", filmography)
+            linked = link_pending_credits(cursor, person_imdb_ids=[person_imdb_id])
+            bump_catalog_version(cursor)
+            print(f"  Filmography for {person_name} (PersonID: {person_id}): {len(filmography)} titles, {linked} credits linked")
+
+    except DatabaseError as err:
+        print(f"Database error (person insertion): {err}")
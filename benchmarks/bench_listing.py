@@ -0,0 +1,97 @@
+"""
+Compares get_all_movies' semi-join listing query with the old 8-way LEFT JOIN + DISTINCT query, per filter
+combination. Run from the repository root against a scratch database filled by benchmarks.synthetic:
+
+    python -m benchmarks.synthetic --movies 100000
+    python -m benchmarks.bench_listing --runs 5
+"""
+import argparse
+import statistics
+import time
+
+from backend import watchlist_wizard_db
+from backend.watchlist_wizard_db import queries
+
+
+def legacy_listing_query(limit=250, offset=0, search_term=None, genre_filter=None, keyword_filter=None, actor_filter=None):
+    """get_all_movies' query before the semi-join rewrite, kept here as the benchmark baseline."""
+    sql = """
+        SELECT DISTINCT m.MovieID, m.Title, m.Year, m.Rating, m.PosterURL, m.IMDbID
+        FROM Movies m
+        LEFT JOIN MovieGenres mg ON m.MovieID = mg.MovieID
+        LEFT JOIN Genres g ON mg.GenreID = g.GenreID
+        LEFT JOIN MovieKeywords mk ON m.MovieID = mk.MovieID
+        LEFT JOIN PlotKeywords pk ON mk.KeywordID = pk.KeywordID
+        LEFT JOIN MoviePeople mp ON m.MovieID = mp.MovieID
+        LEFT JOIN People p ON mp.PersonID = p.PersonID
+        LEFT JOIN Roles r ON mp.RoleID = r.RoleID
+    """
+    where_clauses = []
+    params = []
+    if search_term:
+        where_clauses.append("(m.Title LIKE %s OR m.PlotSummary LIKE %s)")
+        params.extend([f"%{search_term}%", f"%{search_term}%"])
+    if genre_filter:
+        where_clauses.append("g.GenreName = %s")
+        params.append(genre_filter)
+    if keyword_filter:
+        where_clauses.append("pk.Keyword LIKE %s")
+        params.append(f"%{keyword_filter}%")
+    if actor_filter:
+        where_clauses.append("(p.Name LIKE %s AND r.RoleName = 'Actor')")
+        params.append(f"%{actor_filter}%")
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    sql += " ORDER BY m.Rating DESC, m.Year DESC LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    return sql, params
+
+
+CASES = [
+    ("no filter", {}),
+    ("genre", {'genre_filter': 'Drama'}),
+    ("keyword", {'keyword_filter': 'heist'}),
+    ("keyword (rare)", {'keyword_filter': 'heist-love'}),
+    ("actor", {'actor_filter': 'Garcia'}),
+    ("actor (full name)", {'actor_filter': 'James Garcia'}),
+    ("genre + actor", {'genre_filter': 'Comedy', 'actor_filter': 'Smith'}),
+    ("genre + keyword + actor", {'genre_filter': 'Drama', 'keyword_filter': 'love', 'actor_filter': 'Lee'}),
+    ("search + genre", {'search_term': 'robot', 'genre_filter': 'Sci-Fi'}),
+    ("page 20", {'offset': 20 * 250}),
+]
+
+
+def time_query(db, sql, params, runs):
+    """Median wall time in ms and the rows of the last run."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = db.fetch_all(sql, params)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per query (after one warm-up run)")
+    args = parser.parse_args()
+
+    with watchlist_wizard_db.session() as db:
+        movies = db.fetch_one("SELECT COUNT(*) AS n FROM Movies")['n']
+        print(f"{watchlist_wizard_db.get_backend().name}, {movies} movies, median of {args.runs} runs")
+        print(f"{'Case':<26}{'LEFT JOIN ms':>14}{'semi-join ms':>14}{'speedup':>10}  same page")
+        for label, filters in CASES:
+            old_sql, old_params = legacy_listing_query(**filters)
+            new_sql, new_params = queries.movie_listing_query(**filters)
+            db.fetch_all(old_sql, old_params)
+            db.fetch_all(new_sql, new_params)
+            old_ms, old_rows = time_query(db, old_sql, old_params, args.runs)
+            new_ms, new_rows = time_query(db, new_sql, new_params, args.runs)
+            # Rows tied on (Rating, Year) may come back in either order, so compare the sort keys.
+            # The search case can also differ on SQLite, where search matches FTS prefixes instead of LIKE substrings.
+            same = [(r['Rating'], r['Year']) for r in old_rows] == [(r['Rating'], r['Year']) for r in new_rows]
+            print(f"{label:<26}{old_ms:>14.1f}{new_ms:>14.1f}{old_ms / max(new_ms, 0.001):>9.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
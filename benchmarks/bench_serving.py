@@ -0,0 +1,160 @@
+"""
+Load test of the API server: requests/sec and latency percentiles of the Flask (WSGI) app and the ASGI
+app (backend/asgi.py) at increasing client concurrency, on the same database and request mix.
+Run from the repository root; the DB_* / SQLITE_PATH settings of the environment are used by both servers:
+
+    python -m benchmarks.bench_serving --concurrency 16 64 256 --duration 10
+
+Each server is started as a subprocess with the response cache off (--cache keeps it on), so every request
+reaches the database. --url benchmarks an already running server instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+SERVERS = {
+    # The current deployment mode: Flask's threaded server, one thread per connection
+    'wsgi': lambda port, workers: [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"],
+    'asgi': lambda port, workers: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                                   '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+}
+
+
+def request_mix(base_url, rng):
+    """Paths in the proportions a browsing client sends them: listing pages, filtered pages, details."""
+    with urllib.request.urlopen(f"{base_url}/api/movies?limit=250") as response:
+        ids = [movie['IMDbID'] for movie in json.load(response)]
+    with urllib.request.urlopen(f"{base_url}/api/genres") as response:
+        genres = json.load(response) or ['Drama']
+    paths = []
+    for _ in range(1000):
+        kind = rng.random()
+        if kind < 0.3:
+            paths.append("/api/movies?cursor=&limit=60")
+        elif kind < 0.5:
+            paths.append(f"/api/movies?cursor=&limit=60&genre={rng.choice(genres)}")
+        elif kind < 0.9:
+            paths.append(f"/api/movies/{rng.choice(ids)}")
+        else:
+            paths.append("/api/movies/batch?ids=" + ",".join(rng.sample(ids, min(20, len(ids)))))
+    return paths
+
+
+async def fetch(reader, writer, host, path):
+    """One keep-alive HTTP/1.1 GET, returns (status, whether the server keeps the connection, body)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: identity\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length, keep_alive = 0, True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value == 'close':
+            keep_alive = False
+    body = await reader.readexactly(length)
+    return status, keep_alive, body
+
+
+async def _client(host, port, paths, deadline, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            status, keep_alive, _ = await fetch(reader, writer, host, path)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as err:
+            errors[type(err).__name__] = errors.get(type(err).__name__, 0) + 1
+            keep_alive = False
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, paths, concurrency, duration):
+    latencies, errors = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, paths, start + duration, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def start_server(mode, port, workers, cache):
+    env = dict(os.environ, CACHE_WARMUP_QUERIES='0', RESPONSE_CACHE_ENABLED='1' if cache else '0')
+    process = subprocess.Popen(SERVERS[mode](port, workers), cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"The {mode} server exited with code {process.returncode}")
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError(f"The {mode} server didn't start within 60s")
+
+
+def benchmark(label, host, port, concurrency_levels, duration):
+    paths = request_mix(f"http://{host}:{port}", random.Random(42))
+    for concurrency in concurrency_levels:
+        asyncio.run(run_load(host, port, paths, concurrency, min(duration, 2))) # Warm-up
+        latencies, errors, elapsed = asyncio.run(run_load(host, port, paths, concurrency, duration))
+        print(f"{label:<6}{concurrency:>8}{len(latencies) / elapsed:>10.0f}{statistics.median(latencies) * 1000 if latencies else float('nan'):>10.1f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.1f}  {errors or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256], help="Concurrent client connections")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument('--workers', type=int, default=1, help="ASGI worker processes (the WSGI server is one process)")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--cache', action='store_true', help="Keep the response cache on")
+    parser.add_argument('--url', help="Benchmark a running server (http://host:port) instead of starting them")
+    args = parser.parse_args()
+
+    print(f"{'Server':<6}{'Clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  errors")
+    if args.url:
+        host, _, port = args.url.split('//')[-1].partition(':')
+        benchmark('url', host, int(port or 80), args.concurrency, args.duration)
+        return
+    for mode in args.servers:
+        process = start_server(mode, args.port, args.workers, args.cache)
+        try:
+            benchmark(mode, '127.0.0.1', args.port, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
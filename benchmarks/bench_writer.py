@@ -0,0 +1,82 @@
+"""
+Compares crawler DB throughput of the per-row insert_movie_data path with the batched WriteBehindWriter.
+
+Run from the repository root against a local scratch MySQL database (DB_* settings come from .env):
+
+    python -m benchmarks.bench_writer --movies 500 --flush-size 100
+"""
+import argparse
+import random
+import time
+
+from backend import watchlist_wizard_db
+from imdb_crawler import db_writer
+
+GENRES = ["Drama", "Crime", "Action", "Comedy", "Thriller", "Adventure", "Romance", "Sci-Fi", "Mystery", "War"]
+ROLES = ["Actor", "Director", "Writer"]
+WORDS = ("love war family revenge escape prison friendship murder journey city dream secret power "
+         "money truth memory island ship robot space king crime justice music school doctor").split()
+
+
+def make_movie(imdb_id, rng, person_pool):
+    """Builds a parsed-movie dict shaped like imdb_parser.parse_movie_page output."""
+    people = []
+    for person_id in rng.sample(person_pool, 8):
+        people.append({'person_id': person_id, 'name': f"Person {person_id}", 'role': rng.choice(ROLES)})
+    return {
+        'imdb_id': imdb_id,
+        'title': f"Synthetic Movie {imdb_id}",
+        'year': rng.randint(1920, 2024),
+        'runtime': rng.randint(80, 200),
+        'rating': round(rng.uniform(5.0, 9.5), 1),
+        'plot_summary': " ".join(rng.choices(WORDS, k=30)),
+        'poster_url': None,
+        'release_date': None,
+        'age_restriction': rng.choice(['G', 'PG', 'PG-13', 'R']),
+        'genres': rng.sample(GENRES, 3),
+        'people': people,
+        'plot_keywords': rng.sample(WORDS, 10),
+    }
+
+
+def run_per_row(movies):
+    start = time.perf_counter()
+    for movie in movies:
+        watchlist_wizard_db.insert_movie_data(movie)
+    return time.perf_counter() - start
+
+
+def run_batched(movies, flush_size):
+    start = time.perf_counter()
+    with db_writer.WriteBehindWriter(flush_size=flush_size, flush_interval=float('inf')) as writer:
+        for movie in movies:
+            writer.add_movie(movie)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=500, help="Movies written by each strategy")
+    parser.add_argument('--flush-size', type=int, default=100, help="WriteBehindWriter batch size")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    watchlist_wizard_db.create_database()
+    person_pool = [f"nm9{i:07d}" for i in range(args.movies * 2)]
+    run_tag = int(time.time()) % 100000 # Fresh IMDb IDs per run so both strategies do real inserts
+    per_row_movies = [make_movie(f"tt8{run_tag:05d}{i:05d}", rng, person_pool) for i in range(args.movies)]
+    batched_movies = [make_movie(f"tt9{run_tag:05d}{i:05d}", rng, person_pool) for i in range(args.movies)]
+
+    per_row = run_per_row(per_row_movies)
+    batched = run_batched(batched_movies, args.flush_size)
+
+    print("-" * 20)
+    print(f"Per-row insert_movie_data: {args.movies / per_row:8.1f} movies/s ({per_row:.2f}s)")
+    print(f"WriteBehindWriter (batch {args.flush_size}): {args.movies / batched:8.1f} movies/s ({batched:.2f}s)")
+    print(f"Speedup: {per_row / batched:.1f}x")
+    print("-" * 20)
+
+
+if __name__ == "__main__":
+    main()
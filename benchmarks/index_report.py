@@ -0,0 +1,112 @@
+"""
+Before/after report for an index migration: EXPLAIN plans and latency of the API's hot queries with
+the migration reverted and re-applied. Run from the repository root against a populated scratch database:
+
+    python -m benchmarks.index_report --migration 2 --runs 20 --output index_report.md
+"""
+import argparse
+import statistics
+import time
+
+from backend import watchlist_wizard_db
+from backend.watchlist_wizard_db import queries
+
+
+def sample_values():
+    """Picks realistic filter values from the data so every query returns rows."""
+    with watchlist_wizard_db.session() as db:
+        genre = db.fetch_one("""
+            SELECT g.GenreName, COUNT(*) AS n FROM MovieGenres mg JOIN Genres g ON g.GenreID = mg.GenreID
+            GROUP BY g.GenreName ORDER BY n DESC LIMIT 1
+        """)
+        keyword = db.fetch_one("SELECT Keyword FROM PlotKeywords ORDER BY KeywordID LIMIT 1")
+        actor = db.fetch_one("""
+            SELECT p.Name FROM People p JOIN MoviePeople mp ON mp.PersonID = p.PersonID
+            JOIN Roles r ON r.RoleID = mp.RoleID WHERE r.RoleName = 'Actor' LIMIT 1
+        """)
+        movie = db.fetch_one("SELECT MovieID, IMDbID FROM Movies ORDER BY Rating DESC LIMIT 1")
+    return {
+        'genre': genre['GenreName'] if genre else 'Drama',
+        'keyword': keyword['Keyword'] if keyword else 'love',
+        'actor': actor['Name'] if actor else 'a',
+        'imdb_id': movie['IMDbID'] if movie else 'tt0000000',
+    }
+
+
+def hot_queries(values):
+    """(label, sql, params) for each access pattern the API runs."""
+    listing = [
+        ("listing (no filter)", {}),
+        ("listing genre", {'genre_filter': values['genre']}),
+        ("listing keyword", {'keyword_filter': values['keyword']}),
+        ("listing actor", {'actor_filter': values['actor']}),
+    ]
+    result = [(label, *queries.movie_listing_query(limit=250, **filters)) for label, filters in listing]
+    result += [
+        ("movie details", queries.movie_details_query(1)[0], [values['imdb_id']]),
+        ("recommendations", queries.TOP_MOVIES_BY_GENRE_SQL, [values['genre'], 20]),
+    ]
+    return result
+
+
+def measure(queries_to_run, runs):
+    """Returns {label: (plan lines, median ms, p95 ms)}."""
+    backend = watchlist_wizard_db.get_backend()
+    results = {}
+    with watchlist_wizard_db.session() as db:
+        for label, sql, params in queries_to_run:
+            plan = backend.explain(db.cursor(), sql, params)
+            db.fetch_all(sql, params) # Warm up caches so both sides are measured hot
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                db.fetch_all(sql, params)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            results[label] = (plan, statistics.median(timings), p95)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--migration', type=int, default=2, help="Index migration to compare")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', default=None, help="Write the markdown report here instead of stdout")
+    args = parser.parse_args()
+
+    original = watchlist_wizard_db.current_version()
+    if original < args.migration:
+        watchlist_wizard_db.migrate(args.migration)
+    values = sample_values()
+    queries_to_run = hot_queries(values)
+
+    watchlist_wizard_db.migrate(args.migration - 1)
+    before = measure(queries_to_run, args.runs)
+    watchlist_wizard_db.migrate(args.migration)
+    after = measure(queries_to_run, args.runs)
+    watchlist_wizard_db.migrate(max(original, args.migration))
+
+    migration = next(m for m in watchlist_wizard_db.migrations.MIGRATIONS if m.version == args.migration)
+    lines = [f"# Migration {migration.version}: {migration.description}", "",
+             f"Backend: {watchlist_wizard_db.get_backend().name}, {args.runs} runs per query, filter values {values}", "",
+             "| Query | Before median ms | After median ms | Before p95 ms | After p95 ms |",
+             "|---|---|---|---|---|"]
+    for label, _, _ in queries_to_run:
+        plan_before, median_before, p95_before = before[label]
+        plan_after, median_after, p95_after = after[label]
+        lines.append(f"| {label} | {median_before:.2f} | {median_after:.2f} | {p95_before:.2f} | {p95_after:.2f} |")
+    for label, _, _ in queries_to_run:
+        lines += ["", f"## {label}", "", "Before:", "```", *before[label][0], "```", "After:", "```", *after[label][0], "```"]
+
+    report = "\n".join(lines) + "\n"
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+        print(f"Report written to {args.output}")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
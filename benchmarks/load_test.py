@@ -0,0 +1,248 @@
+"""
+Load test of the API with the requests the frontend sends (frontend/app/page.tsx and movies/[imdbId]):
+virtual users open the page (genres + first listing page), browse with "Load more", filter by genre,
+search (sometimes sending a prefix first, as the debounce fires mid-word), filter by keyword or actor, open
+a movie's details and its recommendations. Reports throughput and latency percentiles per request kind.
+
+Run from the repository root against a server on a catalog from benchmarks.synthetic:
+
+    python -m benchmarks.synthetic --movies 100000
+    python -m benchmarks.load_test --users 32 --duration 30 --save-baseline benchmarks/baselines/100k.json
+    python -m benchmarks.load_test --users 32 --duration 30 --baseline benchmarks/baselines/100k.json
+
+--baseline exits with status 1 if a request kind's p99 latency or the total throughput is more than
+--tolerance worse than the saved run, or more than 1% of its requests fail. --start wsgi|asgi starts the server itself (see bench_serving).
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import os
+import random
+import statistics
+import time
+from urllib.parse import quote, urlencode
+
+from benchmarks.bench_serving import fetch, percentile, start_server
+from benchmarks.synthetic import GENRES, LAST_NAMES, FIRST_NAMES, WORDS, zipf_weights
+
+PAGE_SIZE = 60 # frontend/app/page.tsx
+MIN_P99_SAMPLES = 100 # Fewer requests of a kind and --baseline compares its p90 instead
+
+# Share of user sessions per scenario
+SCENARIOS = {'browse': 0.40, 'genre': 0.20, 'search': 0.15, 'keyword': 0.10, 'actor': 0.10, 'genre + actor': 0.05}
+
+
+class LoadDone(Exception):
+    """The test duration is over."""
+
+
+class Client:
+    """One virtual user's keep-alive connection, recording each request's latency under its kind."""
+
+    def __init__(self, host, port, deadline, latencies, errors):
+        self.host, self.port, self.deadline = host, port, deadline
+        self.latencies, self.errors = latencies, errors
+        self.reader = self.writer = None
+
+    async def get(self, kind, path, params=None):
+        """The JSON body of a 200 response, None otherwise."""
+        if time.perf_counter() >= self.deadline:
+            raise LoadDone()
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        start = time.perf_counter()
+        keep_alive, result = False, None
+        try:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            status, keep_alive, body = await fetch(self.reader, self.writer, self.host, path)
+            self.latencies[kind].append(time.perf_counter() - start)
+            if status == 200:
+                result = json.loads(body)
+            else:
+                self.errors[kind][str(status)] += 1
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as err:
+            self.errors[kind][type(err).__name__] += 1
+        if not keep_alive:
+            self.close()
+        return result
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def pick_genre(rng, genres):
+    """Popular genres are picked more often (synthetic catalogs list GENRES most common first)."""
+    ranked = [genre for genre in GENRES if genre in genres] or genres
+    return rng.choices(ranked, cum_weights=zipf_weights(len(ranked), 1.0))[0]
+
+
+def listing_params(rng, scenario, genres):
+    """Filters of one frontend listing request, as fetchMovies() builds them."""
+    params = {'limit': PAGE_SIZE, 'cursor': ''}
+    if scenario in ('genre', 'genre + actor'):
+        params['genre'] = pick_genre(rng, genres)
+    if scenario == 'search':
+        params['search'] = " ".join(rng.sample(WORDS, rng.choice([1, 1, 1, 2])))
+        params['sort'] = 'relevance'
+    if scenario == 'keyword':
+        params['keyword'] = rng.choice(WORDS)
+    if scenario in ('actor', 'genre + actor'):
+        last_name = rng.choice(LAST_NAMES)
+        params['actor'] = last_name if rng.random() < 0.7 else f"{rng.choice(FIRST_NAMES)} {last_name}"
+    return params
+
+
+async def user_session(client, rng):
+    """One visit to the page, repeated by each virtual user until the deadline."""
+    genres = await client.get('genres', "/api/genres") or GENRES
+    await client.get('listing', "/api/movies", {'limit': PAGE_SIZE, 'cursor': ''})
+    scenario = rng.choices(list(SCENARIOS), weights=list(SCENARIOS.values()))[0]
+    params = listing_params(rng, scenario, genres)
+    kind = 'listing' if scenario == 'browse' else scenario
+    if scenario == 'search' and rng.random() < 0.3:
+        # The user paused mid-word, so the debounced search also fired for a prefix
+        await client.get(kind, "/api/movies", {**params, 'search': params['search'][:rng.randint(2, 4)]})
+    page = await client.get(kind, "/api/movies", params)
+
+    movies = list(page['movies']) if page else []
+    for _ in range(rng.choice([0, 0, 1, 1, 2, 3])): # "Load more"
+        if not page or not page['next_cursor']:
+            break
+        page = await client.get('next page', "/api/movies", {**params, 'cursor': page['next_cursor']})
+        movies += page['movies'] if page else []
+
+    if movies and rng.random() < 0.6:
+        imdb_id = rng.choice(movies)['IMDbID']
+        await client.get('details', f"/api/movies/{quote(imdb_id)}")
+        if rng.random() < 0.5:
+            await client.get('recommendations', "/api/recommendations", {'imdb_id': imdb_id, 'limit': 12})
+
+
+async def virtual_user(host, port, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    client = Client(host, port, deadline, latencies, errors)
+    try:
+        while True:
+            await user_session(client, rng)
+    except LoadDone:
+        pass
+    finally:
+        client.close()
+
+
+async def run_load(host, port, users, duration, seed=42):
+    """{kind: [latency seconds]}, {kind: Counter of errors}, elapsed seconds."""
+    latencies = collections.defaultdict(list)
+    errors = collections.defaultdict(collections.Counter)
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(host, port, start + duration, latencies, errors, seed + i) for i in range(users)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed):
+    """Per kind (and 'total'): requests, req/s, p50/p90/p99 ms and errors."""
+    results = {}
+    everything = [value for values in latencies.values() for value in values]
+    for kind, values in sorted(latencies.items()) + [('total', everything)]:
+        kind_errors = sum(errors[kind].values()) if kind != 'total' else sum(sum(c.values()) for c in errors.values())
+        results[kind] = {
+            'requests': len(values),
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(statistics.median(values) * 1000, 1) if values else None,
+            'p90_ms': round(percentile(values, 0.90) * 1000, 1) if values else None,
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1) if values else None,
+            'errors': kind_errors,
+        }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'Request':<16}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          + ("   p99 vs baseline" if baseline else ""))
+    for kind, row in results.items():
+        line = (f"{kind:<16}{row['requests']:>8}{row['rps']:>9.1f}{row['p50_ms'] or 0:>9.1f}{row['p90_ms'] or 0:>9.1f}"
+                f"{row['p99_ms'] or 0:>9.1f}{row['errors']:>8}")
+        old = (baseline or {}).get(kind)
+        if old and old['p99_ms'] and row['p99_ms']:
+            line += f"   {row['p99_ms'] / old['p99_ms'] - 1:+.0%}"
+        print(line)
+
+
+def regressions(results, baseline, tolerance):
+    """Human-readable list of what got more than `tolerance` worse than the baseline."""
+    found = []
+    for kind, row in results.items():
+        old = baseline.get(kind)
+        if not old:
+            continue
+        # A p99 of a few dozen requests is mostly noise, compare p90 for rare request kinds
+        stat = 'p99_ms' if min(row['requests'], old['requests']) >= MIN_P99_SAMPLES else 'p90_ms'
+        if old[stat] and row[stat] and row[stat] > old[stat] * (1 + tolerance):
+            found.append(f"{kind}: {stat[:3]} {old[stat]} -> {row[stat]} ms")
+        error_rate, old_error_rate = row['errors'] / max(row['requests'], 1), old['errors'] / max(old['requests'], 1)
+        if error_rate > max(old_error_rate, 0.01):
+            found.append(f"{kind}: errors {old_error_rate:.1%} -> {error_rate:.1%}")
+    if 'total' in baseline and results['total']['rps'] < baseline['total']['rps'] * (1 - tolerance):
+        found.append(f"throughput {baseline['total']['rps']} -> {results['total']['rps']} req/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default="http://127.0.0.1:5000", help="Server to test")
+    parser.add_argument('--start', choices=['wsgi', 'asgi'], help="Start this server on --url's port instead")
+    parser.add_argument('--workers', type=int, default=1, help="ASGI worker processes with --start asgi")
+    parser.add_argument('--cache', action='store_true', help="Keep the response cache on with --start")
+    parser.add_argument('--users', type=int, default=32, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of load, after a short warm-up")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', metavar='PATH', help="Save the results as a baseline JSON file")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare with a saved baseline, exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown vs. the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    host, _, port = args.url.split('//')[-1].rstrip('/').partition(':')
+    port = int(port or 80)
+    process = start_server(args.start, port, args.workers, args.cache) if args.start else None
+    try:
+        asyncio.run(run_load(host, port, args.users, min(args.duration, 5), args.seed + 1000)) # Warm-up
+        latencies, errors, elapsed = asyncio.run(run_load(host, port, args.users, args.duration, args.seed))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    results = summarize(latencies, errors, elapsed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(f"{args.users} users for {elapsed:.0f}s against {args.url}"
+          + (f", baseline from {baseline['created']} ({baseline['users']} users)" if baseline else ""))
+    print_results(results, baseline and baseline['results'])
+    for kind, counts in sorted(errors.items()):
+        if counts:
+            print(f"  {kind} errors: {dict(counts)}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'created': datetime.datetime.now().isoformat(timespec='seconds'), 'url': args.url,
+                       'users': args.users, 'duration': args.duration, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}.")
+    if baseline:
+        found = regressions(results, baseline['results'], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Fills an empty scratch database with a synthetic catalog for benchmarks: movies with genres, keywords and
+cast/crew credits shaped like the crawler's data. Rows are bulk-inserted directly, so 100k movies take
+seconds instead of a crawler run. Run from the repository root (DB settings come from .env):
+
+    python -m benchmarks.synthetic --movies 100000
+
+Like real catalogs the distributions are skewed (--skew, the Zipf exponent, 0 for uniform): a few genres,
+keywords and actors appear in a large share of the movies and most in very few, ratings cluster around 6-7
+and recent years have more releases. This matters for benchmarks, a filter on "Drama" or on a star
+matches far more rows than one on a rare keyword. Scales from 10k to 1M movies (about 30s per 100k on SQLite).
+"""
+import argparse
+import bisect
+import itertools
+import random
+import time
+
+from backend import watchlist_wizard_db
+
+GENRES = ["Drama", "Comedy", "Action", "Thriller", "Crime", "Romance", "Adventure", "Horror", "Sci-Fi", "Mystery",
+          "Fantasy", "Animation", "Family", "Biography", "History", "War", "Music", "Documentary", "Western", "Sport"]
+ROLES = ["Actor", "Actor", "Actor", "Actor", "Actor", "Director", "Writer", "Producer"] # Casts are mostly actors
+FIRST_NAMES = ("James Mary John Patricia Robert Jennifer Michael Linda William Elizabeth David Barbara Richard Susan "
+               "Joseph Jessica Thomas Sarah Charles Karen Daniel Nancy Matthew Lisa Anthony Betty Mark Margaret").split()
+LAST_NAMES = ("Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez Gonzalez "
+              "Wilson Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson White Harris Sanchez Clark").split()
+WORDS = ("love war family revenge escape prison friendship murder journey city dream secret power money truth memory "
+         "island ship robot space king crime justice music school doctor night storm river shadow fire heart ghost "
+         "detective train desert empire queen soldier wedding summer winter heist betrayal mountain ocean legacy").split()
+RATINGS = ['G', 'PG', 'PG-13', 'R', 'NC-17', None]
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights of ranks 1..count for rng.choices(cum_weights=...), rank r has weight 1 / r**skew."""
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def weighted_sample(rng, cum_weights, k):
+    """k distinct indexes drawn with the given cumulative weights."""
+    k = min(k, len(cum_weights))
+    picked = set()
+    total = cum_weights[-1]
+    while len(picked) < k:
+        picked.add(bisect.bisect(cum_weights, rng.random() * total))
+    return list(picked)
+
+
+def keyword_vocabulary(rng, size):
+    """Single words plus two-word phrases, like IMDb's plot keywords."""
+    keywords = list(WORDS)
+    while len(keywords) < size:
+        keywords.append(f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{len(keywords)}")
+    return keywords
+
+
+class CatalogGenerator:
+    """Produces the rows of a synthetic catalog with explicit IDs (1..n in every table)."""
+
+    def __init__(self, movies, seed=42, people=None, keywords=None, genres_per_movie=3, keywords_per_movie=10,
+                 people_per_movie=8, skew=1.0, unrated_share=0.03):
+        self.rng = random.Random(seed)
+        self.movies = movies
+        self.people = people or movies * 2
+        # Real keyword vocabularies grow with the catalog, roughly one new keyword per few movies
+        self.keywords = keyword_vocabulary(self.rng, keywords or max(5000, movies // 4))
+        self.genres_per_movie = genres_per_movie
+        self.keywords_per_movie = keywords_per_movie
+        self.people_per_movie = people_per_movie
+        self.unrated_share = unrated_share
+        # Rank order: GENRES is listed most common first, keywords and people are popular in ID order. The larger
+        # vocabularies get flatter curves, or the top keyword or actor would be in most movies.
+        self.genre_weights = zipf_weights(len(GENRES), skew)
+        self.keyword_weights = zipf_weights(len(self.keywords), skew * 0.8)
+        self.people_weights = zipf_weights(self.people, skew * 0.6)
+
+    def person_rows(self):
+        for person_id in range(1, self.people + 1):
+            name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+            yield (person_id, f"nm{person_id:08d}", name)
+
+    def keyword_rows(self):
+        return [(keyword_id, keyword) for keyword_id, keyword in enumerate(self.keywords, start=1)]
+
+    def pick_genres(self):
+        count = self.rng.randint(1, self.genres_per_movie)
+        return weighted_sample(self.rng, self.genre_weights, count)
+
+    def pick_keywords(self):
+        count = self.rng.randint(max(1, self.keywords_per_movie // 3), self.keywords_per_movie * 3 // 2)
+        return [index + 1 for index in weighted_sample(self.rng, self.keyword_weights, count)]
+
+    def pick_people(self):
+        count = self.rng.randint(max(1, self.people_per_movie // 2), self.people_per_movie * 3 // 2)
+        return [index + 1 for index in weighted_sample(self.rng, self.people_weights, count)]
+
+    def pick_rating(self):
+        if self.rng.random() < self.unrated_share:
+            return None # Unreleased or too few votes, listed after every rated movie
+        return round(min(9.8, max(1.0, self.rng.gauss(6.4, 1.1))), 1)
+
+    def pick_year(self):
+        # Releases per year grow over time: most movies are from the last few decades
+        return max(1920, 2024 - int(self.rng.expovariate(1 / 18)))
+
+    def movie_rows(self):
+        """Yields (movie row, genre indexes, keyword IDs, [(person ID, role)]) per movie."""
+        rng = self.rng
+        for movie_id in range(1, self.movies + 1):
+            title = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+            movie = (movie_id, f"tt{movie_id:08d}", title, self.pick_year(), rng.randint(75, 210),
+                     self.pick_rating(), " ".join(rng.choices(WORDS, k=40)), None, None,
+                     rng.choice(RATINGS))
+            credits = [(person_id, rng.choice(ROLES)) for person_id in self.pick_people()]
+            yield movie, self.pick_genres(), self.pick_keywords(), credits
+
+
+def _insert_in_batches(db, sql, rows, batch_size):
+    cursor = db.cursor()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(sql, batch)
+            db.conn.commit()
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        db.conn.commit()
+
+
+def populate(generator, batch_size=5000):
+    """Writes the generator's catalog into the (empty) configured database, returns the elapsed seconds."""
+    watchlist_wizard_db.create_database()
+    backend = watchlist_wizard_db.get_backend()
+    start = time.perf_counter()
+    with watchlist_wizard_db.session() as db:
+        if db.fetch_one("SELECT COUNT(*) AS n FROM Movies")['n']:
+            raise ValueError("The database already has movies, use an empty scratch database.")
+        cursor = db.cursor()
+        backend.bulk_load(cursor, True)
+        try:
+            cursor.executemany("INSERT IGNORE INTO Genres (GenreName) VALUES (%s)", [(genre,) for genre in GENRES])
+            cursor.executemany("INSERT IGNORE INTO Roles (RoleName) VALUES (%s)", [(role,) for role in set(ROLES)])
+            cursor.execute("SELECT GenreName, GenreID FROM Genres")
+            genre_ids = dict(cursor.fetchall())
+            genre_ids = [genre_ids[genre] for genre in GENRES]
+            cursor.execute("SELECT RoleName, RoleID FROM Roles")
+            role_ids = dict(cursor.fetchall())
+            db.conn.commit()
+
+            _insert_in_batches(db, "INSERT INTO PlotKeywords (KeywordID, Keyword) VALUES (%s, %s)",
+                               generator.keyword_rows(), batch_size)
+            _insert_in_batches(db, "INSERT INTO People (PersonID, IMDbID, Name) VALUES (%s, %s, %s)",
+                               generator.person_rows(), batch_size)
+
+            movies, genres, keywords, people = [], [], [], []
+            for movie, movie_genres, movie_keywords, credits in generator.movie_rows():
+                movie_id = movie[0]
+                movies.append(movie)
+                genres.extend((movie_id, genre_ids[genre]) for genre in movie_genres)
+                keywords.extend((movie_id, keyword_id) for keyword_id in movie_keywords)
+                people.extend({(movie_id, person_id, role_ids[role]) for person_id, role in credits})
+                if len(movies) >= batch_size or movie_id == generator.movies:
+                    cursor.executemany("""
+                        INSERT INTO Movies (MovieID, IMDbID, Title, Year, Runtime, Rating, PlotSummary, PosterURL,
+                                            ReleaseDate, MPAARating)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, movies)
+                    cursor.executemany("INSERT INTO MovieGenres (MovieID, GenreID) VALUES (%s, %s)", genres)
+                    cursor.executemany("INSERT INTO MovieKeywords (MovieID, KeywordID) VALUES (%s, %s)", keywords)
+                    cursor.executemany("INSERT INTO MoviePeople (MovieID, PersonID, RoleID) VALUES (%s, %s, %s)", people)
+                    db.conn.commit()
+                    print(f"Inserted {movie_id} / {generator.movies} movies.")
+                    movies, genres, keywords, people = [], [], [], []
+        finally:
+            db.conn.rollback()
+            backend.bulk_load(cursor, False)
+    watchlist_wizard_db.rebuild_movie_search() # Rows were inserted directly, bypassing the write paths
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of genre, keyword and cast popularity")
+    args = parser.parse_args()
+    elapsed = populate(CatalogGenerator(args.movies, seed=args.seed, skew=args.skew))
+    print(f"Synthetic catalog of {args.movies} movies written in {elapsed:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -64,6 +64,7 @@ export default async function MovieDetailsPage({
             {/* USE THE MovieImage COMPONENT */}
             <MovieImage
               src={movie.PosterURL}
+              imdbId={movie.IMDbID}
               alt={movie.Title || "Movie Poster"}
               width={384} // Adjust as needed
               height={568} // Adjust based on desired aspect ratio
@@ -20,21 +20,62 @@ function useDebounce(value: string, delay: number) {
   return debouncedValue;
 }
 
+// Typeahead for a filter input: /api/suggest answers from memory, so a short debounce is enough
+function useSuggestions(term: string, type: "title" | "actor" | "keyword") {
+  const [suggestions, setSuggestions] = useState<string[]>([]);
+  const debouncedTerm = useDebounce(term, 150);
+  useEffect(() => {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+    if (!apiUrl || debouncedTerm.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    axios
+      .get(`${apiUrl}/suggest`, { params: { q: debouncedTerm, type, limit: 8 } })
+      .then(response => {
+        if (!cancelled) setSuggestions(Array.from(new Set<string>(response.data.map((s: { value: string }) => s.value))));
+      })
+      .catch(() => setSuggestions([])); // Suggestions are optional, the filter still works without them
+    return () => {
+      cancelled = true;
+    };
+  }, [debouncedTerm, type]);
+  return suggestions;
+}
+
+const PAGE_SIZE = 60; // Movies per page, more are loaded with the "Load more" button
+
+interface FacetCount {
+  value: string | number | null;
+  count: number;
+}
+
+interface MoviePage {
+  movies: MovieListItem[];
+  next_cursor: string | null;
+}
+
 export default function HomePage(): JSX.Element {
   //State
   const [movies, setMovies] = useState<MovieListItem[]>([]);
   const [genres, setGenres] = useState<string[]>([]);
+  const [genreCounts, setGenreCounts] = useState<Record<string, number> | null>(null); // From /api/facets
   const [searchTerm, setSearchTerm] = useState("");
   const [selectedGenre, setSelectedGenre] = useState("");
   const [keywordTerm, setKeywordTerm] = useState(""); // Example for keyword filter
   const [actorTerm, setActorTerm] = useState(""); // Example for actor filter
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   //Debouncing
   const debouncedSearchTerm = useDebounce(searchTerm, 500); // 500ms delay
   const debouncedKeywordTerm = useDebounce(keywordTerm, 500);
   const debouncedActorTerm = useDebounce(actorTerm, 500);
+  const keywordSuggestions = useSuggestions(keywordTerm, "keyword");
+  const actorSuggestions = useSuggestions(actorTerm, "actor");
 
   //Fetch Genres
   useEffect(() => {
@@ -53,16 +94,22 @@ export default function HomePage(): JSX.Element {
   }, []); // Fetch genres only once on mount
 
   //Fetch Movies triggered by debounced terms or genre change
-  const fetchMovies = useCallback(async () => {
-    setLoading(true);
+  // Pages come from the API's keyset pagination: cursor "" is the first page, then the returned next_cursor
+  const fetchMovies = useCallback(async (cursor: string = "") => {
+    const firstPage = cursor === "";
+    if (firstPage) setLoading(true);
+    else setLoadingMore(true);
     setError(null);
     try {
       const apiUrl = process.env.NEXT_PUBLIC_API_URL;
       if (!apiUrl) throw new Error("API URL not configured");
 
       // Build query parameters based on state
-      const params: Record<string, string | number> = { limit: 250 }; // Base params
-      if (debouncedSearchTerm) params.search = debouncedSearchTerm;
+      const params: Record<string, string | number> = { limit: PAGE_SIZE, cursor }; // Base params
+      if (debouncedSearchTerm) {
+        params.search = debouncedSearchTerm;
+        params.sort = "relevance"; // Best matches first while searching
+      }
       if (selectedGenre) params.genre = selectedGenre;
       if (debouncedKeywordTerm) params.keyword = debouncedKeywordTerm;
       if (debouncedActorTerm) params.actor = debouncedActorTerm;
@@ -71,13 +118,19 @@ export default function HomePage(): JSX.Element {
       console.log("Fetching movies with params:", params);
 
       const response = await axios.get(`${apiUrl}/movies`, { params });
-      setMovies(response.data || []);
+      const page: MoviePage = response.data;
+      setMovies(previous =>
+        firstPage ? page.movies || [] : [...previous, ...(page.movies || [])]
+      );
+      setNextCursor(page.next_cursor);
     } catch (err) {
       console.error("Error fetching movies:", err);
       setError(err instanceof Error ? err.message : "Failed to fetch movies");
-      setMovies([]); // Clear movies on error
+      if (firstPage) setMovies([]); // Clear movies on error
+      setNextCursor(null);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   }, [
     debouncedSearchTerm,
@@ -90,6 +143,29 @@ export default function HomePage(): JSX.Element {
     fetchMovies();
   }, [fetchMovies]); // Re-run fetchMovies when filters input changes
 
+  //Genre counts for the other filters, so empty genres can be greyed out
+  useEffect(() => {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+    if (!apiUrl) return;
+    const params: Record<string, string> = {};
+    if (debouncedSearchTerm) params.search = debouncedSearchTerm;
+    if (debouncedKeywordTerm) params.keyword = debouncedKeywordTerm;
+    if (debouncedActorTerm) params.actor = debouncedActorTerm;
+    let cancelled = false;
+    axios
+      .get(`${apiUrl}/facets`, { params })
+      .then(response => {
+        if (cancelled) return;
+        const counts: Record<string, number> = {};
+        response.data.genre.forEach((facet: FacetCount) => (counts[String(facet.value)] = facet.count));
+        setGenreCounts(counts);
+      })
+      .catch(() => setGenreCounts(null)); // Without counts the dropdown just lists every genre
+    return () => {
+      cancelled = true;
+    };
+  }, [debouncedSearchTerm, debouncedKeywordTerm, debouncedActorTerm]);
+
   return (
     <div>
       <div className='flex items-center justify-left gap-4 m-8 pt-8'>
@@ -145,8 +221,12 @@ export default function HomePage(): JSX.Element {
           >
             <option value=''>All Genres</option>
             {genres.map(genre => (
-              <option key={genre} value={genre}>
-                {genre}
+              <option
+                key={genre}
+                value={genre}
+                disabled={genreCounts?.[genre] === 0 && genre !== selectedGenre}
+              >
+                {genreCounts && genre in genreCounts ? `${genre} (${genreCounts[genre]})` : genre}
               </option>
             ))}
           </select>
@@ -160,11 +240,17 @@ export default function HomePage(): JSX.Element {
           <input
             type='text'
             id='keyword'
+            list='keyword-suggestions'
             placeholder='e.g., escape'
             value={keywordTerm}
             onChange={e => setKeywordTerm(e.target.value)}
             className='w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500'
           />
+          <datalist id='keyword-suggestions'>
+            {keywordSuggestions.map(value => (
+              <option key={value} value={value} />
+            ))}
+          </datalist>
         </div>
 
         {/* Actor Input */}
@@ -175,11 +261,17 @@ export default function HomePage(): JSX.Element {
           <input
             type='text'
             id='actor'
+            list='actor-suggestions'
             placeholder='e.g., Morgan Freeman'
             value={actorTerm}
             onChange={e => setActorTerm(e.target.value)}
             className='w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500'
           />
+          <datalist id='actor-suggestions'>
+            {actorSuggestions.map(value => (
+              <option key={value} value={value} />
+            ))}
+          </datalist>
         </div>
       </div>
 
@@ -197,6 +289,7 @@ export default function HomePage(): JSX.Element {
                 <Link href={`/movies/${movie.IMDbID}`} className='block group'>
                   <MovieImage
                     src={movie.PosterURL}
+                    imdbId={movie.IMDbID}
                     alt={movie.Title || "Movie Poster"}
                     width={200}
                     height={300}
@@ -221,6 +314,17 @@ export default function HomePage(): JSX.Element {
           )}
         </div>
       )}
+      {!loading && !error && nextCursor && (
+        <div className='flex justify-center my-8'>
+          <button
+            onClick={() => fetchMovies(nextCursor)}
+            disabled={loadingMore}
+            className='px-6 py-2 rounded-md bg-indigo-600 text-white hover:bg-indigo-500 disabled:opacity-50'
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -6,6 +6,7 @@ import { useState } from "react";
 
 interface MovieImageProps {
   src: string | null;
+  imdbId?: string; // Loads the resized poster from the API's /posters endpoint, src is the fallback
   alt: string;
   width: number;
   height: number;
@@ -15,6 +16,7 @@ interface MovieImageProps {
 
 const MovieImage: React.FC<MovieImageProps> = ({
   src,
+  imdbId,
   alt,
   width,
   height,
@@ -22,10 +24,14 @@ const MovieImage: React.FC<MovieImageProps> = ({
   priority = false,
 }) => {
   const placeholderImg = "/placeholder-image.png";
-  const [imgSrc, setImgSrc] = useState(src || placeholderImg);
+  const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+  // A thumbnail of about the displayed width (WebP, a few KB) instead of the full-size poster from IMDb's CDN
+  const thumbnail = apiUrl && imdbId ? `${apiUrl}/posters/${imdbId}?w=${width}` : null;
+  const [imgSrc, setImgSrc] = useState(thumbnail || src || placeholderImg);
 
   const handleError = () => {
-    setImgSrc(placeholderImg);
+    // Thumbnail unavailable: try the original poster, then the placeholder
+    setImgSrc(current => (current === thumbnail && src ? src : placeholderImg));
   };
 
   return (
@@ -38,6 +44,7 @@ const MovieImage: React.FC<MovieImageProps> = ({
       priority={priority}
       width={width}
       height={height}
+      unoptimized={imgSrc === thumbnail} // Already resized and cached by the API
       style={{ objectFit: "cover" }} // Maintain aspect ratio using style
     />
   );
@@ -13,4 +13,12 @@ load_dotenv()
 DB_HOST = os.getenv('DB_HOST')
 DB_USER = os.getenv('DB_USER') 
 DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_NAME = os.getenv('DB_NAME')
\ No newline at end of file
+DB_NAME = os.getenv('DB_NAME')
+
+# Write-behind batching for crawler inserts (see db_writer.py)
+DB_FLUSH_SIZE = int(os.getenv('DB_FLUSH_SIZE', 50)) # Flush once this many parsed records are buffered
+DB_FLUSH_INTERVAL = float(os.getenv('DB_FLUSH_INTERVAL', 30)) # ...or once this many seconds have passed since the last flush
+
+# Dimension ID caches used by the write-behind writer (see dimension_cache.py), Genres and Roles are always fully cached
+DIM_CACHE_KEYWORDS_SIZE = int(os.getenv('DIM_CACHE_KEYWORDS_SIZE', 50000))
+DIM_CACHE_PEOPLE_SIZE = int(os.getenv('DIM_CACHE_PEOPLE_SIZE', 100000))
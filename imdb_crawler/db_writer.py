@@ -0,0 +1,253 @@
+import time
+try:
+    from . import config
+    from . import dimension_cache
+except ImportError:
+    import config
+    import dimension_cache
+from backend import watchlist_wizard_db
+
+# Upserts keyed on the UNIQUE IMDbID columns, so one executemany call covers both new and re-crawled records
+MOVIE_UPSERT_SQL = """
+    INSERT INTO Movies (Title, Year, Runtime, Rating, PlotSummary, PosterURL, IMDbID, ReleaseDate, MPAARating)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE Title=VALUES(Title), Year=VALUES(Year), Runtime=VALUES(Runtime),
+        Rating=VALUES(Rating), PlotSummary=VALUES(PlotSummary), PosterURL=VALUES(PosterURL),
+        ReleaseDate=VALUES(ReleaseDate), MPAARating=VALUES(MPAARating)
+"""
+
+PERSON_UPSERT_SQL = """
+    INSERT INTO People (IMDbID, Name, BirthDate, Bio)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE BirthDate=VALUES(BirthDate), Bio=VALUES(Bio)
+"""
+
+IN_CLAUSE_CHUNK = 1000 # Max number of values bound into a single IN (...) lookup
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+class WriteBehindWriter:
+    """
+    Buffers parsed movie and person records and writes them to the database in batches.
+    A flush uses one persistent connection, multi-row executemany statements and a single commit,
+    instead of a new connection and several round trips per genre/person/keyword like insert_movie_data.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None):
+        self.flush_size = flush_size or config.DB_FLUSH_SIZE
+        self.flush_interval = config.DB_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.conn = None
+        self.movies = {} # IMDbID -> movie_data, a re-parsed movie replaces the buffered one
+        self.people = {} # IMDbID -> person_data
+        self.last_flush = time.monotonic()
+        self.dimensions = dimension_cache.DimensionCaches() # Name/IMDbID -> ID caches, warmed on first connect
+        self.stats = {'flushes': 0, 'movies': 0, 'people': 0, 'linked_credits': 0, 'failed_flushes': 0,
+                      'dropped_records': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def pending(self):
+        """Number of records waiting to be written."""
+        return len(self.movies) + len(self.people)
+
+    def add_movie(self, movie_data):
+        """Buffers a parsed movie, flushing if the batch is full or the interval has passed."""
+        if not movie_data.get('imdb_id'):
+            print(f"Skipping movie without IMDb ID: {movie_data.get('title', 'N/A')}")
+            return
+        self.movies[movie_data['imdb_id']] = movie_data
+        self.maybe_flush()
+
+    def add_person(self, person_data):
+        """Buffers a parsed person, flushing if the batch is full or the interval has passed."""
+        if not person_data.get('imdb_id') or not person_data.get('name'):
+            print(f"Skipping person insert due to missing ID or Name: {person_data}")
+            return
+        self.people[person_data['imdb_id']] = person_data
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        """Flushes when flush_size records are buffered or flush_interval seconds have elapsed."""
+        pending = self.pending()
+        if pending >= self.flush_size:
+            self.flush()
+        elif pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered records in one transaction."""
+        self.last_flush = time.monotonic()
+        if not self.pending():
+            return
+
+        conn = self._connection()
+        if not conn:
+            print(f"Flush postponed, no database connection ({self.pending()} records buffered).")
+            return
+
+        records = [('movie', m) for m in self.movies.values()] + [('person', p) for p in self.people.values()]
+        self.movies.clear()
+        self.people.clear()
+        self._write_records(conn, records)
+
+    def _write_records(self, conn, records):
+        """
+        Writes (kind, data) records in one transaction. If that fails they are retried in halves, so only
+        the records that fail on their own are dropped (like insert_movie_data, which drops the one movie).
+        """
+        movies = [data for kind, data in records if kind == 'movie']
+        people = [data for kind, data in records if kind == 'person']
+        try:
+            linked = self._write_batch(conn, movies, people)
+        except watchlist_wizard_db.DatabaseError as err:
+            self.stats['failed_flushes'] += 1
+            if not conn.is_connected():
+                # Not the data's fault: keep the records for the next flush, which reconnects
+                print(f"Lost the database connection, flush postponed ({len(records)} records buffered): {err}")
+                for kind, data in records:
+                    (self.movies if kind == 'movie' else self.people).setdefault(data['imdb_id'], data)
+                return
+            if len(records) == 1:
+                kind, data = records[0]
+                print(f"Database error, dropping {kind} {data['imdb_id']}: {err}")
+                self.stats['dropped_records'] += 1
+                return
+            print(f"Database error (batch flush of {len(movies)} movies, {len(people)} people): {err}. Retrying in halves.")
+            half = len(records) // 2
+            self._write_records(conn, records[:half])
+            self._write_records(conn, records[half:])
+            return
+        self.stats['flushes'] += 1
+        self.stats['movies'] += len(movies)
+        self.stats['people'] += len(people)
+        self.stats['linked_credits'] += linked
+        print(f"Flushed {len(movies)} movies and {len(people)} people to the database, linked {linked} filmography credits.")
+
+    def _write_batch(self, conn, movies, people):
+        """One transaction for the batch, returns the number of credits linked."""
+        cursor = conn.cursor()
+        try:
+            if not self.dimensions.warmed:
+                self.dimensions.warm(cursor)
+            movie_ids = self._write_movies(cursor, movies) if movies else []
+            if people:
+                self._write_people(cursor, people)
+            # Credits waiting for the batch's movies, its people or the people its movies' credits created.
+            # Re-crawled movies may have changed title, rating or credits, so all of the batch's listing rows
+            # are recomputed, in the same refresh as the movies that got credits.
+            linked = watchlist_wizard_db.link_pending_credits(
+                cursor, [m['imdb_id'] for m in movies],
+                [p['imdb_id'] for p in people] + [c.get('person_id') for m in movies for c in m.get('people', [])],
+                movie_ids)
+            watchlist_wizard_db.bump_catalog_version(cursor) # Invalidates the API's cached responses
+            conn.commit()
+            self.dimensions.commit()
+            return linked
+        except BaseException:
+            # Whatever went wrong, IDs handed out by the rolled back inserts no longer exist
+            self.dimensions.rollback()
+            try:
+                conn.rollback()
+            except watchlist_wizard_db.DatabaseError as err:
+                print(f"Rollback failed: {err}")
+            raise
+        finally:
+            cursor.close()
+
+    def close(self):
+        """Flushes anything still buffered and closes the connection."""
+        self.flush()
+        if self.conn and self.conn.is_connected():
+            self.conn.close()
+        self.conn = None
+
+    def _connection(self):
+        """Returns the persistent connection, reconnecting if the server dropped it."""
+        if self.conn is not None:
+            try:
+                self.conn.ping(reconnect=True, attempts=2, delay=1)
+                return self.conn
+            except watchlist_wizard_db.DatabaseError as err:
+                print(f"Lost database connection, reconnecting: {err}")
+                self.conn = None
+        self.conn = watchlist_wizard_db.get_db_connection()
+        return self.conn
+
+    def _write_movies(self, cursor, movies):
+        """Upserts the movies and their genres, keywords and credits, returns their MovieIDs."""
+        cursor.executemany(MOVIE_UPSERT_SQL, [
+            (m.get('title'), m.get('year'), m.get('runtime'), m.get('rating'),
+             m.get('plot_summary'), m.get('poster_url'), m.get('imdb_id'),
+             m.get('release_date'), m.get('age_restriction'))
+            for m in movies
+        ])
+        movie_ids = self._lookup(cursor, "SELECT IMDbID, MovieID FROM Movies WHERE IMDbID IN ({})",
+                                 [m['imdb_id'] for m in movies])
+
+        # Collect every dimension value for the whole batch so each table is resolved with set-based statements
+        genre_names = {g for m in movies for g in m.get('genres', []) if g}
+        keywords = {k for m in movies for k in m.get('plot_keywords', []) if k}
+        credits = [(m['imdb_id'], p.get('person_id'), p.get('name'), p.get('role'))
+                   for m in movies for p in m.get('people', [])
+                   if p.get('person_id') and p.get('name') and p.get('role')]
+
+        # Cache hits need no queries at all, misses are resolved in bulk by the cache
+        genre_ids = self.dimensions.genres.resolve(cursor, genre_names)
+        keyword_ids = self.dimensions.keywords.resolve(cursor, keywords)
+        role_ids = self.dimensions.roles.resolve(cursor, {role for _, _, _, role in credits})
+        person_rows = {person_id: (person_id, name) for _, person_id, name, _ in credits}
+        person_ids = self.dimensions.people.resolve(cursor, person_rows, insert_rows=person_rows)
+
+        movie_genres = set()
+        movie_keywords = set()
+        movie_people = set()
+        for m in movies:
+            movie_id = movie_ids.get(m['imdb_id'])
+            if movie_id is None:
+                print(f"Warning: Could not retrieve MovieID for {m.get('title', 'N/A')}")
+                continue
+            movie_genres.update((movie_id, genre_ids[g]) for g in m.get('genres', []) if g in genre_ids)
+            movie_keywords.update((movie_id, keyword_ids[k]) for k in m.get('plot_keywords', []) if k in keyword_ids)
+        for movie_imdb_id, person_id, name, role in credits:
+            movie_id = movie_ids.get(movie_imdb_id)
+            if movie_id is None or person_id not in person_ids or role not in role_ids:
+                continue
+            movie_people.add((movie_id, person_ids[person_id], role_ids[role]))
+
+        if movie_genres:
+            cursor.executemany("INSERT IGNORE INTO MovieGenres (MovieID, GenreID) VALUES (%s, %s)", list(movie_genres))
+        if movie_keywords:
+            cursor.executemany("INSERT IGNORE INTO MovieKeywords (MovieID, KeywordID) VALUES (%s, %s)", list(movie_keywords))
+        if movie_people:
+            cursor.executemany("INSERT IGNORE INTO MoviePeople (MovieID, PersonID, RoleID) VALUES (%s, %s, %s)", list(movie_people))
+        return list(movie_ids.values())
+
+    def _write_people(self, cursor, people):
+        cursor.executemany(PERSON_UPSERT_SQL, [
+            (p['imdb_id'], p['name'], p.get('birth_date'), p.get('bio'))
+            for p in people
+        ])
+        # Record filmography credits as pending edges, movies that aren't crawled yet get linked when they arrive
+        edges = {(p['imdb_id'], movie_imdb_id) for p in people for movie_imdb_id in p.get('filmography', []) if movie_imdb_id}
+        if edges:
+            cursor.executemany("INSERT IGNORE INTO PendingMoviePeople (PersonIMDbID, MovieIMDbID) VALUES (%s, %s)", list(edges))
+
+    def _lookup(self, cursor, select_sql, keys):
+        """Runs a chunked `... WHERE key IN (...)` query and returns {key: id}."""
+        ids = {}
+        for chunk in _chunks(keys):
+            cursor.execute(select_sql.format(_placeholders(len(chunk))), tuple(chunk))
+            ids.update({key: row_id for key, row_id in cursor.fetchall()})
+        return ids
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+try:
+    from . import config
+except ImportError:
+    import config
+
+IN_CLAUSE_CHUNK = 1000 # Max number of values bound into a single IN (...) lookup
+
+
+def _normalize(key):
+    # MySQL's default collation ignores case and trailing spaces, so 'Drama' and 'drama ' are the same row
+    return key.strip().lower()
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+class DimensionCache:
+    """
+    Write-through cache of natural key -> surrogate ID for one dimension table (e.g. GenreName -> GenreID).
+    Bounded caches evict the least recently used entry. Misses are resolved in bulk: one IN (...) select
+    for keys already in the table, one executemany insert for the rest, then one select for the new IDs.
+    """
+
+    def __init__(self, table, key_column, id_column, maxsize=None):
+        self.table = table
+        self.key_column = key_column
+        self.id_column = id_column
+        self.maxsize = maxsize # None means unbounded (small tables like Genres and Roles)
+        self.entries = OrderedDict() # normalized key -> ID, most recently used last
+        self.uncommitted = set() # Keys inserted in the current transaction, dropped again on rollback
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        row_id = self.entries.get(_normalize(key))
+        if row_id is not None:
+            self.entries.move_to_end(_normalize(key))
+        return row_id
+
+    def put(self, key, row_id):
+        key = _normalize(key)
+        self.entries[key] = row_id
+        self.entries.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def warm(self, cursor):
+        """Loads the table (or its newest maxsize rows) into the cache."""
+        sql = f"SELECT {self.key_column}, {self.id_column} FROM {self.table} WHERE {self.key_column} IS NOT NULL"
+        if self.maxsize is not None:
+            sql += f" ORDER BY {self.id_column} DESC LIMIT {int(self.maxsize)}"
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        for key, row_id in reversed(rows): # Oldest first so the newest rows end up most recently used
+            self.put(key, row_id)
+        print(f"  Warmed {self.table} cache with {len(rows)} entries.")
+
+    def resolve(self, cursor, keys, insert_rows=None):
+        """
+        Returns {key: ID} for every key, inserting rows for keys not in the table yet.
+        insert_rows optionally maps key -> full VALUES tuple for tables that need more than the key column.
+        """
+        ids = {}
+        missing = {}
+        for key in keys:
+            row_id = self.get(key)
+            if row_id is None:
+                missing.setdefault(_normalize(key), key)
+            else:
+                ids[key] = row_id
+        self.hits += len(ids)
+        self.misses += len(missing)
+        if not missing:
+            return ids
+
+        found = self._select(cursor, list(missing.values()))
+        absent = [key for norm, key in missing.items() if norm not in found]
+        if absent:
+            rows = [insert_rows[key] if insert_rows else (key,) for key in absent]
+            self._insert(cursor, rows)
+            inserted = self._select(cursor, absent)
+            self.uncommitted.update(inserted)
+            found.update(inserted)
+
+        for norm, key in missing.items():
+            if norm in found:
+                self.put(key, found[norm])
+                ids[key] = found[norm]
+        return ids
+
+    def commit(self):
+        self.uncommitted.clear()
+
+    def rollback(self):
+        """Forgets IDs of rows that were inserted by a transaction that has been rolled back."""
+        for key in self.uncommitted:
+            self.entries.pop(key, None)
+        self.uncommitted.clear()
+
+    def _select(self, cursor, keys):
+        found = {}
+        for i in range(0, len(keys), IN_CLAUSE_CHUNK):
+            chunk = keys[i:i + IN_CLAUSE_CHUNK]
+            cursor.execute(f"SELECT {self.key_column}, {self.id_column} FROM {self.table} "
+                           f"WHERE {self.key_column} IN ({_placeholders(len(chunk))}) ORDER BY {self.id_column}",
+                           tuple(chunk))
+            for key, row_id in cursor.fetchall():
+                found.setdefault(_normalize(key), row_id) # Lowest ID wins if a key has duplicates (People)
+        return found
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(f"INSERT IGNORE INTO {self.table} ({self.insert_columns}) "
+                           f"VALUES ({_placeholders(len(rows[0]))})", rows)
+
+    @property
+    def insert_columns(self):
+        return self.key_column
+
+
+class PeopleCache(DimensionCache):
+    """IMDbID -> PersonID cache; new people are inserted with their name from the credits."""
+
+    def __init__(self, maxsize):
+        super().__init__('People', 'IMDbID', 'PersonID', maxsize)
+
+    @property
+    def insert_columns(self):
+        return "IMDbID, Name"
+
+
+class DimensionCaches:
+    """The set of dimension caches used by the crawler's write path."""
+
+    def __init__(self):
+        self.genres = DimensionCache('Genres', 'GenreName', 'GenreID')
+        self.roles = DimensionCache('Roles', 'RoleName', 'RoleID')
+        self.keywords = DimensionCache('PlotKeywords', 'Keyword', 'KeywordID', maxsize=config.DIM_CACHE_KEYWORDS_SIZE)
+        self.people = PeopleCache(maxsize=config.DIM_CACHE_PEOPLE_SIZE)
+        self.warmed = False
+
+    def all(self):
+        return [self.genres, self.roles, self.keywords, self.people]
+
+    def warm(self, cursor):
+        for cache in self.all():
+            cache.warm(cursor)
+        self.warmed = True
+
+    def commit(self):
+        for cache in self.all():
+            cache.commit()
+
+    def rollback(self):
+        for cache in self.all():
+            cache.rollback()
+
+    def stats(self):
+        return {cache.table: {'size': len(cache), 'hits': cache.hits, 'misses': cache.misses} for cache in self.all()}
@@ -4,26 +4,41 @@ import urllib.parse
 import urllib.robotparser
 try:
     from . import imdb_parser
-    from . import watchlist_wizard_db
     from . import config
     from . import utils
+    from . import db_writer
 except ImportError:
     import imdb_parser
-    import watchlist_wizard_db
     import config
     import utils
+    import db_writer
+from backend import watchlist_wizard_db # Shared data-access layer, also used by the API
 import re
 
 def crawl():
     """Main crawling function, using BFS and Selenium for list pages."""
     watchlist_wizard_db.create_database()
+    writer = db_writer.WriteBehindWriter() # Buffers parsed pages and writes them to the DB in batches
     queue = [config.START_URL]  # Seed the queue with the start URL, I am using the Top 250 list from IMDB
     visited = set() # Set to keep track of visited URLs to prevent revisiting the same page
-    pages_visited = 0
 
     print(f"Starting crawl with START_URL: {config.START_URL}")
     print(f"MAX_PAGES set to: {config.MAX_PAGES}")
 
+    try:
+        _crawl_loop(queue, visited, writer)
+    finally:
+        writer.close() # Write out whatever is still buffered, even if the crawl was interrupted
+
+    print("-" * 20) # Make it easy to spot the end of the crawl in terminal output
+    print(f"Crawling loop finished. Visited {len(visited)} pages.")
+    print(f"Database writes: {writer.stats['movies']} movies, {writer.stats['people']} people in {writer.stats['flushes']} batches.")
+    print(f"Dimension cache: {writer.dimensions.stats()}")
+    print("-" * 20)
+
+def _crawl_loop(queue, visited, writer):
+    """BFS loop over the URL queue, handing parsed pages to the write-behind writer."""
+    pages_visited = 0
     while queue and (pages_visited < config.MAX_PAGES):
         url = queue.pop(0) # Dequeue the next URL to process from the front of the queue
         print(f"\n--- Processing URL ({pages_visited + 1}/{config.MAX_PAGES}): {url} ---")
@@ -83,8 +98,8 @@ def crawl():
             print(f"  Processing movie page...")
             movie_data = imdb_parser.parse_movie_page(html, url)
             if movie_data:
-                print(f"  Parsing successful. Inserting/Updating movie: {movie_data.get('title', 'N/A')}")
-                watchlist_wizard_db.insert_movie_data(movie_data)
+                print(f"  Parsing successful. Queueing movie for insert/update: {movie_data.get('title', 'N/A')}")
+                writer.add_movie(movie_data)
 
                 # Enqueue people links
                 links_found_on_page = 0
@@ -104,8 +119,8 @@ def crawl():
             print(f"  Processing person page...")
             person_data = imdb_parser.parse_person_page(html, url)
             if person_data:
-                 print(f"  Parsing successful. Inserting/Updating person: {person_data.get('name', 'N/A')}")
-                 watchlist_wizard_db.insert_person_data(person_data)
+                 print(f"  Parsing successful. Queueing person for insert/update: {person_data.get('name', 'N/A')}")
+                 writer.add_person(person_data)
 
                  # Enqueue movie links
                  links_found_on_page = 0
@@ -120,13 +135,11 @@ def crawl():
             else:
                   print(f"  Parsing failed for person page.")
 
+        writer.maybe_flush() # Honour the flush interval even on pages that produced no records
+
         # Limit the number of requests to avoid overwhelming the server, unlikely with a large website like IMDB but still good practice when crawling
         time.sleep(config.DELAY)
 
-    print("-" * 20) # Make it easy to spot the end of the crawl in terminal output
-    print(f"Crawling loop finished. Visited {len(visited)} pages.")
-    print("-" * 20)
-
 if __name__ == "__main__":
     try:
         import nltk
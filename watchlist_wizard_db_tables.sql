@@ -1,4 +1,6 @@
 -- Watchlist Wizard Tables
+-- Reference copy of the MySQL schema at migration version 6. The app creates and upgrades its tables
+-- through backend/watchlist_wizard_db/migrations.py, which is the source of truth.
 
 CREATE TABLE Movies (
     MovieID INT PRIMARY KEY AUTO_INCREMENT,
@@ -9,7 +11,8 @@ CREATE TABLE Movies (
     PlotSummary TEXT,
     PosterURL VARCHAR(255),
     IMDbID VARCHAR(20) UNIQUE,
-    ReleaseDate DATE
+    ReleaseDate DATE,
+    MPAARating VARCHAR(10)
 );
 
 CREATE TABLE Genres (
@@ -27,9 +30,11 @@ CREATE TABLE MovieGenres (
 
 CREATE TABLE People (
     PersonID INT PRIMARY KEY AUTO_INCREMENT,
+    IMDbID VARCHAR(20),
     Name VARCHAR(255) NOT NULL,
     BirthDate DATE NULL,
-    Bio TEXT NULL
+    Bio TEXT NULL,
+    UNIQUE (IMDbID, Name)
 );
 
 CREATE TABLE Roles (
@@ -60,6 +65,42 @@ CREATE TABLE MovieKeywords (
     FOREIGN KEY (KeywordID) REFERENCES PlotKeywords(KeywordID)
 );
 
+CREATE TABLE PendingMoviePeople (
+    PersonIMDbID VARCHAR(20) NOT NULL,
+    MovieIMDbID VARCHAR(20) NOT NULL,
+    RoleName VARCHAR(50) NOT NULL DEFAULT 'Credited',
+    PRIMARY KEY (PersonIMDbID, MovieIMDbID, RoleName)
+);
+
+CREATE TABLE SchemaMigrations (
+    Version INT PRIMARY KEY,
+    Description VARCHAR(255) NOT NULL,
+    AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE CatalogVersion (
+    ID INT PRIMARY KEY,
+    Version BIGINT NOT NULL,
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO CatalogVersion (ID, Version) VALUES (1, 1);
+
+-- Denormalized listing rows, maintained by the write paths (backend/watchlist_wizard_db/projection.py)
+CREATE TABLE MovieSearch (
+    MovieID INT PRIMARY KEY,
+    IMDbID VARCHAR(20),
+    Title VARCHAR(255) NOT NULL,
+    Year INT,
+    Rating DECIMAL(3, 1),
+    PosterURL VARCHAR(255),
+    GenreMask BIGINT NOT NULL DEFAULT 0,
+    Genres TEXT NOT NULL,
+    Actors TEXT NOT NULL,
+    Keywords TEXT NOT NULL,
+    ChangedVersion BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE
+);
+
 CREATE TABLE Awards (
 	AwardID INT PRIMARY KEY AUTO_INCREMENT,
 	AwardName VARCHAR(255) NOT NULL,
@@ -76,7 +117,12 @@ CREATE TABLE MovieAwards (
 );
 
 -- Indexes (important for performance)
-CREATE INDEX idx_movie_title ON Movies(Title);
-CREATE INDEX idx_movie_imdbid ON Movies(IMDbID);
-CREATE INDEX idx_person_name ON People(Name);
-CREATE INDEX idx_moviepeople_role ON MoviePeople(RoleID);
\ No newline at end of file
+CREATE INDEX idx_pending_movie ON PendingMoviePeople(MovieIMDbID);
+CREATE INDEX idx_movies_keyset ON Movies(Rating DESC, Year DESC, MovieID DESC, Title, PosterURL, IMDbID);
+CREATE INDEX idx_moviesearch_listing ON MovieSearch(Rating DESC, Year DESC, MovieID DESC, Title, PosterURL, IMDbID);
+CREATE INDEX idx_moviesearch_changed ON MovieSearch(ChangedVersion);
+CREATE INDEX idx_moviegenres_genre ON MovieGenres(GenreID, MovieID);
+CREATE INDEX idx_moviekeywords_keyword ON MovieKeywords(KeywordID, MovieID);
+CREATE INDEX idx_moviepeople_person ON MoviePeople(PersonID, RoleID, MovieID);
+CREATE FULLTEXT INDEX ft_movies_title ON Movies(Title);
+CREATE FULLTEXT INDEX ft_movies_title_plot ON Movies(Title, PlotSummary);